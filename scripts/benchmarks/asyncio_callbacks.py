@@ -0,0 +1,44 @@
+"""
+Benchmark of the cost the slow asyncio callback detector adds to each callback the event loop runs, with and without
+the stack sampling thread.
+
+Usage: python asyncio_callbacks.py [number of callbacks]
+"""
+import sys
+import asyncio
+from timeit import timeit
+from infi.logging.slow_callbacks import enable_slow_callback_log_warning, disable_slow_callback_log_warning
+
+
+def run_callbacks(loop, number):
+    remaining = [number]
+
+    def callback():
+        remaining[0] -= 1
+        if remaining[0]:
+            loop.call_soon(callback)
+        else:
+            loop.stop()
+    loop.call_soon(callback)
+    loop.run_forever()
+
+
+def main(number=1000000):
+    loop = asyncio.new_event_loop()
+    modes = [('no detector', lambda: None),
+             ('detector', lambda: enable_slow_callback_log_warning(1.0, loop=loop, sample_interval=0)),
+             ('sampling', lambda: enable_slow_callback_log_warning(1.0, loop=loop))]
+    baseline = None
+    for name, enable in modes:
+        enable()
+        try:
+            usec = timeit(lambda: run_callbacks(loop, number), number=1) * 1000000.0 / number
+        finally:
+            disable_slow_callback_log_warning()
+        baseline = usec if baseline is None else baseline
+        print("{: <12} {:.3f} usec/callback (+{:.3f})".format(name, usec, usec - baseline))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,42 @@
+"""
+Benchmark comparing a text file handler using the default formatter with `BinaryFileHandler`: CPU time per record
+and bytes on disk.
+
+Usage: python binary_file_handler.py [number of records]
+"""
+import os
+import sys
+import shutil
+import logbook
+from tempfile import mkdtemp
+from timeit import timeit
+from infi.logging.formatters import create_default_formatter
+from infi.logging.handlers import BinaryFileHandler
+from infi.logging.processors import create_inject_extra_data
+
+
+def create_record(i):
+    record = logbook.LogRecord('benchmark', logbook.INFO, 'request {} done', args=(i,))
+    record.heavy_init()
+    create_inject_extra_data()(record)
+    return record
+
+
+def main(number=100000):
+    records = [create_record(i) for i in range(1000)]
+    dirname = mkdtemp()
+    try:
+        text_handler = logbook.FileHandler(os.path.join(dirname, 'log.txt'))
+        text_handler.formatter = create_default_formatter(compiled=True, fold_constants=True)
+        binary_handler = BinaryFileHandler(os.path.join(dirname, 'log.bin'))
+        for name, handler in (('text', text_handler), ('binary', binary_handler)):
+            seconds = timeit(lambda: [handler.emit(record) for record in records], number=number // len(records))
+            handler.close()
+            print("{: <8} {:.3f} usec/record {:.1f} bytes/record".format(
+                name, seconds * 1000000.0 / number, os.path.getsize(handler._filename) * 1.0 / number))
+    finally:
+        shutil.rmtree(dirname)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,25 @@
+"""
+Benchmark of the cost of a DEBUG record when all the handlers are at INFO, in the default script logging setup with
+and without the level-aware setup.
+
+Usage: python disabled_debug.py [number of records]
+"""
+import os
+import sys
+import logbook
+from timeit import timeit
+from infi.logging.wrappers import script_logging_context
+
+logger = logbook.Logger('benchmark')
+
+
+def main(number=100000):
+    for level_aware in (False, True):
+        with script_logging_context(logfile_path=os.devnull, logfile_level=logbook.INFO, syslog=False, stderr=False,
+                                    level_aware_loggers=[logger] if level_aware else None):
+            usec = timeit(lambda: logger.debug('hello {}', 'world'), number=number) * 1000000.0 / number
+        print("{: <12} {:.3f} usec/record".format('level aware' if level_aware else 'default', usec))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,32 @@
+"""
+Microbenchmark comparing the generic default formatter with the compiled one (with and without constant folding).
+
+Usage: python formatters.py [number of records]
+"""
+import sys
+import logbook
+from timeit import timeit
+from infi.logging.formatters import create_default_formatter
+from infi.logging.processors import create_inject_extra_data
+
+
+def create_record():
+    record = logbook.LogRecord('benchmark', logbook.INFO, 'hello {}', args=('world',))
+    record.heavy_init()
+    create_inject_extra_data()(record)
+    return record
+
+
+def main(number=100000):
+    record = create_record()
+    generic = create_default_formatter()
+    compiled = create_default_formatter(compiled=True)
+    folded = create_default_formatter(compiled=True, fold_constants=True)
+    assert generic(record, None) == compiled(record, None) == folded(record, None)
+    for name, formatter in (('generic', generic), ('compiled', compiled), ('folded', folded)):
+        seconds = timeit(lambda: formatter(record, None), number=number)
+        print("{: <10} {:.3f} usec/record".format(name, seconds * 1000000.0 / number))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,43 @@
+"""
+Benchmark of the cost the slow greenlet tracer adds to each greenlet switch, with the slow greenlet warnings only and
+with the run time histograms (global only and per greenlet).
+
+Usage: python greenlet_switch.py [number of switches]
+"""
+import sys
+import greenlet
+from timeit import timeit
+from infi.logging.slow_greenlets import enable_slow_greenlet_log_warning, disable_slow_greenlet_log_warning
+from infi.logging.slow_greenlets import enable_greenlet_run_time_histograms, disable_greenlet_run_time_histograms
+
+
+def ping_pong(number):
+    main = greenlet.getcurrent()
+
+    def other():
+        while True:
+            main.switch()
+    g = greenlet.greenlet(other)
+    for _ in range(number // 2):
+        g.switch()
+
+
+def main(number=1000000):
+    modes = [('no tracer', lambda: None, lambda: None),
+             ('warnings', lambda: enable_slow_greenlet_log_warning(1.0), disable_slow_greenlet_log_warning),
+             ('global', lambda: enable_greenlet_run_time_histograms(per_greenlet=False),
+              disable_greenlet_run_time_histograms),
+             ('per greenlet', enable_greenlet_run_time_histograms, disable_greenlet_run_time_histograms)]
+    baseline = None
+    for name, enable, disable in modes:
+        enable()
+        try:
+            usec = timeit(lambda: ping_pong(number), number=1) * 1000000.0 / number
+        finally:
+            disable()
+        baseline = usec if baseline is None else baseline
+        print("{: <14} {:.3f} usec/switch (+{:.3f})".format(name, usec, usec - baseline))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,48 @@
+"""
+Microbenchmark comparing the JSON formatter with building a dict of the plugin values and calling `json.dumps`.
+
+Usage: python json_formatter.py [number of records]
+"""
+import sys
+import json
+import logbook
+from timeit import timeit
+from infi.logging.formatters import create_json_formatter
+from infi.logging.plugins import get_formatter_plugins
+from infi.logging.processors import create_inject_extra_data
+
+
+def create_record():
+    record = logbook.LogRecord('benchmark', logbook.INFO, 'hello "{}"', args=('world',))
+    record.heavy_init()
+    create_inject_extra_data()(record)
+    return record
+
+
+def create_dict_formatter():
+    plugins = [plugin() for plugin in get_formatter_plugins().values()]
+    getters = [(plugin.get_format_key(),
+                plugin.get_formatted_value if plugin.has_formatted_value() else plugin.get_value) for plugin in plugins]
+
+    def formatter(record, handler):
+        return json.dumps(dict((key, getter(record)) for key, getter in getters))
+    return formatter
+
+
+def main(number=100000):
+    record = create_record()
+    formatters = [('json.dumps', create_dict_formatter()),
+                  ('json', create_json_formatter(backend='json')),
+                  ('json+fold', create_json_formatter(backend='json', fold_constants=True))]
+    try:
+        formatters.append(('orjson+fold', create_json_formatter(backend='orjson', fold_constants=True)))
+    except ValueError:
+        pass  # orjson not installed
+    for name, formatter in formatters:
+        assert json.loads(formatter(record, None)) == json.loads(formatters[0][1](record, None))
+        seconds = timeit(lambda: formatter(record, None), number=number)
+        print("{: <12} {:.3f} usec/record".format(name, seconds * 1000000.0 / number))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
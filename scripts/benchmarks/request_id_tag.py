@@ -0,0 +1,39 @@
+"""
+Benchmark of the per-request overhead of the request ID tags with the threadlocal backend (a greenlet bound processor
+is pushed for every outermost tagged request) and the contextvars backend (only the context variable is set), with and
+without logging a record in the request.
+
+Usage: python request_id_tag.py [number of requests]
+"""
+import sys
+import logbook
+from timeit import timeit
+from infi.logging.plugins.request_id_tag import request_id_tag_context, set_tag_backend, RequestIDTagInjectorPlugin
+
+logger = logbook.Logger('benchmark')
+
+
+def request():
+    with request_id_tag_context():
+        pass
+
+
+def logging_request():
+    with request_id_tag_context():
+        logger.info('hello')
+
+
+def main(number=100000):
+    # the default logging setup always injects the tag with the injector plugin
+    with logbook.NullHandler().applicationbound(), \
+            logbook.Processor(RequestIDTagInjectorPlugin().inject).applicationbound():
+        for backend in ('threadlocal', 'contextvars'):
+            set_tag_backend(backend)
+            for name, func in (('request', request), ('logging', logging_request)):
+                usec = timeit(func, number=number) * 1000000.0 / number
+                print("{: <12} {: <8} {:.3f} usec/request".format(backend, name, usec))
+        set_tag_backend('threadlocal')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
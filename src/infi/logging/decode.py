@@ -0,0 +1,39 @@
+"""
+Prints the records of binary log files written by `infi.logging.handlers.BinaryFileHandler` in the default text
+format (see `infi.logging.formatters.create_default_formatter`).
+
+Usage: python -m infi.logging.decode [--exclude <plugin>[,<plugin>...]] <path>...
+"""
+import sys
+from .formatters import create_default_formatter
+from .handlers.binary_file_handler import read_binary_log
+
+
+def decode(filename, plugin_predicate=lambda name: True):
+    """
+    :param filename: binary log file path
+    :param plugin_predicate: predicate over formatter plugin names, the same as in `create_default_formatter`
+    :returns: generator of formatted records (str)
+    """
+    formatter = create_default_formatter(plugin_predicate, compiled=True)
+    for record in read_binary_log(filename):
+        yield formatter(record, None)
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    excluded = set()
+    if len(argv) >= 2 and argv[0] == '--exclude':
+        excluded = set(argv[1].split(','))
+        del argv[:2]
+    if not argv or argv[0].startswith('-'):
+        sys.stderr.write(__doc__.lstrip())
+        return 1
+    for filename in argv:
+        for line in decode(filename, lambda name: name not in excluded):
+            sys.stdout.write(line + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,22 @@
+"""
+Prints a log file written with exception dedup (see `create_default_formatter`) and its backups, oldest first, with the
+full traceback inserted after every "exc=<fingerprint> (seen N times)" reference.
+
+Usage: python -m infi.logging.expand_exceptions <path>
+"""
+import sys
+from .handlers.exception_references import expand_exception_references
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        sys.stderr.write(__doc__.lstrip())
+        return 1
+    for line in expand_exception_references(argv[0]):
+        sys.stdout.write(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
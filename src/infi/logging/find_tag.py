@@ -0,0 +1,26 @@
+"""
+Prints the records with a request ID tag from a log file and its backups, oldest first. Backups written by a
+`RotatingFileHandler` with `index_tags=True` are searched through their index.
+
+Usage: python -m infi.logging.find_tag [--since <time>] [--until <time>] <path> <tag>
+"""
+import sys
+from .handlers.tag_index import find_tag_records
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    options = dict()
+    while len(argv) >= 2 and argv[0] in ('--since', '--until'):
+        options[argv[0][2:]] = argv[1]
+        del argv[:2]
+    if len(argv) != 2:
+        sys.stderr.write(__doc__.lstrip())
+        return 1
+    for record in find_tag_records(argv[0], argv[1], **options):
+        sys.stdout.write(record)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
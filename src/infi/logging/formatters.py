@@ -1,4 +1,39 @@
-from .plugins import get_formatter_plugins, _true
+import json
+import string
+from json.encoder import encode_basestring_ascii
+from .plugins import FormatterPlugin, get_formatter_plugins, get_constants_version, _true
+
+_string_formatter = string.Formatter()
+JSON_BACKENDS = ('orjson', 'json')
+_DEFAULT_PLUGIN_ORDER = ['time', 'hostname', 'process_id', 'procname', 'thread_id', 'greenlet_id', 'request_id_tag',
+                         'channel', 'log_level']
+
+
+class _FormattedValuePlugin(FormatterPlugin):
+    """Formatter plugin whose value is the formatted value of a plugin that has one (see `has_formatted_value`)."""
+    def __init__(self, plugin):
+        self.plugin = plugin
+
+    def get_value(self, record):
+        return self.plugin.get_formatted_value(record)
+
+    def get_format_string(self):
+        return "{}"
+
+    def get_format_key(self):
+        return self.plugin.get_format_key()
+
+    def get_required_extra_keys(self):
+        return self.plugin.get_required_extra_keys()
+
+
+def _use_formatted_value(plugin):
+    return _FormattedValuePlugin(plugin) if plugin.has_formatted_value() else plugin
+
+
+def _create_plugins(plugin_predicate):
+    """:returns: dict of plugin name -> plugin instance of the plugins chosen by the predicate"""
+    return dict((k, _use_formatted_value(v())) for k, v in get_formatter_plugins(plugin_predicate).items())
 
 
 def create_formatter(plugin_names):
@@ -8,29 +43,152 @@ def create_formatter(plugin_names):
     :returns: formatter function
     """
     available_formatters = get_formatter_plugins(lambda k: k in plugin_names)
-    formatters = [available_formatters[k]() for k in plugin_names]
+    formatters = [_use_formatted_value(available_formatters[k]()) for k in plugin_names]
     format_string = " ".join("{}={}".format(f.get_format_key(), f.get_format_string()) for f in formatters)
-    return create_formatter_by_format_string(format_string, plugin_names)
+    return _create_formatter(format_string, formatters, False, False, none_as_str=False)
 
 
-def create_formatter_by_format_string(format_string, plugin_names):
+def create_formatter_by_format_string(format_string, plugin_names, compiled=False, fold_constants=False):
     """
     Creates a formatter that uses a given format string and a list of plugin names.
     The format string needs to have fields in place to format all the plugins.
     :param format_string: format string (e.g. "a={} b={}")
     :param plugin_names: list of plugin names
+    :param compiled: see `create_default_formatter`
+    :param fold_constants: see `create_default_formatter`
     :returns: formatter function
     """
     formatter_classes = get_formatter_plugins(lambda k: k in plugin_names)
     formatters = [formatter_classes[k]() for k in plugin_names]
+    return _create_formatter(format_string, formatters, compiled, fold_constants, none_as_str=False)
+
+
+def _escape(s):
+    return s.replace('{', '{{').replace('}', '}}')
+
+
+def _fold_constants(strformat, formatters, none_as_str):
+    """
+    Bakes the (already formatted) values of constant plugins into the format string.
+    Only format strings with auto-numbered fields ("{}", "{:0>5}", ...) can be folded, other format strings are
+    returned as is.
+    :returns: tuple of the new format string and the list of the remaining (non-constant) formatter plugins
+    """
+    parsed = list(_string_formatter.parse(strformat))
+    fields = [(field_name, spec) for _, field_name, spec, _ in parsed if field_name is not None]
+    if len(fields) != len(formatters) or any(field_name != '' or '{' in spec for field_name, spec in fields):
+        return strformat, formatters
+    result = []
+    remaining_formatters = []
+    formatter_iter = iter(formatters)
+    for literal, field_name, spec, conversion in parsed:
+        result.append(_escape(literal))
+        if field_name is None:
+            continue
+        field = "{" + ("!" + conversion if conversion else "") + (":" + spec if spec else "") + "}"
+        f = next(formatter_iter)
+        if f.is_constant():
+            value = f.get_constant_value()
+            result.append(_escape(field.format('None' if value is None and none_as_str else value)))
+        else:
+            result.append(field)
+            remaining_formatters.append(f)
+    return "".join(result), remaining_formatters
+
+
+def _compile_formatter(strformat, formatters, none_as_str=True):
+    """
+    Generates a single specialized formatter function for a format string and a list of formatter plugins. Plugins
+    that provide `get_value_expression` are inlined into the generated code, the rest are called through their bound
+    `get_value` method. The output is identical to the generic formatter.
+    :param strformat: format string with one field per plugin
+    :param formatters: list of formatter plugin instances, in the order of the fields in `strformat`
+    :param none_as_str: if True, None values are replaced with 'None' before formatting (like the default formatter)
+    :returns: formatter function
+    """
+    specs = [spec for _, field_name, spec, _ in _string_formatter.parse(strformat) if field_name is not None]
+    namespace = dict(_format=strformat.format)
+    lines = ["def formatter(record, handler):"]
+    args = []
+    for i, (f, spec) in enumerate(zip(formatters, specs)):
+        expression = f.get_value_expression('record')
+        if expression is None:
+            namespace['_get_value_{}'.format(i)] = f.get_value
+            expression = '_get_value_{}(record)'.format(i)
+        if not none_as_str or not spec:
+            # format(None, '') == 'None', so there's no need to check for None
+            args.append('({})'.format(expression))
+        else:
+            lines.append("    v{} = {}".format(i, expression))
+            args.append("'None' if v{0} is None else v{0}".format(i))
+    lines.append("    return _format({})".format(", ".join(args)))
+    exec(compile("\n".join(lines), "<infi.logging compiled formatter>", "exec"), namespace)
+    return namespace['formatter']
+
+
+def _build_formatter(strformat, formatters, compiled, none_as_str):
+    if compiled:
+        return _compile_formatter(strformat, formatters, none_as_str)
+
     getters = [f.get_value for f in formatters]
+    if not none_as_str:
+        def formatter(record, handler):
+            return strformat.format(*(g(record) for g in getters))
+        return formatter
 
     def formatter(record, handler):
-        return format_string.format(*(g(record) for g in getters))
+        items = []
+        for getter in getters:
+            item = getter(record)
+            items.append(item if item is not None else 'None')
+
+        return strformat.format(*items)
     return formatter
 
 
-def create_default_formatter(plugin_predicate=_true):
+def _get_required_extra_keys(formatters):
+    keys = set()
+    for f in formatters:
+        plugin_keys = f.get_required_extra_keys()
+        if plugin_keys is None:
+            return None
+        keys.update(plugin_keys)
+    return keys
+
+
+def _create_formatter(strformat, formatters, compiled, fold_constants, none_as_str):
+    if not fold_constants or not any(f.is_constant() for f in formatters):
+        formatter = _build_formatter(strformat, formatters, compiled, none_as_str)
+    else:
+        state = [None, None]  # constants version, formatter built with the constants of that version
+
+        def formatter(record, handler):
+            version = get_constants_version()
+            if state[0] != version:
+                folded_strformat, remaining_formatters = _fold_constants(strformat, formatters, none_as_str)
+                state[:] = [version, _build_formatter(folded_strformat, remaining_formatters, compiled, none_as_str)]
+            return state[1](record, handler)
+    formatter.required_extra_keys = _get_required_extra_keys(formatters)
+    return formatter
+
+
+def get_formatter_required_extra_keys(formatter):
+    """
+    :param formatter: formatter function
+    :returns: set of `record.extra` keys the formatter reads, or None if unknown (e.g. not created by this module)
+    """
+    return getattr(formatter, 'required_extra_keys', None)
+
+
+def get_formatter_exception_dedup(formatter):
+    """
+    :param formatter: formatter function
+    :returns: the `ExceptionDedup` of a formatter created with `dedup_exceptions=True`, or None
+    """
+    return getattr(formatter, 'exception_dedup', None)
+
+
+def create_default_formatter(plugin_predicate=_true, compiled=False, fold_constants=False, dedup_exceptions=False):
     """
     Creates a default formatter that uses a custom format string.
 
@@ -45,17 +203,29 @@ def create_default_formatter(plugin_predicate=_true):
     tid=<tid>
 
     :param plugin_predicate: predicate over plugin names to choose which plugins to use.
+    :param compiled: if True, generate a single specialized function for the chosen plugins instead of iterating over
+                     the plugins for each record. The output is the same in both modes.
+    :param fold_constants: if True, values of plugins that declare themselves constant (see
+                           `FormatterPlugin.is_constant`) are formatted once and baked into the format string. The
+                           format string is rebuilt when the constants are invalidated (e.g. after fork or
+                           `set_procname`). Use this only for records emitted by the current process.
+    :param dedup_exceptions: if True, a recurring traceback is written in full only the first time, and afterwards as
+                             a reference to its fingerprint and its last line (see `ExceptionDedup`). Handlers that
+                             start new files reset it with `get_formatter_exception_dedup(formatter).reset()`.
     :returns: formatter function
     """
-    available_formatters = dict((k, v()) for k, v in get_formatter_plugins(plugin_predicate).items())
+    available_formatters = _create_plugins(plugin_predicate)
+    exception_dedup = None
+    if dedup_exceptions and 'message' in available_formatters:
+        exception_dedup = available_formatters['message'].enable_exception_dedup()
 
     strformats = []
-    getters = []
+    used_formatters = []
     used_fields = set(['message'])  # we want message to be last
 
     def extend_format(str, *keys):
         used_fields.update(keys)
-        getters.extend([available_formatters[f].get_value for f in keys])
+        used_formatters.extend([available_formatters[f] for f in keys])
         strformats.append(str.format(*[available_formatters[f].get_format_string() for f in keys]))
 
     if 'time' in available_formatters:
@@ -92,12 +262,108 @@ def create_default_formatter(plugin_predicate=_true):
         extend_format('msg={}', 'message')
 
     strformat = " ".join(strformats)
+    formatter = _create_formatter(strformat, used_formatters, compiled, fold_constants, none_as_str=True)
+    formatter.exception_dedup = exception_dedup
+    return formatter
 
-    def formatter(record, handler):
-        items = []
-        for getter in getters:
-            item = getter(record)
-            items.append(item if item is not None else 'None')
 
-        return strformat.format(*items)
+_json_encoder = json.JSONEncoder(default=str)
+
+
+def _encode_json_value(value):
+    if type(value) is str:
+        return encode_basestring_ascii(value)
+    elif value is None:
+        return 'null'
+    return _json_encoder.encode(value)
+
+
+def _get_json_encoder(backend):
+    """
+    :param backend: 'orjson', 'json' or None for the fastest available backend
+    :returns: function that encodes a single value as a JSON str
+    """
+    if backend not in JSON_BACKENDS + (None, ):
+        raise ValueError("backend must be one of {!r}, not {!r}".format(JSON_BACKENDS, backend))
+    if backend in ('orjson', None):
+        try:
+            import orjson
+        except ImportError:
+            if backend is not None:
+                raise ValueError("JSON backend 'orjson' is not available")
+        else:
+            dumps = orjson.dumps
+
+            def encode(value):
+                return dumps(value, default=str).decode('utf-8')
+            return encode
+    return _encode_json_value
+
+
+def _compile_json_formatter(formatters, encode, fold_constants):
+    """
+    Generates a formatter function that builds the JSON object by concatenating precomputed key prefixes and the
+    values. Values of plugins that declare their JSON type (see `FormatterPlugin.get_json_type`) skip the encoder when
+    they are of that type: ints are converted with `str` and strs are escaped with `encode_basestring_ascii`.
+    """
+    namespace = dict(_encode=encode, _str=str, _int=int, _escape=encode_basestring_ascii)
+    lines = ["def formatter(record, handler):"]
+    parts = []
+    literal = '{'
+    for i, f in enumerate(formatters):
+        literal += (', ' if i else '') + encode_basestring_ascii(f.get_format_key()) + ': '
+        if fold_constants and f.is_constant():
+            literal += encode(f.get_constant_value())
+            continue
+        expression = f.get_value_expression('record')
+        if expression is None:
+            namespace['_get_value_{}'.format(i)] = f.get_value
+            expression = '_get_value_{}(record)'.format(i)
+        json_type = f.get_json_type()
+        if json_type is str:
+            lines.append("    v{} = {}".format(i, expression))
+            value = "(_escape(v{0}) if type(v{0}) is _str else _encode(v{0}))".format(i)
+        elif json_type is int:
+            lines.append("    v{} = {}".format(i, expression))
+            value = "(_str(v{0}) if type(v{0}) is _int else _encode(v{0}))".format(i)
+        else:
+            value = "_encode(({}))".format(expression)
+        parts.extend([repr(literal), value])
+        literal = ''
+    parts.append(repr(literal + '}'))
+    lines.append("    return {}".format(" + ".join(parts)))
+    code = "\n".join(lines)
+    exec(compile(code, "<infi.logging compiled JSON formatter>", "exec"), namespace)
+    return namespace['formatter']
+
+
+def create_json_formatter(plugin_predicate=_true, fold_constants=False, backend=None):
+    """
+    Creates a formatter that formats records as JSON objects (one line per record), with a key per formatter plugin
+    (`FormatterPlugin.get_format_key`) and the plugin's value (`FormatterPlugin.get_value`). The keys are in the same
+    order as in the default formatter.
+    :param plugin_predicate: predicate over plugin names to choose which plugins to use.
+    :param fold_constants: see `create_default_formatter`
+    :param backend: JSON library used to encode values that need escaping: 'orjson', 'json' (the standard library), or
+                    None to use orjson if it's installed and fall back to json
+    :returns: formatter function
+    """
+    encode = _get_json_encoder(backend)
+    available_formatters = _create_plugins(plugin_predicate)
+    names = [name for name in _DEFAULT_PLUGIN_ORDER if name in available_formatters]
+    names += sorted(set(available_formatters) - set(names) - set(['message']))
+    names += ['message'] if 'message' in available_formatters else []
+    formatters = [available_formatters[name] for name in names]
+
+    if not fold_constants or not any(f.is_constant() for f in formatters):
+        formatter = _compile_json_formatter(formatters, encode, False)
+    else:
+        state = [None, None]  # constants version, formatter built with the constants of that version
+
+        def formatter(record, handler):
+            version = get_constants_version()
+            if state[0] != version:
+                state[:] = [version, _compile_json_formatter(formatters, encode, True)]
+            return state[1](record, handler)
+    formatter.required_extra_keys = _get_required_extra_keys(formatters)
     return formatter
@@ -1,6 +1,17 @@
-from .rotating_file_handler import RotatingFileHandler
+from .rotating_file_handler import RotatingFileHandler, list_backup_files, link_backup_files
+from .async_rotating_file_handler import AsyncRotatingFileHandler
+from .ring_buffer_handler import RingBufferHandler, read_ring_buffer
+from .binary_file_handler import BinaryFileHandler, read_binary_log
+from .tag_index import find_tag_records
+from .time_range import read_time_range
+from .request_buffer_handler import RequestBufferHandler
+from .duplicate_suppressing_handler import DuplicateSuppressingHandler
+from .exception_references import expand_exception_references
 
-__all__ = ['RotatingFileHandler']
+__all__ = ['RotatingFileHandler', 'AsyncRotatingFileHandler', 'list_backup_files', 'link_backup_files',
+           'RingBufferHandler', 'read_ring_buffer', 'BinaryFileHandler', 'read_binary_log',
+           'find_tag_records', 'read_time_range', 'RequestBufferHandler',
+           'DuplicateSuppressingHandler', 'expand_exception_references']
 try:
     import infi.tracing
     from .syslog_handler import SyslogHandler
@@ -0,0 +1,172 @@
+import sys
+import time
+import atexit
+import weakref
+import logbook
+from collections import deque
+from .rotating_file_handler import RotatingFileHandler, ROTATION_RENAME
+from .utils import get_native_thread_functions, acquire_native_lock
+
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST)
+
+_POLL_INTERVAL = 0.001
+
+_handlers = weakref.WeakSet()  # open handlers, closed at exit to write their queued records
+
+
+class AsyncRotatingFileHandler(RotatingFileHandler):
+    """
+    `RotatingFileHandler` that doesn't write on the caller's thread/greenlet. Records are formatted by the caller and
+    pushed onto a bounded queue. A dedicated OS thread drains the queue in batches: each batch is written with a single
+    write and the rollover check happens between batches.
+
+    The writer is a real OS thread even if gevent monkey-patched the threading module, so a slow disk never blocks the
+    gevent hub. The caller only appends to the queue and wakes up the writer, both of which never block (unless the
+    overflow policy is 'block' and the queue is full, in which case the caller sleeps with `time.sleep`, which yields
+    to other greenlets if gevent monkey-patched it).
+    """
+    def __init__(self, filename, mode='a', encoding='utf-8', level=logbook.NOTSET, format_string=None, delay=False,
+                 max_size=1024 * 1024, backup_count=5, filter=None, bubble=False, queue_size=10000,
+                 overflow_policy=OVERFLOW_BLOCK, batch_size=1000, flush_interval=1.0, rotation_scheme=ROTATION_RENAME,
+                 compression=None, max_compression_jobs=1, index_tags=False):
+        """
+        :param queue_size: maximum number of formatted records waiting to be written
+        :param overflow_policy: what to do when the queue is full: 'block' waits until there's room, 'drop_oldest'
+                                discards the oldest queued record and 'drop_newest' discards the new record. Dropped
+                                records are counted in `dropped_count` and reported in the log file.
+        :param batch_size: maximum number of records to write in a single write
+        :param flush_interval: maximum time in seconds the writer sleeps when the queue is empty
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError("overflow_policy must be one of {!r}, not {!r}".format(OVERFLOW_POLICIES,
+                                                                                     overflow_policy))
+        RotatingFileHandler.__init__(self, filename, mode=mode, encoding=encoding, level=level,
+                                     format_string=format_string, delay=delay, max_size=max_size,
+                                     backup_count=backup_count, filter=filter, bubble=bubble,
+                                     rotation_scheme=rotation_scheme, compression=compression,
+                                     max_compression_jobs=max_compression_jobs, index_tags=index_tags)
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped_count = 0
+        self._reported_dropped_count = 0
+        self._queue = deque()
+        self._busy = False
+        self._closing = False
+        self._running = True
+        start_new_thread, allocate_lock = get_native_thread_functions()
+        self._wakeup = allocate_lock()
+        self._wakeup.acquire()
+        start_new_thread(self._writer, ())
+        _handlers.add(self)
+
+    def _wake_writer(self):
+        try:
+            self._wakeup.release()
+        except (RuntimeError, ValueError):
+            pass  # already woken up (the error type depends on the Python version)
+
+    def emit(self, record):
+        msg = self.format(record)
+        queue = self._queue
+        if len(queue) >= self.queue_size:
+            if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                self.dropped_count += 1
+                return
+            elif self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                try:
+                    queue.popleft()
+                    self.dropped_count += 1
+                except IndexError:
+                    pass
+            else:
+                while len(queue) >= self.queue_size and self._running:
+                    self._wake_writer()
+                    time.sleep(_POLL_INTERVAL)
+        queue.append(msg)
+        self._wake_writer()
+
+    def _pop_batch(self):
+        batch = []
+        queue = self._queue
+        try:
+            while len(batch) < self.batch_size:
+                batch.append(queue.popleft())
+        except IndexError:
+            pass
+        return batch
+
+    def _write_batch(self, batch):
+        dropped_count = self.dropped_count
+        if dropped_count != self._reported_dropped_count:
+            msg = "infi.logging: dropped {} log records because the queue was full".format(
+                dropped_count - self._reported_dropped_count)
+            batch.append(msg)
+            self._reported_dropped_count = dropped_count
+        data = self.encode(batch[0])
+        if len(batch) > 1:
+            data = data[:0].join([data] + [self.encode(msg) for msg in batch[1:]])
+        if self.should_rollover(None, len(data)):
+            self.perform_rollover()
+        self.write(data)
+        self.stream.flush()
+
+    def _writer(self):
+        try:
+            while True:
+                acquire_native_lock(self._wakeup, self.flush_interval)
+                self._busy = True
+                try:
+                    while True:
+                        batch = self._pop_batch()
+                        if not batch:
+                            break
+                        try:
+                            self._write_batch(batch)
+                        except Exception:
+                            self._handle_writer_error(batch)
+                finally:
+                    self._busy = False
+                if self._closing and not self._queue:
+                    break
+        finally:
+            self._running = False
+
+    def _handle_writer_error(self, batch):
+        try:
+            sys.stderr.write("infi.logging: failed to write {} log records to {}\n".format(len(batch),
+                                                                                          self._filename))
+        except Exception:
+            pass
+
+    def _wait_until_drained(self):
+        while (self._queue or self._busy) and self._running:
+            self._wake_writer()
+            time.sleep(_POLL_INTERVAL)
+
+    def flush(self):
+        """Waits until all the queued records are written."""
+        if self._running:
+            self._wait_until_drained()
+
+    def close(self):
+        """Writes all the queued records, stops the writer thread and closes the file."""
+        if self._running:
+            self._closing = True
+            self._wake_writer()
+            while self._running:
+                time.sleep(_POLL_INTERVAL)
+        _handlers.discard(self)
+        RotatingFileHandler.close(self)
+
+
+def _close_handlers():
+    for handler in list(_handlers):
+        handler.close()
+
+
+atexit.register(_close_handlers)
@@ -0,0 +1,323 @@
+"""
+Compact binary log file format.
+
+A file is a sequence of segments. Each segment starts with the file magic and is followed by entries:
+
+    entry: type (1 byte) | payload length (varint) | payload | CRC-32 of the preceding entry bytes (4 bytes, LE)
+
+    string entry payload: string id (varint) | utf-8 bytes
+    record entry payload: flags | level | channel id | hostname id | procname id (varints) |
+                          process id | thread id | [greenlet id] | time delta in microseconds (zigzag varints) |
+                          [request id tag] | message | [formatted exception] (length-prefixed utf-8 strings)
+
+Strings that repeat on every record (channel, host name, process name) are written once per segment as string
+entries and referenced by id. Times are written as the difference from the previous record of the segment. A new
+segment starts every time the file is opened, so appending to an existing file doesn't need to read it first.
+
+The file magic is recognized only where an entry ends, so records that contain it are read correctly. After a
+truncated entry (e.g. if the process crashed while writing it and the file was appended to after a restart), reading
+continues from the next file magic that is followed by an entry with a valid checksum.
+"""
+import io
+import zlib
+import struct
+import logbook
+from datetime import datetime, timedelta
+from logbook.concurrency import new_fine_grained_lock
+
+from infi.logging.plugins.hostname import HOST_NAME_KEY
+from infi.logging.plugins.procname import PROCNAME_KEY
+from infi.logging.plugins.thread_id import THREAD_ID_KEY
+from infi.logging.plugins.greenlet_id import GREENLET_ID_KEY
+from infi.logging.plugins.request_id_tag import REQUEST_ID_TAG_KEY
+
+FILE_MAGIC = b'INFILOG\x02'
+ENTRY_STRING = 1
+ENTRY_RECORD = 2
+
+FLAG_THREAD_ID = 1
+FLAG_GREENLET_ID = 2
+FLAG_TRACE = 4
+FLAG_EXCEPTION = 8
+FLAG_REQUEST_ID_TAG = 16
+FLAG_PROCNAME_NONE = 32
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_NONE_STRING_ID = 0
+_CHECKSUM = struct.Struct('<I')
+
+
+def _append_varint(buf, value):
+    while value >= 0x80:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _append_signed_varint(buf, value):
+    _append_varint(buf, (value << 1) if value >= 0 else ((-value << 1) - 1))
+
+
+def _append_string(buf, s):
+    data = s.encode('utf-8', 'replace')
+    _append_varint(buf, len(data))
+    buf.extend(data)
+
+
+def _append_entry(buf, entry_type, payload):
+    start = len(buf)
+    buf.append(entry_type)
+    _append_varint(buf, len(payload))
+    buf.extend(payload)
+    buf.extend(_CHECKSUM.pack(zlib.crc32(buf[start:]) & 0xffffffff))
+
+
+def _read_varint(data, position):
+    result = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def _read_signed_varint(data, position):
+    value, position = _read_varint(data, position)
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1), position
+
+
+def _read_string(data, position):
+    length, position = _read_varint(data, position)
+    return data[position:position + length].decode('utf-8', 'replace'), position + length
+
+
+def _to_microseconds(t):
+    if t.tzinfo is not None:
+        t = t.replace(tzinfo=None) - t.utcoffset()
+    return (t - _EPOCH) // _MICROSECOND
+
+
+class BinaryRecordEncoder(object):
+    """Encodes logbook records into the entries of a single segment."""
+    max_cached_headers = 1024
+
+    def __init__(self):
+        self._string_ids = dict()
+        self._headers = dict()
+        self._last_time = 0
+
+    def _get_string_id(self, buf, s):
+        if s is None:
+            return _NONE_STRING_ID
+        string_id = self._string_ids.get(s)
+        if string_id is None:
+            string_id = self._string_ids[s] = len(self._string_ids) + 1
+            payload = bytearray()
+            _append_varint(payload, string_id)
+            payload.extend(s.encode('utf-8', 'replace'))
+            _append_entry(buf, ENTRY_STRING, payload)
+        return string_id
+
+    def _encode_header(self, buf, key):
+        flags, level, channel, hostname, procname, process, thread, greenlet_id = key
+        header = bytearray()
+        _append_varint(header, flags)
+        _append_varint(header, level)
+        _append_varint(header, self._get_string_id(buf, channel))
+        _append_varint(header, self._get_string_id(buf, hostname))
+        _append_varint(header, self._get_string_id(buf, '' if procname is None else procname))
+        _append_signed_varint(header, process or 0)
+        _append_signed_varint(header, thread)
+        if greenlet_id is not None:
+            _append_signed_varint(header, greenlet_id)
+        return bytes(header)
+
+    def encode(self, record):
+        """
+        :param record: logbook record (after the injector plugins ran)
+        :returns: bytearray with the record entry, preceded by string entries for new strings
+        """
+        buf = bytearray()
+        extra = record.extra
+        procname = extra.get(PROCNAME_KEY, '')
+        thread_id = extra.get(THREAD_ID_KEY)
+        greenlet_id = extra.get(GREENLET_ID_KEY)
+        tag = extra.get(REQUEST_ID_TAG_KEY)
+        exception = record.formatted_exception
+        flags = ((FLAG_THREAD_ID if thread_id is not None else 0) |
+                 (FLAG_GREENLET_ID if greenlet_id is not None else 0) |
+                 (FLAG_TRACE if extra.get('TRACE', False) else 0) |
+                 (FLAG_EXCEPTION if exception else 0) |
+                 (FLAG_REQUEST_ID_TAG if tag is not None else 0) |
+                 (FLAG_PROCNAME_NONE if procname is None else 0))
+        # the fields up to the time rarely change between records, so their encoding is cached
+        key = (flags, record.level, record.channel, extra.get(HOST_NAME_KEY, ''), procname, record.process,
+               record.thread if thread_id is None else thread_id, greenlet_id)
+        header = self._headers.get(key)
+        if header is None:
+            if len(self._headers) >= self.max_cached_headers:
+                self._headers.clear()
+            header = self._headers[key] = self._encode_header(buf, key)
+
+        time = _to_microseconds(record.time)
+        payload = bytearray(header)
+        _append_signed_varint(payload, time - self._last_time)
+        self._last_time = time
+        if tag is not None:
+            _append_string(payload, tag if isinstance(tag, str) else str(tag))
+        _append_string(payload, record.message)
+        if exception:
+            _append_string(payload, exception)
+
+        _append_entry(buf, ENTRY_RECORD, payload)
+        return buf
+
+
+class DecodedRecord(object):
+    """Record decoded from a binary log file, with the attributes the formatter plugins use."""
+    def __init__(self, time, level, channel, process, thread, extra, message, formatted_exception):
+        self.time = time
+        self.level = level
+        self.level_name = logbook.get_level_name(level)
+        self.channel = channel
+        self.process = process
+        self.thread = thread
+        self.extra = extra
+        self.message = message
+        self.formatted_exception = formatted_exception
+
+
+def _decode_record(data, position, strings, last_time):
+    flags, position = _read_varint(data, position)
+    level, position = _read_varint(data, position)
+    channel_id, position = _read_varint(data, position)
+    hostname_id, position = _read_varint(data, position)
+    procname_id, position = _read_varint(data, position)
+    process, position = _read_signed_varint(data, position)
+    thread, position = _read_signed_varint(data, position)
+    extra = {HOST_NAME_KEY: strings[hostname_id],
+             PROCNAME_KEY: None if flags & FLAG_PROCNAME_NONE else strings[procname_id]}
+    if flags & FLAG_THREAD_ID:
+        extra[THREAD_ID_KEY] = thread
+    if flags & FLAG_GREENLET_ID:
+        extra[GREENLET_ID_KEY], position = _read_signed_varint(data, position)
+    time_delta, position = _read_signed_varint(data, position)
+    if flags & FLAG_REQUEST_ID_TAG:
+        extra[REQUEST_ID_TAG_KEY], position = _read_string(data, position)
+    if flags & FLAG_TRACE:
+        extra['TRACE'] = True
+    message, position = _read_string(data, position)
+    exception = None
+    if flags & FLAG_EXCEPTION:
+        exception, position = _read_string(data, position)
+    time = last_time + time_delta
+    record = DecodedRecord(_EPOCH + timedelta(microseconds=time), level, strings[channel_id], process, thread, extra,
+                           message, exception)
+    return record, time
+
+
+def _read_entry(data, position):
+    """
+    :returns: tuple of (entry type, payload position, payload end, entry end), or None if the entry at `position` is
+              truncated or its checksum doesn't match
+    """
+    try:
+        length, payload_position = _read_varint(data, position + 1)
+    except IndexError:
+        return None
+    payload_end = payload_position + length
+    end = payload_end + _CHECKSUM.size
+    if end > len(data):
+        return None
+    if _CHECKSUM.unpack_from(data, payload_end)[0] != zlib.crc32(data[position:payload_end]) & 0xffffffff:
+        return None
+    return data[position], payload_position, payload_end, end
+
+
+def _is_segment_start(data, position):
+    if data[position:position + len(FILE_MAGIC)] != FILE_MAGIC:
+        return False
+    position += len(FILE_MAGIC)
+    return (position == len(data) or data[position:position + len(FILE_MAGIC)] == FILE_MAGIC or
+            _read_entry(data, position) is not None)
+
+
+def _find_segment_start(data, position):
+    """:returns: position of the next segment start after `position`, or -1"""
+    while True:
+        position = data.find(FILE_MAGIC, position + 1)
+        if position == -1 or _is_segment_start(data, position):
+            return position
+
+
+def read_binary_log(filename):
+    """
+    Reads the records of a binary log file written by `BinaryFileHandler`. A truncated entry (e.g. if the process
+    crashed while writing it) is ignored: the reading continues from the next segment, if the file was appended to.
+    :param filename: binary log file path
+    :returns: generator of `DecodedRecord` objects
+    """
+    with open(filename, 'rb') as f:
+        data = bytearray(f.read())
+    if data[:len(FILE_MAGIC)] != FILE_MAGIC:
+        raise ValueError("{} is not a binary log file".format(filename))
+    position = 0
+    strings, last_time = None, 0
+    while position < len(data):
+        if data[position:position + len(FILE_MAGIC)] == FILE_MAGIC:
+            strings, last_time = {_NONE_STRING_ID: None}, 0
+            position += len(FILE_MAGIC)
+            continue
+        entry = _read_entry(data, position)
+        if entry is None:
+            position = _find_segment_start(data, position)
+            if position == -1:
+                return
+            continue
+        entry_type, payload_position, payload_end, position = entry
+        if entry_type == ENTRY_STRING:
+            string_id, string_position = _read_varint(data, payload_position)
+            strings[string_id] = data[string_position:payload_end].decode('utf-8', 'replace')
+        elif entry_type == ENTRY_RECORD:
+            record, last_time = _decode_record(data, payload_position, strings, last_time)
+            yield record
+
+
+class BinaryFileHandler(logbook.Handler):
+    """
+    Handler that writes records in a compact binary format instead of formatting them as text. Use
+    `python -m infi.logging.decode` to render a binary log file as text, in the same format as the default formatter.
+    Note that only the fields of the built-in formatter plugins are kept.
+    """
+    def __init__(self, filename, level=logbook.NOTSET, filter=None, bubble=False, flush=True):
+        """
+        :param filename: binary log file path. If the file exists new records are appended to it.
+        :param flush: flush the file after every record
+        """
+        logbook.Handler.__init__(self, level, filter, bubble)
+        self.lock = new_fine_grained_lock()
+        self._filename = filename
+        self._flush = flush
+        self._encoder = BinaryRecordEncoder()
+        self._stream = io.open(filename, 'ab')
+        self._stream.write(FILE_MAGIC)
+
+    def emit(self, record):
+        with self.lock:
+            self._stream.write(self._encoder.encode(record))
+            if self._flush:
+                self._stream.flush()
+
+    def flush(self):
+        with self.lock:
+            if self._stream is not None:
+                self._stream.flush()
+
+    def close(self):
+        with self.lock:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
@@ -0,0 +1,114 @@
+"""
+Background compression of rotated log files.
+"""
+import shutil
+import atexit
+import time
+import weakref
+from collections import deque
+from .utils import get_native_thread_functions
+
+COMPRESSION_SUFFIXES = dict(gzip='.gz', bz2='.bz2', lzma='.xz')
+
+_queues = weakref.WeakSet()  # queues that are waited for at exit
+
+
+def _open_compressed_file(path, compression):
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(path, 'wb')
+    elif compression == 'bz2':
+        import bz2
+        return bz2.BZ2File(path, 'wb')
+    elif compression == 'lzma':
+        import lzma
+        return lzma.open(path, 'wb')
+    raise ValueError("compression must be one of {!r}, not {!r}".format(sorted(COMPRESSION_SUFFIXES), compression))
+
+
+def check_compression(compression):
+    """
+    :raises ValueError: if `compression` is not supported by this Python
+    """
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError("compression must be one of {!r}, not {!r}".format(sorted(COMPRESSION_SUFFIXES),
+                                                                             compression))
+    try:
+        __import__(compression)
+    except ImportError:
+        raise ValueError("compression {!r} is not available".format(compression))
+
+
+def compress_file(src, dst_path, compression):
+    """
+    :param src: file object opened for binary reading
+    :param dst_path: path of the compressed file to create
+    :param compression: 'gzip', 'bz2' or 'lzma'
+    """
+    with _open_compressed_file(dst_path, compression) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+class CompressionQueue(object):
+    """
+    Runs jobs in the background on at most `max_jobs` OS threads at a time (real threads even under gevent, so
+    compression never blocks the gevent hub). Threads are started on demand and exit when there are no more jobs.
+    The threads are not joined by the interpreter, so the pending jobs are waited for on `close` and at exit.
+    """
+    def __init__(self, max_jobs=1):
+        start_new_thread, allocate_lock = get_native_thread_functions()
+        self._start_new_thread = start_new_thread
+        self._lock = allocate_lock()
+        self._pending = deque()
+        self._running = 0
+        self._closed = False
+        self.max_jobs = max_jobs
+        _queues.add(self)
+
+    def submit(self, job):
+        """
+        :param job: function with no arguments. After `close` the job runs on the caller's thread.
+        """
+        if self._closed:
+            self._run_job(job)
+            return
+        with self._lock:
+            self._pending.append(job)
+            if self._running >= self.max_jobs:
+                return
+            self._running += 1
+        self._start_new_thread(self._run, ())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._running -= 1
+                    return
+                job = self._pending.popleft()
+            self._run_job(job)
+
+    def _run_job(self, job):
+        try:
+            job()
+        except Exception:
+            pass  # jobs handle their own errors, the queue must keep running the pending jobs
+
+    def wait(self, poll_interval=0.01):
+        """Waits until all the submitted jobs are done."""
+        while self._running or self._pending:
+            time.sleep(poll_interval)
+
+    def close(self):
+        """Waits until all the submitted jobs are done. Jobs submitted later run on the caller's thread."""
+        self._closed = True
+        self.wait()
+        _queues.discard(self)
+
+
+def _wait_for_queues():
+    for queue in list(_queues):
+        queue.wait()
+
+
+atexit.register(_wait_for_queues)
@@ -0,0 +1,122 @@
+"""
+Suppression of storms of similar log messages.
+"""
+import logbook
+from collections import OrderedDict
+from logbook.concurrency import new_fine_grained_lock
+
+from infi.logging.globals import get_time
+
+
+class _Fingerprint(object):
+    __slots__ = ('window_start', 'passed', 'suppressed', 'last_record')
+
+    def __init__(self, window_start):
+        self.window_start = window_start
+        self.passed = 0
+        self.suppressed = 0
+        self.last_record = None
+
+
+class DuplicateSuppressingHandler(logbook.Handler):
+    """
+    Handler that wraps another handler (e.g. `RotatingFileHandler`, `SyslogHandler` or a stream handler) and passes it
+    only the first `max_duplicates` records of each fingerprint (channel, level and message template, before the
+    arguments are formatted) in every window of `window` seconds. The other records are only counted, without being
+    formatted, and when the window closes a "suppressed K similar messages" record is passed in their place.
+
+    Windows are closed when a record with the same fingerprint arrives after the window ended, or by a sweep of all
+    the fingerprints that runs at most once a window when records are emitted (and when the handler is closed).
+    The fingerprint table holds at most `max_fingerprints` entries: the least recently used one is evicted (after
+    passing its summary) to make room for a new fingerprint.
+    """
+    def __init__(self, handler, max_duplicates=10, window=60.0, max_fingerprints=1024, level=logbook.NOTSET,
+                 filter=None, bubble=None):
+        """
+        :param handler: handler to pass the records to (its current level and filter are respected, records below its
+                        level aren't counted)
+        :param max_duplicates: number of records of a fingerprint to pass in each window
+        :param window: window length in seconds
+        :param max_fingerprints: maximum number of fingerprints to track
+        :param level: level of this handler, in addition to the level of the wrapped handler
+        :param bubble: bubble flag of this handler, or None to use the flag of the wrapped handler
+        """
+        logbook.Handler.__init__(self, level, filter, handler.bubble if bubble is None else bubble)
+        self.handler = handler
+        self.max_duplicates = max_duplicates
+        self.window = window
+        self.max_fingerprints = max_fingerprints
+        self.lock = new_fine_grained_lock()
+        self._fingerprints = OrderedDict()  # least recently used first
+        self._next_sweep_time = get_time() + window
+
+    def _forward(self, record):
+        handler = self.handler
+        if handler.should_handle(record) and (handler.filter is None or handler.filter(record, handler)):
+            handler.handle(record)
+
+    @staticmethod
+    def _create_summary(entry):
+        record = entry.last_record
+        summary = logbook.LogRecord(record.channel, record.level,
+                                    "suppressed {} similar messages: {}".format(entry.suppressed, record.msg),
+                                    extra=dict(record.extra))
+        summary.heavy_init()
+        return summary
+
+    def _sweep(self, now):
+        """:returns: list of summary records of the closed windows"""
+        summaries = []
+        for key, entry in list(self._fingerprints.items()):
+            if now - entry.window_start >= self.window:
+                if entry.suppressed:
+                    summaries.append(self._create_summary(entry))
+                del self._fingerprints[key]
+        return summaries
+
+    def emit(self, record):
+        if not self.handler.should_handle(record):
+            return
+        msg = record.msg
+        key = (record.channel, record.level, msg if isinstance(msg, str) else repr(msg))
+        summaries = ()
+        with self.lock:
+            now = get_time()
+            entry = self._fingerprints.pop(key, None)
+            if entry is None:
+                entry = _Fingerprint(now)
+                if len(self._fingerprints) >= self.max_fingerprints:
+                    evicted = self._fingerprints.popitem(last=False)[1]
+                    if evicted.suppressed:
+                        summaries = [self._create_summary(evicted)]
+            elif now - entry.window_start >= self.window:
+                if entry.suppressed:
+                    summaries = [self._create_summary(entry)]
+                entry.window_start, entry.passed, entry.suppressed = now, 0, 0
+            self._fingerprints[key] = entry
+            if entry.passed < self.max_duplicates:
+                entry.passed += 1
+                entry.last_record = record
+                passed = True
+            else:
+                entry.suppressed += 1
+                passed = False
+            if now >= self._next_sweep_time:
+                self._next_sweep_time = now + self.window
+                summaries = list(summaries) + self._sweep(now)
+        for summary in summaries:
+            self._forward(summary)
+        if passed:
+            self._forward(record)
+
+    def flush_summaries(self):
+        """Passes the summaries of all the fingerprints that suppressed records, without waiting for their windows."""
+        with self.lock:
+            summaries = [self._create_summary(entry) for entry in self._fingerprints.values() if entry.suppressed]
+            self._fingerprints.clear()
+        for summary in summaries:
+            self._forward(summary)
+
+    def close(self):
+        self.flush_summaries()
+        self.handler.close()
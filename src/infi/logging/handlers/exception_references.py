@@ -0,0 +1,64 @@
+"""
+Re-expansion of the exception references written by formatters with `dedup_exceptions=True` (see `ExceptionDedup`).
+
+The first record of each exception fingerprint ends its message line with " exc=<fingerprint>" and is followed by the
+traceback (the lines up to the start of the next record). Later records end their message line with
+" exc=<fingerprint> (seen N times)" and are followed by the last line of their own traceback. The traceback of the
+first occurrence is inserted after them, with its last line replaced by theirs.
+"""
+import os
+from .log_files import open_log_file, is_record_start
+from ..plugins.message import EXCEPTION_REFERENCE_PATTERN
+
+
+def expand_exception_lines(lines, tracebacks=None):
+    """
+    :param lines: iterable of the lines (str) of a log file
+    :param tracebacks: dict of fingerprint -> list of traceback lines to use (and update), e.g. to carry the tracebacks
+                       over from the previous file
+    :returns: generator of the lines with the traceback lines inserted after each reference
+    """
+    tracebacks = dict() if tracebacks is None else tracebacks
+    collecting = None  # traceback lines of the first occurrence being read
+    last_line = None  # last traceback line of the first occurrence, if the reference isn't followed by its own
+    for line in lines:
+        record_start = is_record_start(line.encode('utf-8', 'replace'))
+        if last_line is not None and record_start:
+            yield last_line
+        last_line = None
+        if collecting is not None and not record_start:
+            collecting.append(line)
+            yield line
+            continue
+        collecting = None
+        yield line
+        match = EXCEPTION_REFERENCE_PATTERN.search(line.rstrip('\r\n'))
+        if match is None:
+            continue
+        fingerprint, count = match.groups()
+        if count is None:
+            collecting = tracebacks[fingerprint] = []
+        elif tracebacks.get(fingerprint):
+            for traceback_line in tracebacks[fingerprint][:-1]:
+                yield traceback_line
+            last_line = tracebacks[fingerprint][-1]
+    if last_line is not None:
+        yield last_line
+
+
+def expand_exception_references(filename, encoding='utf-8'):
+    """
+    Reads a log file and its backups, oldest first, with the tracebacks of exception references re-expanded. A
+    reference whose first occurrence is in an older backup is expanded too, as long as the backup still exists.
+    :param filename: log file path (without a suffix)
+    :returns: generator of lines (str)
+    """
+    from .rotating_file_handler import list_backup_files
+    tracebacks = dict()
+    for path in list(reversed(list_backup_files(filename))) + [filename]:
+        if not os.path.exists(path):
+            continue
+        with open_log_file(path) as f:
+            lines = (line.decode(encoding, 'replace') for line in f)
+            for line in expand_exception_lines(lines, tracebacks):
+                yield line
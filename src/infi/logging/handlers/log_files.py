@@ -0,0 +1,43 @@
+"""
+Reading log files written with the time plugin: every record starts with its time, and the lines that don't (e.g.
+tracebacks) belong to the record before them. Shared by the tag index, time range and exception reference readers.
+"""
+import re
+from .compression import COMPRESSION_SUFFIXES
+
+_TIME_PATTERN = re.compile(br'(\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d(?:\.\d+)?)')
+
+
+def open_log_file(path, fileobj=None):
+    """
+    Opens a log file for binary reading, decompressing it if it's a compressed backup.
+    :param fileobj: if not None, read from this file object (opened for binary reading) instead of opening `path`
+    """
+    if path.endswith(COMPRESSION_SUFFIXES['gzip']):
+        import gzip
+        return gzip.GzipFile(path, 'rb', fileobj=fileobj)
+    elif path.endswith(COMPRESSION_SUFFIXES['bz2']):
+        import bz2
+        return bz2.BZ2File(path if fileobj is None else fileobj, 'rb')
+    elif path.endswith(COMPRESSION_SUFFIXES['lzma']):
+        import lzma
+        return lzma.open(path if fileobj is None else fileobj, 'rb')
+    return open(path, 'rb') if fileobj is None else fileobj
+
+
+def get_record_time(line):
+    """
+    :param line: bytes of a log file line
+    :returns: the time a record that starts at `line` was logged at ('YYYY-MM-DD HH:MM:SS[.ffffff]' str), or None if
+              the line doesn't start a record
+    """
+    match = _TIME_PATTERN.match(line)
+    return None if match is None else match.group(1).replace(b'T', b' ').decode('ascii')
+
+
+def is_record_start(line):
+    """
+    :param line: bytes of a log file line
+    :returns: True if a record starts at `line`
+    """
+    return _TIME_PATTERN.match(line) is not None
@@ -0,0 +1,153 @@
+"""
+Tail-based buffering of the records of requests tagged by `request_id_tag_context`.
+
+The records of a request are kept in memory until the request ends, and are passed to the wrapped handler only if the
+request turned out to be interesting: it logged a record at or above the flush level, it took longer than the latency
+threshold, or it was sampled in when it started. The records of the other requests are discarded.
+"""
+import random
+import logbook
+from collections import OrderedDict, deque
+from logbook.concurrency import new_fine_grained_lock
+
+from infi.logging.globals import get_time
+from infi.logging.plugins.request_id_tag import REQUEST_ID_TAG_KEY, add_request_listener, remove_request_listener
+
+RECORD_OVERHEAD = 512  # approximate size in bytes of a buffered record without its message and traceback
+REQUEST_OVERHEAD = 1024  # approximate size in bytes of the buffer of a request without its records
+
+
+class _RequestBuffer(object):
+    __slots__ = ('records', 'size', 'start_time', 'refcount', 'triggered')
+
+    def __init__(self, start_time, triggered):
+        self.records = deque()
+        self.size = 0
+        self.start_time = start_time
+        self.refcount = 1
+        self.triggered = triggered
+
+
+class RequestBufferHandler(logbook.Handler):
+    """
+    Handler that buffers the records of each request (see `request_id_tag_context`) and passes them to another handler
+    only if the request logs a record at `flush_level` or above, takes at least `latency_threshold` seconds or is
+    sampled in (with a probability of `sample_rate`). Once a request is flushed its next records are passed through
+    immediately. Records without a tag, or with a tag of a request that started before the handler was created or while
+    `max_requests` requests were buffered, are always passed through.
+
+    Memory is bounded by approximating the size of each buffered record (`RECORD_OVERHEAD` plus the length of its
+    message and traceback) and of each request's buffer (`REQUEST_OVERHEAD`). When a request buffers more than
+    `max_request_size` bytes its oldest records are dropped, and when all the buffers hold more than `max_total_size`
+    bytes the oldest requests lose their records. `dropped_records` counts the records dropped this way.
+    """
+    def __init__(self, handler, flush_level=logbook.ERROR, latency_threshold=None, sample_rate=0.0,
+                 max_request_size=256 * 1024, max_total_size=16 * 1024 * 1024, level=logbook.NOTSET, filter=None,
+                 bubble=False, max_requests=10000):
+        """
+        :param handler: handler to pass the records of the flushed requests to (its level and filter are respected)
+        :param flush_level: level of a record that flushes its request
+        :param latency_threshold: flush requests that take at least this many seconds, or None
+        :param sample_rate: probability (0-1) to flush a request regardless of its records and latency
+        :param max_request_size: maximum size in bytes of the buffered records of a single request
+        :param max_total_size: maximum size in bytes of the buffered records of all the requests
+        :param max_requests: maximum number of requests to buffer at a time
+        """
+        logbook.Handler.__init__(self, level, filter, bubble)
+        self.handler = handler
+        self.flush_level = logbook.lookup_level(flush_level)
+        self.latency_threshold = latency_threshold
+        self.sample_rate = sample_rate
+        self.max_request_size = max_request_size
+        self.max_total_size = max_total_size
+        self.max_requests = max_requests
+        self.lock = new_fine_grained_lock()
+        self.dropped_records = 0
+        self._requests = OrderedDict()  # tag -> _RequestBuffer, oldest request first
+        self._total_size = 0
+        add_request_listener(self)
+
+    def _forward(self, record):
+        handler = self.handler
+        if handler.should_handle(record) and (handler.filter is None or handler.filter(record, handler)):
+            handler.handle(record)
+
+    def _drop_oldest(self, buf):
+        record_size = buf.records.popleft()[1]
+        buf.size -= record_size
+        self._total_size -= record_size
+        self.dropped_records += 1
+
+    def _evict(self):
+        for buf in self._requests.values():
+            while buf.records and self._total_size > self.max_total_size:
+                self._drop_oldest(buf)
+            if self._total_size <= self.max_total_size:
+                return
+
+    def _flush(self, buf):
+        buf.triggered = True
+        self._total_size -= buf.size
+        buf.size = 0
+        while buf.records:
+            self._forward(buf.records.popleft()[0])
+
+    def request_started(self, tag):
+        with self.lock:
+            buf = self._requests.get(tag)
+            if buf is not None:  # the tag was passed to another greenlet, it's the same request
+                buf.refcount += 1
+            elif len(self._requests) < self.max_requests:
+                self._requests[tag] = _RequestBuffer(get_time(), random.random() < self.sample_rate)
+                self._total_size += REQUEST_OVERHEAD
+                if self._total_size > self.max_total_size:
+                    self._evict()
+
+    def request_ended(self, tag):
+        with self.lock:
+            buf = self._requests.get(tag)
+            if buf is None:
+                return
+            buf.refcount -= 1
+            if buf.refcount > 0:
+                return
+            del self._requests[tag]
+            self._total_size -= REQUEST_OVERHEAD
+            if self.latency_threshold is not None and get_time() - buf.start_time >= self.latency_threshold:
+                self._flush(buf)
+            else:
+                self._total_size -= buf.size
+
+    def emit(self, record):
+        tag = record.extra.get(REQUEST_ID_TAG_KEY)
+        with self.lock:
+            buf = None if tag is None else self._requests.get(tag)
+            if buf is None or buf.triggered:
+                self._forward(record)
+                return
+            if record.level >= self.flush_level:
+                self._flush(buf)
+                self._forward(record)
+                return
+            record.pull_information()  # the frame the record was logged in is gone by the time it's flushed
+            record_size = RECORD_OVERHEAD + len(record.message) + len(record.formatted_exception or '')
+            buf.records.append((record, record_size))
+            buf.size += record_size
+            self._total_size += record_size
+            while buf.size > self.max_request_size and len(buf.records) > 1:
+                self._drop_oldest(buf)
+            if self._total_size > self.max_total_size:
+                self._evict()
+
+    def get_buffered_size(self):
+        """
+        :returns: approximate size in bytes of all the buffered records and the buffers of the requests
+        """
+        return self._total_size
+
+    def close(self):
+        remove_request_listener(self)
+        with self.lock:
+            self._requests.clear()
+            self._total_size = 0
+        self.handler.close()
@@ -0,0 +1,158 @@
+"""
+Fixed-size memory-mapped circular log file.
+
+The file starts with a header followed by the data area, which is used as a ring:
+
+    header: magic (8 bytes) | data area size (u64) | end offset (u64)
+    record: record magic (u32) | payload length (u32) | record offset (u64) | payload crc32 (u32) | payload
+
+The end offset is the total number of bytes ever written (so it never wraps), and a record that starts at offset N is
+stored at position N % size of the data area (wrapping around the end if needed). Each record stores its own offset,
+so the reader can find the oldest record that wasn't overwritten and can tell stale or torn records from valid ones.
+"""
+import os
+import mmap
+import struct
+import logbook
+from zlib import crc32
+from logbook.concurrency import new_fine_grained_lock
+
+FILE_MAGIC = b'INFIRING'
+RECORD_MAGIC = 0x52494e47
+_HEADER = struct.Struct('<8sQQ')
+_END_OFFSET = struct.Struct('<Q')
+_END_OFFSET_POSITION = 16
+_RECORD_HEADER = struct.Struct('<IIQI')
+
+
+def _crc32(data):
+    return crc32(data) & 0xffffffff
+
+
+class RingBufferHandler(logbook.Handler, logbook.StringFormatterHandlerMixin):
+    """
+    Handler that writes formatted records into a fixed-size memory-mapped circular file. Writing a record is a copy
+    into the mapping (no write() system call), and the file never grows or rotates: new records overwrite the oldest
+    ones. Records survive a crash of the process and can be read with `read_ring_buffer`.
+
+    If the file already exists with the same size, new records are appended after the existing ones.
+    """
+    def __init__(self, filename, size=16 * 1024 * 1024, encoding='utf-8', level=logbook.NOTSET, format_string=None,
+                 filter=None, bubble=False):
+        """
+        :param filename: ring buffer file path
+        :param size: size of the data area in bytes (the file is slightly larger because of the header)
+        """
+        logbook.Handler.__init__(self, level, filter, bubble)
+        logbook.StringFormatterHandlerMixin.__init__(self, format_string)
+        self.encoding = encoding
+        self.size = size
+        self.max_payload_size = size // 4
+        self.lock = new_fine_grained_lock()
+        self._filename = filename
+        self._file, self._mmap, self._end = self._open(filename, size)
+
+    @staticmethod
+    def _open(filename, size):
+        fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o644)
+        f = os.fdopen(fd, 'r+b')
+        header = f.read(_HEADER.size)
+        if len(header) == _HEADER.size and _HEADER.unpack(header)[:2] == (FILE_MAGIC, size):
+            end = _HEADER.unpack(header)[2]
+        else:
+            end = 0
+            f.seek(0)
+            f.truncate()
+            f.write(_HEADER.pack(FILE_MAGIC, size, end))
+        f.truncate(_HEADER.size + size)
+        f.flush()
+        return f, mmap.mmap(f.fileno(), _HEADER.size + size), end
+
+    def _copy(self, offset, data):
+        position = offset % self.size
+        first = min(len(data), self.size - position)
+        start = _HEADER.size + position
+        self._mmap[start:start + first] = data[:first]
+        if first < len(data):
+            self._mmap[_HEADER.size:_HEADER.size + len(data) - first] = data[first:]
+
+    def emit(self, record):
+        payload = self.format(record).encode(self.encoding, 'replace')[:self.max_payload_size]
+        with self.lock:
+            if self._mmap is None:
+                return  # records emitted after close are ignored
+            end = self._end
+            data = _RECORD_HEADER.pack(RECORD_MAGIC, len(payload), end, _crc32(payload)) + payload
+            self._copy(end, data)
+            # the end offset is updated only after the record is complete, so a crash while copying leaves a torn
+            # record that the reader ignores
+            self._end = end + len(data)
+            _END_OFFSET.pack_into(self._mmap, _END_OFFSET_POSITION, self._end)
+
+    def flush(self):
+        """Writes the mapping to the disk (not needed to survive a crash of the process, only of the OS)."""
+        with self.lock:
+            if self._mmap is not None:
+                self._mmap.flush()
+
+    def close(self):
+        with self.lock:
+            if self._mmap is not None:
+                self._mmap.flush()
+                self._mmap.close()
+                self._file.close()
+                self._mmap = self._file = None
+
+
+def _read_at(data, size, offset, length):
+    position = offset % size
+    first = min(length, size - position)
+    result = data[_HEADER.size + position:_HEADER.size + position + first]
+    if first < length:
+        result += data[_HEADER.size:_HEADER.size + length - first]
+    return result
+
+
+def _read_record(data, size, offset, end):
+    """
+    :returns: (payload, next offset) of the record that starts at `offset`, or None if there's no valid record there
+    """
+    if offset + _RECORD_HEADER.size > end:
+        return None
+    magic, length, record_offset, checksum = _RECORD_HEADER.unpack(_read_at(data, size, offset, _RECORD_HEADER.size))
+    next_offset = offset + _RECORD_HEADER.size + length
+    if magic != RECORD_MAGIC or record_offset != offset or next_offset > end:
+        return None
+    payload = _read_at(data, size, offset + _RECORD_HEADER.size, length)
+    if _crc32(payload) != checksum:
+        return None
+    return payload, next_offset
+
+
+def read_ring_buffer(filename, encoding='utf-8'):
+    """
+    Reads the records of a ring buffer file written by `RingBufferHandler`, oldest first. This works on files left
+    behind by crashed processes too: records that were partially overwritten or partially written are skipped.
+    :param filename: ring buffer file path
+    :returns: generator of formatted records (str)
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    magic, size, end = _HEADER.unpack(data[:_HEADER.size])
+    if magic != FILE_MAGIC:
+        raise ValueError("{} is not a ring buffer file".format(filename))
+    offset = max(0, end - size)
+    # the oldest bytes in the ring may belong to a record that was partially overwritten, so look for the first
+    # valid record
+    while offset < end and _read_record(data, size, offset, end) is None:
+        offset += 1
+    # records after the end offset are valid too as long as they don't overlap the first record: a record that was
+    # completely copied just before a crash, before the end offset was updated
+    limit = offset + size
+    while True:
+        result = _read_record(data, size, offset, limit)
+        if result is None:
+            break
+        payload, offset = result
+        yield payload.decode(encoding, 'replace')
+
@@ -1,11 +1,176 @@
+import os
+import re
 import logbook
+from collections import deque
 from logbook.handlers import rename, sys, errno
+from .compression import COMPRESSION_SUFFIXES, CompressionQueue, check_compression, compress_file
+from .utils import get_native_thread_functions
+from .tag_index import build_tag_index
+from ..formatters import get_formatter_exception_dedup
+
+ROTATION_RENAME = 'rename'
+ROTATION_SEQUENCE = 'sequence'
+ROTATION_SCHEMES = (ROTATION_RENAME, ROTATION_SEQUENCE)
+
+_SEQUENCE_SUFFIX_FORMAT = '{}.{:08}'
+_COMPRESSED_SUFFIXES_PATTERN = '(' + '|'.join(re.escape(suffix) for suffix in COMPRESSION_SUFFIXES.values()) + ')?'
+_SEQUENCE_SUFFIX_PATTERN = r'\.(\d{8})' + _COMPRESSED_SUFFIXES_PATTERN + '$'
+_RENAME_SUFFIX_PATTERN = r'\.(\d{2,7})' + _COMPRESSED_SUFFIXES_PATTERN + '$'
+
+
+def _find_backups(filename, suffix_pattern):
+    """
+    :returns: dict of backup number -> backup path (with the compression suffix, if the backup is compressed)
+    """
+    dirname, basename = os.path.split(os.path.abspath(filename))
+    pattern = re.compile(re.escape(basename) + suffix_pattern)
+    try:
+        names = os.listdir(dirname)
+    except OSError:
+        return dict()
+    backups = dict()
+    for match in (pattern.match(name) for name in names):
+        if match and (int(match.group(1)) not in backups or not match.group(2)):  # prefer the uncompressed file
+            backups[int(match.group(1))] = os.path.join(os.path.dirname(filename), match.group(0))
+    return backups
+
+
+def _get_sequence_backups(filename):
+    """
+    :returns: sorted list of sequence numbers of the existing backups of `filename` in the sequence rotation scheme
+    """
+    return sorted(_find_backups(filename, _SEQUENCE_SUFFIX_PATTERN))
+
+
+def _remove_if_exists(path):
+    try:
+        os.remove(path)
+    except OSError:
+        e = sys.exc_info()[1]
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def list_backup_files(filename):
+    """
+    Lists the backup files of a log file, newest first (the same order as .01, .02, ... in the rename scheme),
+    regardless of the rotation scheme used to create them.
+    :param filename: log file path (without a suffix)
+    :returns: list of paths
+    """
+    sequence_backups = _find_backups(filename, _SEQUENCE_SUFFIX_PATTERN)
+    if sequence_backups:
+        return [sequence_backups[n] for n in sorted(sequence_backups, reverse=True)]
+    rename_backups = _find_backups(filename, _RENAME_SUFFIX_PATTERN)
+    return [rename_backups[n] for n in sorted(rename_backups)]
+
+
+def link_backup_files(filename, dirname):
+    """
+    Creates a compatibility view of the backups of a log file: symbolic links named like the rename scheme backups
+    (<basename>.01 is the newest backup, <basename>.02 the one before it, ...) pointing to the actual backup files.
+    Links to compressed backups keep the compression suffix (e.g. <basename>.01.gz).
+    :param filename: log file path (without a suffix)
+    :param dirname: directory to create the links in. Existing links with the same names are replaced.
+    :returns: list of the created link paths
+    """
+    basename = os.path.basename(filename)
+    links = []
+    for i, path in enumerate(list_backup_files(filename), 1):
+        suffix = re.search(_COMPRESSED_SUFFIXES_PATTERN + '$', path).group(0)
+        link = os.path.join(dirname, '{}.{:02}{}'.format(basename, i, suffix))
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(os.path.abspath(path), link)
+        links.append(link)
+    return links
+
+
+class _CompressionJob(object):
+    def __init__(self, key):
+        self.key = key  # backup number (shifted on each rollover in the rename scheme)
 
 
 class RotatingFileHandler(logbook.RotatingFileHandler):
     """Similar to logbook's `RotatingFileHandler`, but the backup files use leading zeros in the suffix so it'll be
-    easier to sort when listing files (e.g. x.01, x.02 and not x.1, x.2)."""
+    easier to sort when listing files (e.g. x.01, x.02 and not x.1, x.2).
+
+    With `rotation_scheme='sequence'` backups are never renamed: each rollover renames the current file to the next
+    sequence number (x.00000001, x.00000002, ...) and deletes the oldest backup, so a rollover takes a constant number
+    of filesystem operations instead of one rename per backup. Use `list_backup_files` or `link_backup_files` to view
+    the backups in the rename scheme order.
+
+    With `compression` set to 'gzip', 'bz2' or 'lzma', each backup is compressed in the background after the rollover
+    (x.01.gz, x.00000001.gz, ...), using up to `max_compression_jobs` threads. Until its compression is done a backup
+    stays uncompressed.
+
+    With `index_tags=True`, each backup's request ID tags are indexed in the background after the rollover (after the
+    compression, if enabled), so `find_tag_records` can seek directly to the records of a tag."""
+    def __init__(self, filename, mode='a', encoding='utf-8', level=logbook.NOTSET, format_string=None, delay=False,
+                 max_size=1024 * 1024, backup_count=5, filter=None, bubble=False, rotation_scheme=ROTATION_RENAME,
+                 compression=None, max_compression_jobs=1, index_tags=False):
+        if rotation_scheme not in ROTATION_SCHEMES:
+            raise ValueError("rotation_scheme must be one of {!r}, not {!r}".format(ROTATION_SCHEMES, rotation_scheme))
+        if compression is not None:
+            check_compression(compression)
+        super(RotatingFileHandler, self).__init__(filename, mode=mode, encoding=encoding, level=level,
+                                                  format_string=format_string, delay=delay, max_size=max_size,
+                                                  backup_count=backup_count, filter=filter, bubble=bubble)
+        self.rotation_scheme = rotation_scheme
+        if rotation_scheme == ROTATION_SEQUENCE:
+            self._sequence_backups = deque(_get_sequence_backups(self._filename))
+        self.compression = compression
+        if compression is not None:
+            self._compression_queue = CompressionQueue(max_compression_jobs)
+            self._compression_jobs = []
+            # protects backup renames/deletes from running concurrently with the end of compression jobs. This must be
+            # a real OS lock since it's shared with the compression threads.
+            self._backups_lock = get_native_thread_functions()[1]()
+        self.index_tags = index_tags
+        if index_tags:
+            self._index_queue = CompressionQueue()
+
+    def _get_backup_path(self, key):
+        if self.rotation_scheme == ROTATION_SEQUENCE:
+            return _SEQUENCE_SUFFIX_FORMAT.format(self._filename, key)
+        return '{}.{:02}'.format(self._filename, key)
+
+    def _is_backup_retained(self, key):
+        if self.rotation_scheme == ROTATION_SEQUENCE:
+            return key in self._sequence_backups
+        return key <= self.backup_count
+
+    def _remove_backup(self, key):
+        path = self._get_backup_path(key)
+        for suffix in [''] + list(COMPRESSION_SUFFIXES.values()):
+            _remove_if_exists(path + suffix)
+
     def perform_rollover(self):
+        exception_dedup = get_formatter_exception_dedup(self.formatter)
+        if exception_dedup is not None:
+            exception_dedup.reset()  # the new file gets the full tracebacks again
+        if self.compression is not None:
+            with self._backups_lock:
+                job = self._perform_rollover()
+                self._compression_jobs.append(job)
+                self._remove_stale_compression_files()
+            self._compression_queue.submit(lambda: self._compress_backup(job))
+        else:
+            self._perform_rollover()
+            if self.index_tags:
+                # the backup is opened now since it may be renamed by the next rollover before it's indexed
+                key = self._sequence_backups[-1] if self.rotation_scheme == ROTATION_SEQUENCE else 1
+                backup = open(self._get_backup_path(key), 'rb')
+                self._index_queue.submit(lambda: self._index_backup(backup))
+
+    def _perform_rollover(self):
+        """
+        :returns: compression job of the new backup if compression is enabled, otherwise None
+        """
+        if self.rotation_scheme == ROTATION_SEQUENCE:
+            return self._perform_sequence_rollover()
+        elif self.compression is not None:
+            return self._perform_compressed_rollover()
         # Code here is almost the same as the base class's perform_rollover except for the src and dst formatting.
         self.stream.close()
         for x in range(self.backup_count - 1, 0, -1):
@@ -19,3 +184,109 @@ class RotatingFileHandler(logbook.RotatingFileHandler):
                     raise
         rename(self._filename, self._filename + '.01')
         self._open('w')
+
+    def _perform_compressed_rollover(self):
+        # Same as the rename scheme rollover, but the backups may be compressed. The oldest backup is removed first
+        # since an uncompressed backup won't be replaced by the rename of a compressed backup.
+        self.stream.close()
+        self._remove_backup(self.backup_count)
+        compressed_suffix = COMPRESSION_SUFFIXES[self.compression]
+        for x in range(self.backup_count - 1, 0, -1):
+            for suffix in ('', compressed_suffix):
+                try:
+                    rename('{}.{:02}{}'.format(self._filename, x, suffix),
+                           '{}.{:02}{}'.format(self._filename, x + 1, suffix))
+                except OSError:
+                    e = sys.exc_info()[1]
+                    if e.errno != errno.ENOENT:
+                        raise
+        for job in self._compression_jobs:
+            job.key += 1
+        rename(self._filename, self._filename + '.01')
+        self._open('w')
+        return _CompressionJob(1)
+
+    def _perform_sequence_rollover(self):
+        self.stream.close()
+        backups = self._sequence_backups
+        n = backups[-1] + 1 if backups else 1
+        rename(self._filename, _SEQUENCE_SUFFIX_FORMAT.format(self._filename, n))
+        backups.append(n)
+        while len(backups) > self.backup_count:
+            self._remove_backup(backups.popleft())
+        self._open('w')
+        return None if self.compression is None else _CompressionJob(n)
+
+    def _get_compression_tmp_path(self, job):
+        return "{}.{}.compressing".format(self._filename, id(job))
+
+    def _remove_stale_compression_files(self):
+        """Removes the temporary files of compressions that didn't finish (e.g. if the process was killed)."""
+        current = set(self._get_compression_tmp_path(job) for job in self._compression_jobs)
+        dirname, basename = os.path.split(self._filename)
+        for name in os.listdir(dirname or os.curdir):
+            path = os.path.join(dirname, name)
+            if name.startswith(basename + '.') and name.endswith('.compressing') and path not in current:
+                _remove_if_exists(path)
+
+    def _compress_backup(self, job):
+        """Compresses a backup file. Runs on a compression thread."""
+        tmp_path = self._get_compression_tmp_path(job)
+        compressed = None
+        try:
+            with self._backups_lock:
+                if not self._is_backup_retained(job.key):
+                    return
+                src = open(self._get_backup_path(job.key), 'rb')
+            with src:
+                compress_file(src, tmp_path, self.compression)
+            with self._backups_lock:
+                if self._is_backup_retained(job.key):
+                    path = self._get_backup_path(job.key)
+                    rename(tmp_path, path + COMPRESSION_SUFFIXES[self.compression])
+                    _remove_if_exists(path)
+                    if self.index_tags:
+                        compressed = open(path + COMPRESSION_SUFFIXES[self.compression], 'rb')
+        except Exception:
+            try:
+                sys.stderr.write("infi.logging: failed to compress a backup of {}: {}\n".format(self._filename,
+                                                                                               sys.exc_info()[1]))
+            except Exception:
+                pass
+        finally:
+            with self._backups_lock:
+                self._compression_jobs.remove(job)
+            _remove_if_exists(tmp_path)
+        if compressed is not None:
+            self._index_backup(compressed)
+
+    def _index_backup(self, backup):
+        """Builds the tag index of a backup file. Runs on a compression or index thread."""
+        try:
+            with backup:
+                build_tag_index(self._filename, backup)
+        except Exception:
+            try:
+                sys.stderr.write("infi.logging: failed to index a backup of {}: {}\n".format(self._filename,
+                                                                                            sys.exc_info()[1]))
+            except Exception:
+                pass
+
+    def wait_for_compression(self):
+        """Waits until all the pending backup compressions (and the tag indexing that follows them) are done."""
+        if self.compression is not None:
+            self._compression_queue.wait()
+
+    def wait_for_tag_index(self):
+        """Waits until all the pending backup compressions and tag indexing are done."""
+        self.wait_for_compression()
+        if self.index_tags:
+            self._index_queue.wait()
+
+    def close(self):
+        """Closes the file and waits until all the pending backup compressions and tag indexing are done."""
+        super(RotatingFileHandler, self).close()
+        if self.compression is not None:
+            self._compression_queue.close()
+        if self.index_tags:
+            self._index_queue.close()
@@ -0,0 +1,279 @@
+"""
+Request ID tag index of log files written with the default formatter.
+
+Each index maps the tags (the "tag=xxxxxxxx" field of the request_id_tag plugin) of a log file to the byte offsets of
+the records that have them, and stores the time range of each block of the file. Indexes are stored in a sidecar
+directory next to the log file (.<basename>.tags) and are named after the inode, size and modification time of the
+indexed file, so an index stays valid when a backup is renamed by a rollover and is ignored once the file changes.
+
+Index file format:
+
+    INFITAGS 1
+    <JSON list of [block offset, first time, last time]>
+    <tag> <offset>,<offset>,...      (one line per tag, sorted by tag)
+
+Lookups binary-search the tag lines, so they don't load the index.
+"""
+import os
+import re
+import json
+from .log_files import open_log_file, get_record_time, is_record_start
+
+INDEX_MAGIC = b'INFITAGS 1\n'
+BLOCK_SIZE = 64 * 1024
+_TAG_PATTERN = re.compile(br' tag=(\S*)')
+_EMPTY_TAG = b'00000000'
+
+
+def _get_tag(line):
+    """:returns: the tag of a record's first line, taken from the fields before the message, or None"""
+    match = _TAG_PATTERN.search(line.split(b' msg=', 1)[0])
+    return None if match is None else match.group(1)
+
+
+def format_tag(tag):
+    """
+    :returns: the tag as it appears in the log (padded like the request_id_tag formatter plugin does)
+    """
+    from ..plugins.request_id_tag import RequestIDTagFormatterPlugin
+    return RequestIDTagFormatterPlugin().get_format_string().format(tag)
+
+
+def get_index_dir(filename):
+    """
+    :param filename: log file path (without a suffix)
+    :returns: path of the directory that holds the indexes of the log file and its backups
+    """
+    dirname, basename = os.path.split(filename)
+    return os.path.join(dirname, '.{}.tags'.format(basename))
+
+
+def _get_index_name(st):
+    return '{}-{}-{}-{}.idx'.format(st.st_dev, st.st_ino, st.st_size, int(st.st_mtime))
+
+
+def _scan(f):
+    """
+    :param f: log file opened for binary reading
+    :returns: tuple of (dict of tag -> list of record offsets, list of [block offset, first time, last time])
+    """
+    tags = dict()
+    blocks = []
+    offset = 0
+    for line in f:
+        time = get_record_time(line)
+        if time is not None:
+            if not blocks or offset >= blocks[-1][0] + BLOCK_SIZE:
+                blocks.append([offset, None, None])
+            block = blocks[-1]
+            block[1] = block[1] or time
+            block[2] = time
+            tag = _get_tag(line)
+            if tag and tag != _EMPTY_TAG:
+                tags.setdefault(tag, []).append(offset)
+        offset += len(line)
+    return tags, blocks
+
+
+def build_tag_index(filename, f):
+    """
+    Builds the index of a log file (or backup) and removes indexes of files that no longer exist.
+    :param filename: log file path (without a suffix) the indexed file belongs to
+    :param f: the file to index (log file or backup), opened for binary reading. It is read through the decompressor
+              if it's compressed, but the index is named after the compressed file.
+    :returns: path of the index
+    """
+    st = os.fstat(f.fileno())
+    reader = open_log_file(f.name, f)
+    try:
+        tags, blocks = _scan(reader)
+    finally:
+        if reader is not f:
+            reader.close()
+    index_dir = get_index_dir(filename)
+    if not os.path.isdir(index_dir):
+        os.makedirs(index_dir)
+    path = os.path.join(index_dir, _get_index_name(st))
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as index:
+        index.write(INDEX_MAGIC)
+        index.write(json.dumps(blocks).encode('ascii') + b'\n')
+        for tag in sorted(tags):
+            index.write(tag + b' ' + b','.join(str(offset).encode('ascii') for offset in tags[tag]) + b'\n')
+    os.rename(tmp_path, path)
+    _remove_stale_indexes(filename)
+    return path
+
+
+def _remove_stale_indexes(filename):
+    from .rotating_file_handler import list_backup_files
+    index_dir = get_index_dir(filename)
+    valid_names = set()
+    for path in list_backup_files(filename):
+        try:
+            valid_names.add(_get_index_name(os.stat(path)))
+        except OSError:
+            pass
+    for name in os.listdir(index_dir):
+        if name.endswith('.idx') and name not in valid_names:
+            try:
+                os.remove(os.path.join(index_dir, name))
+            except OSError:
+                pass
+
+
+class TagIndex(object):
+    """Index of a single log file, opened without loading the tags."""
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        if self._file.readline() != INDEX_MAGIC:
+            self._file.close()
+            raise ValueError("{} is not a tag index".format(path))
+        self.blocks = json.loads(self._file.readline().decode('ascii'))
+        self._start = self._file.tell()
+        self._end = os.fstat(self._file.fileno()).st_size
+
+    def close(self):
+        self._file.close()
+
+    def get_time_range(self):
+        """
+        :returns: tuple of the first and last record time in the indexed file (str or None if unknown)
+        """
+        first_times = [block[1] for block in self.blocks if block[1] is not None]
+        last_times = [block[2] for block in self.blocks if block[2] is not None]
+        return (min(first_times) if first_times else None, max(last_times) if last_times else None)
+
+    def _line_at(self, position):
+        """
+        :returns: tuple of (first line that starts at or after `position`, its start position)
+        """
+        f = self._file
+        if position <= self._start:
+            f.seek(self._start)
+        else:
+            f.seek(position - 1)
+            f.readline()
+        start = f.tell()
+        return f.readline(), start
+
+    def lookup(self, tag):
+        """
+        :param tag: tag as it appears in the log (see `format_tag`)
+        :returns: list of offsets of the records with the tag
+        """
+        key = tag.encode('ascii', 'replace')
+        lo, hi = self._start, self._end
+        while lo < hi:
+            mid = (lo + hi) // 2
+            line, start = self._line_at(mid)
+            if start < self._end and line.split(b' ', 1)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        line, start = self._line_at(lo)
+        line_tag, _, offsets = line.rstrip(b'\n').partition(b' ')
+        if start >= self._end or line_tag != key:
+            return []
+        return [int(offset) for offset in offsets.split(b',')]
+
+
+def open_tag_index(filename, path):
+    """
+    :param filename: log file path (without a suffix)
+    :param path: path of the log file or one of its backups
+    :returns: `TagIndex` of the file or None if the file has no up-to-date index
+    """
+    try:
+        return TagIndex(os.path.join(get_index_dir(filename), _get_index_name(os.stat(path))))
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _read_records_at(f, offsets):
+    """
+    Reads the records that start at the given (sorted) offsets. The file is only read forward, since seeking backward
+    in a compressed file means decompressing it again from the start.
+    """
+    pending, pending_position = None, None  # line read after the previous record and its offset
+    for offset in offsets:
+        if pending_position == offset:
+            line = pending
+        else:
+            f.seek(offset)
+            line = f.readline()
+        lines = [line]
+        position = offset + len(line)
+        while True:
+            line = f.readline()
+            if not line or is_record_start(line):
+                break
+            lines.append(line)
+            position += len(line)
+        pending, pending_position = line, position
+        yield b''.join(lines)
+
+
+def _scan_records(f, key):
+    """Reads the records with the tag `key` by scanning the whole file."""
+    record = None
+    for line in f:
+        if is_record_start(line):
+            if record is not None:
+                yield b''.join(record)
+            record = [line] if _get_tag(line) == key else None
+        elif record is not None:
+            record.append(line)
+    if record is not None:
+        yield b''.join(record)
+
+
+def _is_in_range(time, since, until):
+    return time is None or ((since is None or time >= since) and (until is None or time <= until))
+
+
+def _find_in_file(path, offsets, tag, since, until, encoding):
+    with open_log_file(path) as f:
+        if offsets is None:
+            records = _scan_records(f, tag.encode('ascii', 'replace'))
+        else:
+            records = _read_records_at(f, offsets)
+        for record in records:
+            if _is_in_range(get_record_time(record), since, until):
+                yield record.decode(encoding, 'replace')
+
+
+def find_tag_records(filename, tag, since=None, until=None, encoding='utf-8'):
+    """
+    Finds the records with a request ID tag in a log file and its backups, oldest first. Backups that have an index
+    are searched through it (files whose time range is outside `since`-`until` aren't even opened), the rest (e.g. the
+    current log file) are scanned.
+    :param filename: log file path (without a suffix)
+    :param tag: request ID tag (e.g. as returned by `get_tag`)
+    :param since: if not None, skip records before this time (str in the format of the time plugin)
+    :param until: if not None, skip records after this time
+    :returns: generator of records (str, a record may span several lines if it has a traceback)
+    """
+    from .rotating_file_handler import list_backup_files
+    tag = format_tag(tag)
+    since = since if since is None else since.replace('T', ' ')
+    until = until if until is None else until.replace('T', ' ')
+    for path in list(reversed(list_backup_files(filename))) + [filename]:
+        if not os.path.exists(path):
+            continue
+        index = open_tag_index(filename, path)
+        if index is None:
+            offsets = None
+        else:
+            try:
+                first, last = index.get_time_range()
+                if (since is not None and last is not None and last < since) or \
+                   (until is not None and first is not None and first > until):
+                    continue
+                offsets = index.lookup(tag)
+            finally:
+                index.close()
+            if not offsets:
+                continue
+        for record in _find_in_file(path, offsets, tag, since, until, encoding):
+            yield record
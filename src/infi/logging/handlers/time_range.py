@@ -0,0 +1,143 @@
+"""
+Reading the records of a time range from a log file and its backups, for logs written with the time plugin (each
+record starts with its time, and records are written in nearly time order).
+
+Files are ordered by the time of their first record. Within an uncompressed file the first record of the range is
+found with a binary search on byte offsets: each probe resynchronizes to the next line boundary and skips lines that
+don't start with a time (e.g. tracebacks), so it always lands on the start of a record. Compressed backups can't be
+searched this way and are read from the start.
+"""
+import os
+from .compression import COMPRESSION_SUFFIXES
+from .log_files import open_log_file, get_record_time
+
+_TAIL_SIZE = 64 * 1024
+
+
+def _normalize_time(t):
+    return None if t is None else str(t).replace('T', ' ')
+
+
+def _next_record_start(f, position):
+    """
+    :returns: tuple of (offset, time) of the first record that starts at or after `position`, or (None, None)
+    """
+    if position > 0:
+        f.seek(position - 1)
+        f.readline()
+    else:
+        f.seek(0)
+    while True:
+        offset = f.tell()
+        line = f.readline()
+        if not line:
+            return None, None
+        time = get_record_time(line)
+        if time is not None:
+            return offset, time
+
+
+def _get_last_time(f):
+    """
+    :returns: time of the last record of an uncompressed file or None if there are no records
+    """
+    f.seek(0, os.SEEK_END)
+    position = end = f.tell()
+    while position > 0:
+        position = max(0, position - _TAIL_SIZE)
+        f.seek(position)
+        if position > 0:
+            f.readline()
+        times = [time for time in (get_record_time(line) for line in f.read(end - f.tell()).splitlines())
+                 if time is not None]
+        if times:
+            return times[-1]
+    return None
+
+
+def find_time_offset(f, since):
+    """
+    Binary-searches an uncompressed log file for the first record at or after a time.
+    :param f: log file opened for binary reading
+    :param since: time str (in the format of the time plugin, e.g. '2020-01-02 14:02:00')
+    :returns: offset of the first record whose time is not before `since` (the file size if there's none)
+    """
+    f.seek(0, os.SEEK_END)
+    lo, hi = 0, f.tell()
+    while lo < hi:
+        mid = (lo + hi) // 2
+        offset, time = _next_record_start(f, mid)
+        if offset is not None and time < since:
+            lo = mid + 1
+        else:
+            hi = mid
+    offset, _ = _next_record_start(f, lo)
+    return f.tell() if offset is None else offset
+
+
+def _read_records(f, since, until):
+    """Reads the records from the current position of `f` until the first record after `until`."""
+    record = None
+    for line in f:
+        time = get_record_time(line)
+        if time is not None:
+            if record is not None:
+                yield b''.join(record)
+            if until is not None and time[:len(until)] > until:
+                return
+            record = [line] if since is None or time >= since else None
+        elif record is not None:
+            record.append(line)
+    if record is not None:
+        yield b''.join(record)
+
+
+def _is_compressed(path):
+    return path.endswith(tuple(COMPRESSION_SUFFIXES.values()))
+
+
+def _get_first_time(path):
+    with open_log_file(path) as f:
+        for line in f:
+            time = get_record_time(line)
+            if time is not None:
+                return time
+    return None
+
+
+def read_time_range(filename, since=None, until=None, encoding='utf-8'):
+    """
+    Reads the records between two times from a log file and its backups, oldest first. Files are opened one at a time
+    as the generator is consumed, and files outside the range aren't read.
+    Since records are expected in time order, reading stops at the first record after `until`.
+    :param filename: log file path (without a suffix)
+    :param since: start time (str in the format of the time plugin or datetime), or None to start from the first record
+    :param until: end time (inclusive, a prefix such as '2020-01-02 14:05' includes all of 14:05), or None to read
+                  until the last record
+    :returns: generator of records (str, a record may span several lines if it has a traceback)
+    """
+    from .rotating_file_handler import list_backup_files
+    since, until = _normalize_time(since), _normalize_time(until)
+    files = []
+    for path in list(reversed(list_backup_files(filename))) + [filename]:
+        try:
+            first_time = _get_first_time(path)
+        except (IOError, OSError):
+            continue
+        if first_time is not None:
+            files.append((first_time, path))
+    files.sort()
+    for i, (first_time, path) in enumerate(files):
+        if until is not None and first_time[:len(until)] > until:
+            return
+        next_first_time = files[i + 1][0] if i + 1 < len(files) else None
+        if since is not None and next_first_time is not None and next_first_time < since:
+            continue  # the next file starts before the range, so this file ends before it
+        with open_log_file(path) as f:
+            if not _is_compressed(path) and since is not None:
+                last_time = _get_last_time(f)
+                if last_time is None or last_time < since:
+                    continue
+                f.seek(find_time_offset(f, since))
+            for record in _read_records(f, since, until):
+                yield record.decode(encoding, 'replace')
@@ -0,0 +1,52 @@
+import sys
+import time
+
+_PY2_LOCK_POLL_INTERVAL = 0.005
+
+
+def get_native_thread_functions():
+    """
+    :returns: (start_new_thread, allocate_lock) of the real OS threads, even if gevent monkey-patched the thread module
+    """
+    module_name = '_thread' if sys.version_info[0] >= 3 else 'thread'
+    try:
+        from gevent.monkey import get_original
+        return get_original(module_name, ['start_new_thread', 'allocate_lock'])
+    except ImportError:
+        module = __import__(module_name)
+        return module.start_new_thread, module.allocate_lock
+
+
+def get_native_thread_ident():
+    """
+    :returns: identifier of the current real OS thread, even if gevent monkey-patched the thread module
+    """
+    try:
+        from gevent.monkey import get_original
+        return get_original('_thread' if sys.version_info[0] >= 3 else 'thread', 'get_ident')()
+    except ImportError:
+        import threading
+        return threading.current_thread().ident
+
+
+def acquire_native_lock(lock, timeout):
+    """
+    Acquires a lock returned by `get_native_thread_functions`, giving up after `timeout` seconds. Python 2 locks don't
+    take a timeout, so on Python 2 the lock is polled (sleeping with the original `time.sleep`, since this is called
+    from real OS threads).
+    :returns: True if the lock was acquired
+    """
+    if sys.version_info[0] >= 3:
+        return lock.acquire(True, timeout)
+    try:
+        from gevent.monkey import get_original
+        sleep = get_original('time', 'sleep')
+    except ImportError:
+        sleep = time.sleep
+    deadline = time.time() + timeout
+    while not lock.acquire(False):
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        sleep(min(remaining, _PY2_LOCK_POLL_INTERVAL))
+    return True
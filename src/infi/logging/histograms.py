@@ -0,0 +1,81 @@
+"""
+Histograms of durations.
+"""
+BUCKET_COUNT = 32
+
+
+class DurationHistogram(object):
+    """
+    Log-bucketed histogram of durations (e.g. greenlet run times or event loop lags). Bucket 0 counts durations shorter
+    than 1 microsecond, bucket i counts durations of [2 ** (i - 1), 2 ** i) microseconds and the last bucket also counts
+    all the longer durations. The buckets are preallocated, so adding a duration doesn't allocate.
+    `min` is infinite while the histogram is empty.
+    """
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def add(self, duration):
+        """
+        :param duration: duration in seconds
+        """
+        bucket = int(duration * 1000000).bit_length()
+        self.counts[bucket if bucket < BUCKET_COUNT else BUCKET_COUNT - 1] += 1
+        self.count += 1
+        self.total += duration
+        if duration < self.min:
+            self.min = duration
+        if duration > self.max:
+            self.max = duration
+
+    def reset(self):
+        counts = self.counts
+        for i in range(BUCKET_COUNT):
+            counts[i] = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def copy(self):
+        result = DurationHistogram()
+        result.counts[:] = self.counts
+        result.count, result.total, result.min, result.max = self.count, self.total, self.min, self.max
+        return result
+
+    @staticmethod
+    def get_bucket_bounds(i):
+        """
+        :returns: tuple of the (inclusive) lower and (exclusive) upper bounds of bucket `i` in seconds. The upper bound
+                  of the last bucket is None.
+        """
+        return (0.0 if i == 0 else 2 ** (i - 1) / 1000000.0,
+                None if i == BUCKET_COUNT - 1 else 2 ** i / 1000000.0)
+
+    def get_percentile(self, percent):
+        """
+        :param percent: percentile to get (0-100)
+        :returns: upper bound in seconds of the bucket the percentile falls in (not more than the maximum duration),
+                  or None if there are no durations
+        """
+        if not self.count:
+            return None
+        threshold = self.count * percent / 100.0
+        accumulated = 0
+        for i, count in enumerate(self.counts):
+            accumulated += count
+            if accumulated >= threshold and count:
+                upper = self.get_bucket_bounds(i)[1]
+                return self.max if upper is None else min(upper, self.max)
+        return self.max
+
+    def __str__(self):
+        if not self.count:
+            return "count=0"
+        return ("count={} total={:.4f}s avg={:.6f}s min={:.6f}s p50<={:.6f}s p99<={:.6f}s p99.9<={:.6f}s "
+                "max={:.6f}s").format(self.count, self.total, self.total / self.count, self.min,
+                                      self.get_percentile(50), self.get_percentile(99), self.get_percentile(99.9),
+                                      self.max)
@@ -0,0 +1,75 @@
+"""
+Level-aware logger groups: loggers reject records below the lowest level accepted by a set of handlers before the
+records are created, so disabled levels (e.g. DEBUG when all the handlers are at INFO) cost only a level comparison.
+
+Logbook loggers without an explicit level take the level of their group, and without a group they have the NOTSET
+level, so every record is created and passed to the handlers. The loggers added to a `LevelAwareLoggerGroup` take the
+minimum level of its handlers instead. Nothing changes for the other loggers.
+"""
+import logbook
+from infi.pyutils.contexts import contextmanager
+
+
+def get_handler_level(handler):
+    """
+    :param handler: logbook handler
+    :returns: the lowest level of the records the handler passes on. For handlers that wrap another handler (e.g.
+              `DuplicateSuppressingHandler` or `RequestBufferHandler`) the level of the wrapped handler counts too.
+    """
+    level = handler.level
+    wrapped = getattr(handler, 'handler', None)
+    if isinstance(wrapped, logbook.Handler):
+        level = max(level, get_handler_level(wrapped))
+    return level
+
+
+class LevelAwareLoggerGroup(logbook.LoggerGroup):
+    """
+    Logger group whose level is the lowest level of its handlers, so its loggers that don't set their own level reject
+    the records that none of the handlers would accept before creating them. The level is computed from the current
+    levels of the handlers every time it's checked, so changing the level of a handler takes effect immediately.
+    Handlers that are not in `handlers` (e.g. pushed later with a lower level) won't receive the rejected records.
+    """
+    def __init__(self, handlers, loggers=None, processor=None):
+        """
+        :param handlers: list of the installed handlers (blackhole handlers such as `logbook.NullHandler` are ignored)
+        :param loggers: list of loggers to add to the group
+        """
+        self.handlers = [handler for handler in handlers if not handler.blackhole]
+        logbook.LoggerGroup.__init__(self, loggers, processor=processor)
+
+    @property
+    def level(self):
+        if self._level != logbook.NOTSET:
+            return self._level
+        return min(get_handler_level(handler) for handler in self.handlers) if self.handlers else logbook.NOTSET
+
+    @level.setter
+    def level(self, level):
+        """An explicit level other than NOTSET overrides the level of the handlers."""
+        self._level = logbook.lookup_level(level)
+
+
+@contextmanager
+def level_aware_logging_context(handlers, loggers):
+    """
+    Adds `loggers` to a `LevelAwareLoggerGroup` of `handlers` for the duration of the context (the level and processor
+    of a group they belonged to don't apply meanwhile). When the context exits the loggers are returned to the groups
+    they belonged to before.
+    :param handlers: list of the installed handlers
+    :param loggers: list of logbook loggers
+    :returns: the `LevelAwareLoggerGroup`
+    """
+    previous_groups = [logger.group for logger in loggers]
+    for logger, group in zip(loggers, previous_groups):
+        if group is not None:
+            group.remove_logger(logger)
+    level_aware_group = LevelAwareLoggerGroup(handlers, loggers)
+    try:
+        yield level_aware_group
+    finally:
+        for logger, group in zip(loggers, previous_groups):
+            if logger.group is level_aware_group:
+                level_aware_group.remove_logger(logger)
+                if group is not None:
+                    group.add_logger(logger)
@@ -1,16 +1,30 @@
-import pkg_resources
+import os
+import sys
+import json
+import hashlib
+from importlib import import_module
 
 FORMATTER_PLUGIN_ENTRYPOINT = 'infi_logging_formatter_plugins'
 INJECTOR_PLUGIN_ENTRYPOINT = 'infi_logging_injector_plugins'
 
-_formatter_plugins = None
-_injector_plugins = None
+_entry_points = None   # entry point group -> list of (name, "module:attr") pairs
+_entry_points_fingerprint = None
+_plugins = dict()      # entry point group -> dict of plugin name -> loaded plugin or the ImportError raised loading it
+_plugin_cache_path = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+                                  'infi.logging', 'entry_points.json')
+_constants_version = 0
 
 
 class InjectorPlugin(object):
     def inject(self, record):
         raise NotImplementedError()  # subclass must override this method
 
+    def get_injected_extra_keys(self):
+        """
+        :returns: list of the `record.extra` keys this plugin sets, or None if unknown (the plugin will always run)
+        """
+        return None
+
 
 class FormatterPlugin(object):
     def get_value(self, record):
@@ -22,57 +36,249 @@ class FormatterPlugin(object):
     def get_format_key(self):
         raise NotImplementedError()  # subclass must override this method
 
+    def get_required_extra_keys(self):
+        """
+        :returns: list of the `record.extra` keys `get_value` reads, or None if unknown (all injectors will run)
+        """
+        return None
+
+    def get_value_expression(self, record_name):
+        """
+        Optional hook used by compiled formatters to inline the value lookup instead of calling `get_value`.
+        :param record_name: name of the variable that holds the logbook record in the generated code
+        :returns: a Python expression str that evaluates to the same value as `get_value`, or None if the plugin
+                  can't be inlined
+        """
+        return None
+
+    def is_constant(self):
+        """
+        Plugins whose value is the same for every record the process emits (e.g. host name, process ID) return True so
+        formatters can format the value once and bake it into their format string. If the value can change (e.g. after
+        a fork) the plugin must call `invalidate_constants` when it does.
+        :returns: True if the value is constant until the next call to `invalidate_constants`
+        """
+        return False
+
+    def get_constant_value(self):
+        """
+        :returns: the value of a constant plugin, used instead of `get_value` when `is_constant` returns True
+        """
+        raise NotImplementedError()  # constant plugins must override this method
+
+    def has_formatted_value(self):
+        """
+        Plugins that format their value faster than formatting `get_value` with `get_format_string` (e.g. by caching)
+        return True, and the formatters that build their format string from the plugins' format strings use
+        `get_formatted_value` instead. Custom format strings still get the value from `get_value`.
+        :returns: True if the plugin implements `get_formatted_value`
+        """
+        return False
+
+    def get_formatted_value(self, record):
+        """
+        :returns: the formatted value str, used instead of `get_value` when `has_formatted_value` returns True
+        """
+        raise NotImplementedError()  # plugins that have a formatted value must override this method
+
+    def get_json_type(self):
+        """
+        Optional hook used by the JSON formatter to encode values of a known type faster. Values that turn out not to
+        match the declared type are encoded like values of undeclared types.
+        :returns: `int` if `get_value` returns ints, `str` if it returns strs, or None if the value can be of any type
+        """
+        return None
+
+
+def invalidate_constants():
+    """Notifies formatters that the value of one or more constant formatter plugins has changed."""
+    global _constants_version
+    _constants_version += 1
+
+
+def get_constants_version():
+    """
+    :returns: a number that changes every time `invalidate_constants` is called
+    """
+    return _constants_version
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=invalidate_constants)  # process ID changes after fork
+
 
 def _true(name):
     return True
 
 
+def set_plugin_cache_path(path):
+    """
+    Sets the path of the on-disk cache of the plugin entry points index. The cache saves scanning all the installed
+    distributions on startup, and is discarded when the installed distributions change.
+    :param path: file path, or None to disable the on-disk cache
+    """
+    global _plugin_cache_path
+    _plugin_cache_path = path
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+def _get_environment_fingerprint():
+    """
+    :returns: str that changes when distributions are installed/removed/upgraded in any of the `sys.path` directories,
+              or when the entry points of a distribution are rewritten in place (e.g. by `setup.py develop`)
+    """
+    fingerprint = hashlib.sha1(repr((sys.executable, sys.version)).encode('utf-8'))
+    for path in sys.path:
+        fingerprint.update(repr((path, _get_mtime(path))).encode('utf-8'))
+        try:
+            names = sorted(os.listdir(path))
+        except (OSError, TypeError, ValueError):
+            continue
+        for name in names:
+            if name.endswith(('.egg-info', '.dist-info')):
+                metadata_path = os.path.join(path, name)
+                entry_points_path = os.path.join(metadata_path, 'entry_points.txt')
+                mtimes = (name, _get_mtime(metadata_path), _get_mtime(entry_points_path))
+                fingerprint.update(repr(mtimes).encode('utf-8'))
+    return fingerprint.hexdigest()
+
+
+def _read_plugin_cache(fingerprint):
+    try:
+        with open(_plugin_cache_path) as f:
+            cache = json.load(f)
+    except (IOError, OSError, TypeError, ValueError):
+        return dict()
+    if not isinstance(cache, dict) or cache.get('fingerprint') != fingerprint:
+        return dict()
+    return dict((group, [tuple(item) for item in items]) for group, items in cache.get('entry_points', {}).items())
+
+
+def _write_plugin_cache(fingerprint, entry_points):
+    try:
+        dirname = os.path.dirname(_plugin_cache_path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmp_path = "{}.{}.tmp".format(_plugin_cache_path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(fingerprint=fingerprint, entry_points=entry_points), f)
+        os.rename(tmp_path, _plugin_cache_path)
+    except (IOError, OSError, TypeError):
+        pass  # the cache is only an optimization
+
+
+def _scan_entry_points(entry_point_key):
+    """
+    :returns: list of (name, "module:attr") pairs of the entry points installed under `entry_point_key`
+    """
+    try:
+        from importlib import metadata
+    except ImportError:
+        try:
+            import importlib_metadata as metadata
+        except ImportError:
+            metadata = None
+    if metadata is None:
+        import pkg_resources    # Python 2.x
+        return [(entrypoint.name, "{}:{}".format(entrypoint.module_name, ".".join(entrypoint.attrs)))
+                for entrypoint in pkg_resources.iter_entry_points(entry_point_key)]
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        entry_points = entry_points.select(group=entry_point_key)
+    else:   # before Python 3.10 entry_points() returns a dict
+        entry_points = entry_points.get(entry_point_key, [])
+    result, names = [], set()
+    for entrypoint in entry_points:
+        if entrypoint.name not in names:  # the same distribution can appear more than once in sys.path
+            names.add(entrypoint.name)
+            result.append((entrypoint.name, entrypoint.value))
+    return result
+
+
+def get_entry_points(entry_point_key):
+    """
+    Returns the entry points installed under a key, without loading them. The index is read from the on-disk cache if
+    it's still valid, otherwise the installed distributions are scanned and the cache is updated.
+    :param entry_point_key: entry point group name
+    :returns: list of (name, "module:attr") pairs
+    """
+    global _entry_points, _entry_points_fingerprint
+    if _entry_points is None:
+        _entry_points_fingerprint = _get_environment_fingerprint() if _plugin_cache_path else None
+        _entry_points = _read_plugin_cache(_entry_points_fingerprint) if _plugin_cache_path else dict()
+    if entry_point_key not in _entry_points:
+        _entry_points[entry_point_key] = _scan_entry_points(entry_point_key)
+        if _entry_points_fingerprint is not None:
+            _write_plugin_cache(_entry_points_fingerprint, _entry_points)
+    return _entry_points[entry_point_key]
+
+
+def _load_entry_point(value):
+    module_name, _, attrs = value.split('[')[0].strip().partition(':')
+    obj = import_module(module_name.strip())
+    for attr in attrs.strip().split('.') if attrs.strip() else []:
+        obj = getattr(obj, attr)
+    return obj
+
+
 def load_plugins_by_entry_point(entry_point_key, predicate=_true, strict=False):
+    """
+    Loads the plugins installed under an entry point key. Plugins are imported on first use only, so plugins that are
+    filtered out by the predicate are never imported.
+    :param entry_point_key: entry point group name
+    :param predicate: predicate over plugin names to choose which plugins to load
+    :param strict: if True, raise ImportError if a plugin fails to load, otherwise skip it
+    :returns: dict of plugin name -> plugin
+    """
+    loaded = _plugins.setdefault(entry_point_key, dict())
     plugins = dict()
-    for entrypoint in pkg_resources.iter_entry_points(entry_point_key):
-        if predicate(entrypoint.name):
+    for name, value in get_entry_points(entry_point_key):
+        if not predicate(name):
+            continue
+        if name not in loaded:
             try:
-                plugins[entrypoint.name] = entrypoint.load()
+                loaded[name] = _load_entry_point(value)
             except ImportError:
-                if strict:
-                    raise
+                loaded[name] = sys.exc_info()[1]
+        if isinstance(loaded[name], ImportError):
+            if strict:
+                raise loaded[name]
+        else:
+            plugins[name] = loaded[name]
     return plugins
 
 
 def load_formatter_plugins(predicate=_true, strict=False):
-    global _formatter_plugins
-    if _formatter_plugins is None:
-        _formatter_plugins = load_plugins_by_entry_point(FORMATTER_PLUGIN_ENTRYPOINT, predicate, strict)
-    return _formatter_plugins
+    return load_plugins_by_entry_point(FORMATTER_PLUGIN_ENTRYPOINT, predicate, strict)
 
 
 def load_injector_plugins(predicate=_true, strict=False):
-    global _injector_plugins
-    if _injector_plugins is None:
-        _injector_plugins = load_plugins_by_entry_point(INJECTOR_PLUGIN_ENTRYPOINT, predicate, strict)
-    return _injector_plugins
+    return load_plugins_by_entry_point(INJECTOR_PLUGIN_ENTRYPOINT, predicate, strict)
 
 
 def get_injector_plugins(predicate=_true):
-    plugins = load_injector_plugins()
-    return dict((k, v) for k, v in plugins.items() if predicate(k))
+    return load_injector_plugins(predicate)
 
 
 def get_formatter_plugins(predicate=_true):
-    plugins = load_formatter_plugins()
-    return dict((k, v) for k, v in plugins.items() if predicate(k))
+    return load_formatter_plugins(predicate)
 
 
 def clear_formatter_plugins():
-    global _formatter_plugins
-    _formatter_plugins = None
+    _plugins.pop(FORMATTER_PLUGIN_ENTRYPOINT, None)
 
 
 def clear_injector_plugins():
-    global _injector_plugins
-    _injector_plugins = None
+    _plugins.pop(INJECTOR_PLUGIN_ENTRYPOINT, None)
 
 
 def clear_plugins():
-    clear_formatter_plugins()
-    clear_injector_plugins()
+    global _entry_points
+    _entry_points = None
+    _plugins.clear()
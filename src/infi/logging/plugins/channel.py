@@ -18,3 +18,9 @@ class ChannelFormatterPlugin(FormatterPlugin):
 
     def get_format_key(self):
         return "channel"
+
+    def get_value_expression(self, record_name):
+        return "{}.channel".format(record_name)
+
+    def get_required_extra_keys(self):
+        return []
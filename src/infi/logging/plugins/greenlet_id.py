@@ -25,6 +25,9 @@ class GreenletIDInjectorPlugin(InjectorPlugin):
     def inject(self, record):
         return inject_greenlet_id(record)
 
+    def get_injected_extra_keys(self):
+        return [GREENLET_ID_KEY]
+
 
 class GreenletIDFormatterPlugin(FormatterPlugin):
     def get_value(self, record):
@@ -35,3 +38,12 @@ class GreenletIDFormatterPlugin(FormatterPlugin):
 
     def get_format_key(self):
         return "greenlet_id"
+
+    def get_json_type(self):
+        return int
+
+    def get_value_expression(self, record_name):
+        return "{0}.extra.get({1!r}, -1) % {2}".format(record_name, GREENLET_ID_KEY, GREENLET_ID_MODULU)
+
+    def get_required_extra_keys(self):
+        return [GREENLET_ID_KEY]
@@ -1,29 +1,81 @@
-from infi.logging.plugins import InjectorPlugin, FormatterPlugin
+import os
+from infi.logging.plugins import InjectorPlugin, FormatterPlugin, invalidate_constants
+from infi.logging.globals import get_time
 from socket import gethostname
 
 HOST_NAME_KEY = 'host_name'
+_host_name = None
+_host_name_expiration = None
+_host_name_ttl = None
+
+
+def refresh_host_name():
+    """
+    Fetches the host name from the OS and caches it until the next refresh (or until the TTL expires, if one was set
+    with `set_host_name_ttl`).
+    """
+    global _host_name, _host_name_expiration
+    host_name = gethostname()
+    if host_name != _host_name:
+        invalidate_constants()
+    _host_name = host_name
+    _host_name_expiration = None if _host_name_ttl is None else get_time() + _host_name_ttl
+
+
+def clear_host_name():
+    """Clears the cached host name so it will be fetched again on the next call to `get_host_name`."""
+    global _host_name
+    _host_name = None
+    invalidate_constants()
+
+
+def set_host_name_ttl(ttl):
+    """
+    Sets how long the cached host name is valid. By default the host name is fetched once per process (and again after
+    a fork) or when `refresh_host_name` is called explicitly.
+    :param ttl: seconds to keep the cached host name, or None to keep it until explicitly refreshed
+    """
+    global _host_name_ttl
+    _host_name_ttl = ttl
+    clear_host_name()
+
+
+def get_host_name():
+    """
+    :returns: the cached host name, fetching it from the OS if needed
+    """
+    if _host_name is None or (_host_name_expiration is not None and get_time() >= _host_name_expiration):
+        refresh_host_name()
+    return _host_name
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=clear_host_name)
 
 
 def get_host_name_from_record(record):
     """
     :param record: logbook record
-    :returns: current thread ID from record
+    :returns: host name from record
     """
     return record.extra.get(HOST_NAME_KEY, '')
 
 
 def inject_host_name(record):
     """
-    Sets the current thread ID on `record.extra`.
+    Sets the host name on `record.extra`.
     :param record: logbook record
     """
-    record.extra[HOST_NAME_KEY] = gethostname()
+    record.extra[HOST_NAME_KEY] = get_host_name()
 
 
 class HostNameInjectorPlugin(InjectorPlugin):
     def inject(self, record):
         return inject_host_name(record)
 
+    def get_injected_extra_keys(self):
+        return [HOST_NAME_KEY]
+
 
 class HostNameFormatterPlugin(FormatterPlugin):
     def get_value(self, record):
@@ -34,3 +86,18 @@ class HostNameFormatterPlugin(FormatterPlugin):
 
     def get_format_key(self):
         return "hostname"
+
+    def get_json_type(self):
+        return str
+
+    def get_value_expression(self, record_name):
+        return "{}.extra.get({!r}, '')".format(record_name, HOST_NAME_KEY)
+
+    def is_constant(self):
+        return _host_name_ttl is None  # with a TTL the host name may change without an explicit refresh
+
+    def get_constant_value(self):
+        return get_host_name()
+
+    def get_required_extra_keys(self):
+        return [HOST_NAME_KEY]
@@ -18,3 +18,12 @@ class LogLevelFormatterPlugin(FormatterPlugin):
 
     def get_format_key(self):
         return "log_level"
+
+    def get_json_type(self):
+        return str
+
+    def get_value_expression(self, record_name):
+        return "'TRACE' if {0}.extra.get('TRACE', False) else {0}.level_name".format(record_name)
+
+    def get_required_extra_keys(self):
+        return ['TRACE']
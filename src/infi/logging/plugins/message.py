@@ -1,8 +1,115 @@
+import re
+import hashlib
+import traceback
 from infi.logging.plugins import FormatterPlugin
 
+EXCEPTION_REFERENCE_PATTERN = re.compile(r' exc=([0-9a-f]{12})(?: \(seen (\d+) times\))?$')
+_TRACEBACK_LOCATION_PATTERN = re.compile(r'^  File "(.*)", line (\d+), in (.*)$', re.MULTILINE)
+
+
+def _get_exception_locations(exc_info):
+    """:returns: list of str of the exception types and code locations of an exception and the ones it chains"""
+    locations = []
+    exc_type, value, tb = exc_info
+    seen = set()
+    while True:
+        locations.append(getattr(exc_type, '__qualname__', exc_type.__name__))
+        while tb is not None:
+            code = tb.tb_frame.f_code
+            locations.append("{}:{}:{}".format(code.co_filename, tb.tb_lineno, code.co_name))
+            tb = tb.tb_next
+        seen.add(id(value))
+        cause = getattr(value, '__cause__', None)
+        if cause is None and not getattr(value, '__suppress_context__', False):
+            cause = getattr(value, '__context__', None)
+        if cause is None or id(cause) in seen:
+            return locations
+        exc_type, value, tb = type(cause), cause, getattr(cause, '__traceback__', None)
+
+
+def get_exception_fingerprint(record):
+    """
+    :param record: logbook record with an exception
+    :returns: 12 hex digits fingerprint of the code locations of the exception's traceback (and of the exceptions it
+              chains), so tracebacks that differ only in the exception message have the same fingerprint
+    """
+    exc_info = getattr(record, 'exc_info', None)
+    if isinstance(exc_info, tuple) and exc_info[0] is not None:
+        locations = _get_exception_locations(exc_info)
+    else:  # e.g. a record decoded from a binary log, only the formatted traceback is available
+        text = record.formatted_exception
+        locations = [":".join(match) for match in _TRACEBACK_LOCATION_PATTERN.findall(text)]
+        locations.append(text.rstrip().rsplit("\n", 1)[-1].split(":", 1)[0])
+    return hashlib.sha1("\n".join(locations).encode('utf-8', 'replace')).hexdigest()[:12]
+
+
+def _get_exception_last_line(record):
+    """:returns: the last line of the record's traceback (e.g. "KeyError: 'key'"), without formatting the traceback"""
+    exc_info = getattr(record, 'exc_info', None)
+    if isinstance(exc_info, tuple) and exc_info[0] is not None:
+        text = traceback.format_exception_only(exc_info[0], exc_info[1])[-1]
+    else:
+        text = record.formatted_exception
+    return text.rstrip("\n").rsplit("\n", 1)[-1]
+
+
+class ExceptionDedup(object):
+    """
+    Exception dedup state of a formatter: the first record of each exception fingerprint ends its message line with
+    " exc=<fingerprint>" and is followed by the full traceback, and the next ones end it with
+    " exc=<fingerprint> (seen N times)" followed only by the last line of their traceback (the exception type and
+    value, which the fingerprint ignores). Files written this way can be re-expanded with
+    `infi.logging.handlers.expand_exception_references`.
+    """
+    def __init__(self, max_fingerprints=10000):
+        """
+        :param max_fingerprints: number of fingerprints to remember, when exceeded all of them are forgotten (so the
+                                 next occurrences are written with the full traceback again)
+        """
+        self.max_fingerprints = max_fingerprints
+        self._counts = dict()
+
+    def reset(self):
+        """Forgets the fingerprints, e.g. when a new log file is started."""
+        self._counts.clear()
+
+    def format_message(self, record):
+        """
+        :param record: logbook record with an exception
+        :returns: the message of the record with the full traceback, or a reference to it and the last line of the
+                  traceback
+        """
+        fingerprint = get_exception_fingerprint(record)
+        count = self._counts.get(fingerprint, 0) + 1
+        if count == 1 and len(self._counts) >= self.max_fingerprints:
+            self._counts.clear()
+        self._counts[fingerprint] = count
+        if count == 1:
+            return "{} exc={}\n{}".format(record.message, fingerprint, record.formatted_exception)
+        return "{} exc={} (seen {} times)\n{}".format(record.message, fingerprint, count,
+                                                      _get_exception_last_line(record))
+
+
+def _has_exception(record):
+    exc_info = getattr(record, 'exc_info', None)
+    return (exc_info[0] is not None) if isinstance(exc_info, tuple) else bool(record.formatted_exception)
+
 
 class MessageFormatterPlugin(FormatterPlugin):
+    exception_dedup = None
+
+    def enable_exception_dedup(self, max_fingerprints=10000):
+        """
+        Writes each recurring traceback in full only once, see `ExceptionDedup`. Must be called before the plugin is
+        used by a formatter.
+        :returns: the `ExceptionDedup` object of the plugin
+        """
+        self.exception_dedup = ExceptionDedup(max_fingerprints)
+        return self.exception_dedup
+
     def get_value(self, record):
+        if self.exception_dedup is not None and _has_exception(record):
+            return self.exception_dedup.format_message(record)
         if record.formatted_exception:
             return record.message + "\n" + record.formatted_exception
         else:
@@ -13,3 +120,12 @@ class MessageFormatterPlugin(FormatterPlugin):
 
     def get_format_key(self):
         return "message"
+
+    def get_value_expression(self, record_name):
+        if self.exception_dedup is not None:
+            return None
+        return "{0}.message + '\\n' + {0}.formatted_exception if {0}.formatted_exception else {0}.message".format(
+            record_name)
+
+    def get_required_extra_keys(self):
+        return []
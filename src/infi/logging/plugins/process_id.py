@@ -1,3 +1,4 @@
+import os
 from infi.logging.plugins import FormatterPlugin
 
 
@@ -10,3 +11,18 @@ class ProcessIDFormatterPlugin(FormatterPlugin):
 
     def get_format_key(self):
         return "process_id"
+
+    def get_json_type(self):
+        return int
+
+    def get_value_expression(self, record_name):
+        return "{}.process".format(record_name)
+
+    def is_constant(self):
+        return True
+
+    def get_constant_value(self):
+        return os.getpid()
+
+    def get_required_extra_keys(self):
+        return []
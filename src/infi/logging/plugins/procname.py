@@ -1,4 +1,4 @@
-from infi.logging.plugins import InjectorPlugin, FormatterPlugin
+from infi.logging.plugins import InjectorPlugin, FormatterPlugin, invalidate_constants
 
 try:
     import setproctitle
@@ -23,6 +23,7 @@ def set_procname(s):
     """
     global _procname
     _procname = s
+    invalidate_constants()
 
 
 def get_procname():
@@ -43,7 +44,10 @@ def refresh_procname_if_none(force=False):
     """
     global _procname
     if _procname is None or force:
-        _procname = get_proc_title()
+        procname = get_proc_title()
+        if procname != _procname:
+            _procname = procname
+            invalidate_constants()
 
 
 def inject_procname(record):
@@ -66,6 +70,9 @@ class ProcnameInjectorPlugin(InjectorPlugin):
     def inject(self, record):
         return inject_procname(record)
 
+    def get_injected_extra_keys(self):
+        return [PROCNAME_KEY]
+
 
 class ProcnameFormatterPlugin(FormatterPlugin):
     def get_value(self, record):
@@ -76,3 +83,15 @@ class ProcnameFormatterPlugin(FormatterPlugin):
 
     def get_format_key(self):
         return "procname"
+
+    def get_value_expression(self, record_name):
+        return "{}.extra.get({!r}, '')".format(record_name, PROCNAME_KEY)
+
+    def is_constant(self):
+        return True
+
+    def get_constant_value(self):
+        return get_procname()
+
+    def get_required_extra_keys(self):
+        return [PROCNAME_KEY]
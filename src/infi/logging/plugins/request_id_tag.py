@@ -1,8 +1,12 @@
 """
 Greenlet/thread-friendly request ID tagging for log messages.
+
+Tags are kept in a thread local (a greenlet local if gevent is installed) by default. With the contextvars backend (see
+`set_tag_backend`) they are kept in a context variable instead, which also follows asyncio tasks.
 """
 import logbook
 import random
+import weakref
 from infi.pyutils.decorators import wraps
 from infi.pyutils.contexts import contextmanager
 
@@ -11,7 +15,10 @@ from infi.logging.globals import new_threadlocal, get_logger
 
 
 REQUEST_ID_TAG_KEY = 'request_id'
+TAG_BACKENDS = ('threadlocal', 'contextvars')
 _threadlocal = None
+_tag_var = None  # ContextVar of the tag if using the contextvars backend
+_request_listeners = weakref.WeakSet()
 
 
 def _get_threadlocal():
@@ -21,11 +28,42 @@ def _get_threadlocal():
     return _threadlocal
 
 
+def set_tag_backend(backend):
+    """
+    Selects where the request ID tags are kept. Should be called before any tag is set, since tags set with the
+    previous backend are not visible through the new one.
+    :param backend: one of `TAG_BACKENDS`:
+                    'threadlocal' (default) - a thread/greenlet local, and `request_id_tag_context` pushes a greenlet
+                    bound logbook processor that injects the tag.
+                    'contextvars' - a `contextvars.ContextVar`, which works across threads, greenlets (gevent >= 20.12
+                    gives every greenlet its own context) and asyncio tasks. No processor is pushed, so the tag is only
+                    injected by `RequestIDTagInjectorPlugin` (installed by the default logging setup).
+    """
+    global _tag_var
+    if backend not in TAG_BACKENDS:
+        raise ValueError("unknown request ID tag backend {!r}, expected one of {}".format(backend, TAG_BACKENDS))
+    if backend == 'contextvars':
+        if _tag_var is None:
+            from contextvars import ContextVar
+            _tag_var = ContextVar(REQUEST_ID_TAG_KEY, default=None)
+    else:
+        _tag_var = None
+
+
+def get_tag_backend():
+    """
+    :returns: name of the request ID tag backend in use (see `set_tag_backend`)
+    """
+    return 'threadlocal' if _tag_var is None else 'contextvars'
+
+
 def get_tag():
     """
     :returns: current request ID tag for the current greenlet if exists or None if no request ID tag is set
     :rtype: str or None
     """
+    if _tag_var is not None:
+        return _tag_var.get()
     return getattr(_get_threadlocal(), REQUEST_ID_TAG_KEY, None)
 
 
@@ -35,7 +73,10 @@ def set_tag(tag):
     :param tag: tag string for the current request
     :type tag: str or None to clear the tag
     """
-    setattr(_get_threadlocal(), REQUEST_ID_TAG_KEY, tag)
+    if _tag_var is not None:
+        _tag_var.set(tag)
+    else:
+        setattr(_get_threadlocal(), REQUEST_ID_TAG_KEY, tag)
 
 
 def new_random_tag():
@@ -68,15 +109,53 @@ def inject_request_id_tag(record):
         record.extra[REQUEST_ID_TAG_KEY] = tag
 
 
+def add_request_listener(listener):
+    """
+    Registers an object that is notified when `request_id_tag_context` starts and ends a request (a context that
+    changes the tag of the greenlet), with `listener.request_started(tag)` and `listener.request_ended(tag)`.
+    Nested contexts that keep the tag don't notify the listeners. Only a weak reference to the listener is kept.
+    """
+    _request_listeners.add(listener)
+
+
+def remove_request_listener(listener):
+    """Unregisters a listener registered with `add_request_listener`."""
+    _request_listeners.discard(listener)
+
+
 @contextmanager
 def _null_context():
     yield
 
 
+def _push_tag(tag):
+    """
+    Sets the tag like `set_tag`.
+    :returns: token to pass to `_pop_tag` to restore the previous tag, or None if using the threadlocal backend
+    """
+    if _tag_var is not None:
+        return _tag_var, _tag_var.set(tag)
+    set_tag(tag)
+    return None
+
+
+def _pop_tag(token, prev_tag):
+    """Restores the tag that was set before `_push_tag` returned `token`."""
+    if token is not None:
+        tag_var, var_token = token
+        try:
+            tag_var.reset(var_token)
+            return
+        except ValueError:  # the token was created in a different context
+            pass
+    set_tag(prev_tag)
+
+
 @contextmanager
 def request_id_tag_context(title=None, tag=None, logger=None):
     """
-    Context that adds a request ID tag logging processor.
+    Context that adds a request ID tag logging processor. With the contextvars backend only the tag is set, and the
+    injector plugin adds it to the records.
 
     :param title: title to write in the log when setting a new tag (if a previous tag was not set).
                   If ``None`` no log message will be generated.
@@ -87,23 +166,30 @@ def request_id_tag_context(title=None, tag=None, logger=None):
     if logger is None:
         logger = get_logger()
 
-    prev_tag, new_tag = get_tag(), tag
+    prev_tag, new_tag, token = get_tag(), tag, None
     if new_tag is not None:
-        set_tag(new_tag)
+        token = _push_tag(new_tag)
     elif prev_tag is None:
         new_tag = new_random_tag()
-        set_tag(new_tag)
+        token = _push_tag(new_tag)
+    starts_request = new_tag is not None and new_tag != prev_tag
+    listeners = tuple(_request_listeners) if _request_listeners and starts_request else ()
+    for listener in listeners:
+        listener.request_started(new_tag)
 
     # We create a logbook.Processor context only if we didn't have a previous tag, otherwise there must already
     # be a context in place somewhere down the call stack.
-    with (logbook.Processor(inject_request_id_tag).greenletbound() if prev_tag is None else _null_context()):
+    use_processor = prev_tag is None and _tag_var is None
+    with (logbook.Processor(inject_request_id_tag).greenletbound() if use_processor else _null_context()):
         if prev_tag is None and title is not None:
             # Log this function since it's our first "tagged" entry to the greenlet
             logger.debug("setting new tag {} on greenlet {}".format(new_tag, title))
         try:
             yield
         finally:
-            set_tag(prev_tag)
+            for listener in listeners:
+                listener.request_ended(new_tag)
+            _pop_tag(token, prev_tag)
 
 
 def request_id_tag(func=None, tag=None, logger=None):
@@ -148,6 +234,9 @@ class RequestIDTagInjectorPlugin(InjectorPlugin):
     def inject(self, record):
         return inject_request_id_tag(record)
 
+    def get_injected_extra_keys(self):
+        return [REQUEST_ID_TAG_KEY]
+
 
 class RequestIDTagFormatterPlugin(FormatterPlugin):
     def get_value(self, record):
@@ -158,3 +247,9 @@ class RequestIDTagFormatterPlugin(FormatterPlugin):
 
     def get_format_key(self):
         return "request_id_tag"
+
+    def get_value_expression(self, record_name):
+        return "{}.extra.get({!r}, '')".format(record_name, REQUEST_ID_TAG_KEY)
+
+    def get_required_extra_keys(self):
+        return [REQUEST_ID_TAG_KEY]
@@ -28,6 +28,9 @@ class ThreadIDInjectorPlugin(InjectorPlugin):
     def inject(self, record):
         return inject_thread_id(record)
 
+    def get_injected_extra_keys(self):
+        return [THREAD_ID_KEY]
+
 
 class ThreadIDFormatterPlugin(FormatterPlugin):
     def get_value(self, record):
@@ -38,3 +41,12 @@ class ThreadIDFormatterPlugin(FormatterPlugin):
 
     def get_format_key(self):
         return "thread_id"
+
+    def get_json_type(self):
+        return int
+
+    def get_value_expression(self, record_name):
+        return "{0}.extra.get({1!r}, {0}.thread) % {2}".format(record_name, THREAD_ID_KEY, THREAD_ID_MODULU)
+
+    def get_required_extra_keys(self):
+        return [THREAD_ID_KEY]
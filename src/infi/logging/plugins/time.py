@@ -1,5 +1,8 @@
+from datetime import timedelta
 from infi.logging.plugins import FormatterPlugin
 
+_ONE_SECOND = timedelta(seconds=1)
+
 
 def get_time_from_record(record):
     """
@@ -9,6 +12,84 @@ def get_time_from_record(record):
     return record.time
 
 
+class TimestampFormatter(object):
+    """
+    Formats datetime objects, calling strftime only once per whole second. Records logged within the same second reuse
+    the cached prefix and only the (optional) sub-second part is formatted per record.
+
+    The cache holds a single (start, end, prefix) tuple that is replaced as a whole, so concurrent threads/greenlets
+    always see a consistent entry. Any time outside the cached second (including clock jumps backwards) causes a
+    re-format, so the output is always the same as formatting the time directly.
+    """
+    def __init__(self, precision=0, iso8601=False, utc=True):
+        """
+        :param precision: number of sub-second digits to append: 0 (seconds), 3 (milliseconds) or 6 (microseconds)
+        :param iso8601: if True use ISO-8601 format (e.g. 2020-01-02T03:04:05Z) with the UTC offset of the time: "Z"
+                        for UTC times and "+HH:MM" for other times that have a timezone
+        :param utc: whether times without a timezone are UTC ("Z" suffix) or local (no suffix) in ISO-8601 format.
+                    Logbook record times are UTC, pass False if `logbook.set_datetime_format('local')` was called
+        """
+        if precision not in (0, 3, 6):
+            raise ValueError("precision must be 0, 3 or 6, not {!r}".format(precision))
+        self._strftime_format = "%Y-%m-%dT%H:%M:%S" if iso8601 else "%Y-%m-%d %H:%M:%S"
+        self._iso8601 = iso8601
+        self._utc = utc
+        self._precision = precision
+        self._cache = (None, None, None, None)
+
+    def _get_suffix(self, t):
+        if not self._iso8601:
+            return ""
+        if t.tzinfo is None:
+            return "Z" if self._utc else ""
+        minutes = int(t.utcoffset().total_seconds()) // 60
+        if minutes == 0:
+            return "Z"
+        return "{}{:02}:{:02}".format("-" if minutes < 0 else "+", abs(minutes) // 60, abs(minutes) % 60)
+
+    def _get_prefix_and_suffix(self, t):
+        start, end, prefix, suffix = self._cache
+        if start is not None and start.tzinfo is t.tzinfo and start <= t < end:
+            return prefix, suffix
+        start = t.replace(microsecond=0)
+        prefix = start.strftime(self._strftime_format)
+        suffix = self._get_suffix(t)
+        self._cache = (start, start + _ONE_SECOND, prefix, suffix)
+        return prefix, suffix
+
+    def format(self, t):
+        """
+        :param t: datetime object
+        :returns: formatted time str
+        """
+        prefix, suffix = self._get_prefix_and_suffix(t)
+        if self._precision == 0:
+            return prefix + suffix
+        elif self._precision == 3:
+            return "{}.{:03}{}".format(prefix, t.microsecond // 1000, suffix)
+        else:
+            return "{}.{:06}{}".format(prefix, t.microsecond, suffix)
+
+
+_timestamp_formatter = TimestampFormatter()
+
+
+def set_timestamp_format(precision=0, iso8601=False, utc=True):
+    """
+    Sets the format used by the time formatter plugin. See `TimestampFormatter` for the parameters.
+    """
+    global _timestamp_formatter
+    _timestamp_formatter = TimestampFormatter(precision, iso8601, utc)
+
+
+def format_time(t):
+    """
+    :param t: datetime object
+    :returns: t formatted with the format set by `set_timestamp_format`
+    """
+    return _timestamp_formatter.format(t)
+
+
 class TimeFormatterPlugin(FormatterPlugin):
     def get_value(self, record):
         return get_time_from_record(record)
@@ -16,5 +97,14 @@ class TimeFormatterPlugin(FormatterPlugin):
     def get_format_string(self):
         return "{:%Y-%m-%d %H:%M:%S}"
 
+    def has_formatted_value(self):
+        return True
+
+    def get_formatted_value(self, record):
+        return format_time(get_time_from_record(record))
+
     def get_format_key(self):
         return "time"
+
+    def get_required_extra_keys(self):
+        return []
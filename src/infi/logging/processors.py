@@ -2,26 +2,49 @@ import logbook
 from infi.logging.plugins import get_injector_plugins, _true
 
 
-def create_inject_extra_data(plugin_predicate=_true):
+def _is_injector_required(injector, required_extra_keys):
+    if required_extra_keys is None:
+        return True
+    injected_keys = injector.get_injected_extra_keys()
+    return injected_keys is None or bool(set(injected_keys) & required_extra_keys)
+
+
+def _fuse_injectors(injectors):
+    """
+    Generates a single function that calls all the injectors one after the other, without looping over them.
+    :param injectors: list of injector plugin instances
+    :returns: function(record: logbook record)
+    """
+    namespace = dict()
+    lines = ["def inject_extra_data(record):",
+             "    \"\"\"Wrapper that injects all the data available from the loaded injector plugins\"\"\""]
+    for i, injector in enumerate(injectors):
+        namespace['_inject_{}'.format(i)] = injector.inject
+        lines.append("    _inject_{}(record)".format(i))
+    exec(compile("\n".join(lines), "<infi.logging fused injectors>", "exec"), namespace)
+    return namespace['inject_extra_data']
+
+
+def create_inject_extra_data(plugin_predicate=_true, required_extra_keys=None):
     """
     Composes all the injector plugins and returns a data injection function.
     :param plugin_predicate: predicate that chooses which plugins to enable
+    :param required_extra_keys: set of `record.extra` keys that are read by the formatters in use (see
+                                `formatters.get_formatter_required_extra_keys`). Injectors that don't set any of these
+                                keys are skipped. If None, all the enabled injectors run.
     :returns: function(record: logbook record)
     """
     injectors = [injector() for injector in get_injector_plugins(plugin_predicate).values()]
-
-    def inject_extra_data(record):
-        """Wrapper that injects all the data available from the loaded injector plugins"""
-        for injector in injectors:
-            injector.inject(record)
-    return inject_extra_data
+    return _fuse_injectors([injector for injector in injectors
+                            if _is_injector_required(injector, required_extra_keys)])
 
 
-def create_processor(plugin_predicate=_true):
+def create_processor(plugin_predicate=_true, required_extra_keys=None):
     """
     Returns a new logbook Processor object that injects to each record's `extra` dict whatever the enabled plugins
     choose to put there.
     :param plugin_predicate: predicate that chooses which plugins to enable
+    :param required_extra_keys: see `create_inject_extra_data`
     :returns: logbook.Processor object
     """
-    return logbook.Processor(create_inject_extra_data(plugin_predicate))
+    return logbook.Processor(create_inject_extra_data(plugin_predicate, required_extra_keys))
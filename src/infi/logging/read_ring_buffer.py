@@ -0,0 +1,21 @@
+"""
+Prints the records of a ring buffer file written by `infi.logging.handlers.RingBufferHandler`, oldest first.
+
+Usage: python -m infi.logging.read_ring_buffer <path>
+"""
+import sys
+from .handlers.ring_buffer_handler import read_ring_buffer
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        sys.stderr.write(__doc__.lstrip())
+        return 1
+    for message in read_ring_buffer(argv[0]):
+        sys.stdout.write(message + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,22 @@
+"""
+Prints the records between two times from a log file and its backups, oldest first. Times are in the format of the
+time plugin (e.g. "2020-01-02 14:02:00"), and the end time may be a prefix (e.g. "2020-01-02 14:05" includes 14:05).
+
+Usage: python -m infi.logging.read_time_range <path> <since> [<until>]
+"""
+import sys
+from .handlers.time_range import read_time_range
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) not in (2, 3):
+        sys.stderr.write(__doc__.lstrip())
+        return 1
+    for record in read_time_range(*argv):
+        sys.stdout.write(record)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
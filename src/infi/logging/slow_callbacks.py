@@ -0,0 +1,205 @@
+"""
+Slow asyncio callback logging utility (the asyncio counterpart of `slow_greenlets`)
+"""
+import sys
+import asyncio
+import linecache
+from asyncio.events import Handle
+
+from .globals import get_time, get_logger
+from .handlers.utils import get_native_thread_functions, get_native_thread_ident, acquire_native_lock
+from .histograms import DurationHistogram
+
+_original_handle_run = Handle._run
+_detector = None
+_loop_lag_monitor = None
+
+
+def _describe_handle(handle):
+    callback = handle._callback
+    task = getattr(callback, '__self__', None)
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        name = task.get_name() if hasattr(task, 'get_name') else hex(id(task))
+        return "task {} ({})".format(name, getattr(coro, '__qualname__', coro))
+    return "callback {}".format(getattr(callback, '__qualname__', callback))
+
+
+def _format_stack(stack):
+    lines = []
+    for filename, lineno, name in stack:
+        lines.append('  File "{}", line {}, in {}'.format(filename, lineno, name))
+        line = linecache.getline(filename, lineno).strip()
+        if line:
+            lines.append("    " + line)
+    return "\n".join(lines)
+
+
+def _run_handle(self):
+    detector = _detector
+    if detector is None or self._loop is not detector.loop:
+        return _original_handle_run(self)
+    start = get_time()
+    detector.running = start
+    try:
+        return _original_handle_run(self)
+    finally:
+        detector.running = None
+        duration = get_time() - start
+        if duration >= detector.max_duration:
+            detector.warn(self, start, duration)
+
+
+class _SlowCallbackDetector(object):
+    """
+    Times the callbacks of an event loop. If `sample_interval` is not None, a native thread samples the stack of the
+    loop's thread while a callback runs for longer than `max_duration`, so the warning includes the blocking code.
+    """
+    max_stack_depth = 30
+
+    def __init__(self, loop, max_duration, sample_interval, logger):
+        self.loop = loop
+        self.max_duration = max_duration
+        self.sample_interval = sample_interval
+        self.logger = logger
+        self.running = None  # start time of the running callback
+        self.thread_id = get_native_thread_ident()
+        self._sample = None  # (start time, stack) of the last sample
+        if sample_interval is not None:
+            start_new_thread, allocate_lock = get_native_thread_functions()
+            self._stop = allocate_lock()
+            self._stop.acquire()
+            start_new_thread(self._run_sampler, ())
+
+    def _run_sampler(self):
+        while not acquire_native_lock(self._stop, self.sample_interval):
+            start = self.running
+            if start is None or get_time() - start < self.max_duration:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.max_stack_depth:
+                stack.append((frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name))
+                frame = frame.f_back
+            if self.running == start:
+                self._sample = (start, tuple(reversed(stack)))
+
+    def warn(self, handle, start, duration):
+        msg = "{} was running for at least {:.4f} seconds".format(_describe_handle(handle), duration)
+        sample, self._sample = self._sample, None
+        if sample is not None and sample[0] == start:
+            msg += ", stack:\n" + _format_stack(sample[1])
+        self.logger.warn(msg)
+
+    def stop(self):
+        if self.sample_interval is not None:
+            self._stop.release()
+
+
+def enable_slow_callback_log_warning(max_duration=1.0, logger=None, loop=None, sample_interval=None):
+    """
+    Enables warnings about slow asyncio callbacks (including steps of tasks, which are identified by the task and
+    coroutine names) written to the log
+    :param max_duration: maximum duration in seconds afterwhich a callback is considered slow
+    :param logger: logger to use, or None if using the default logger
+    :param loop: event loop to monitor, or None for the current event loop. Must run on the current thread.
+    :param sample_interval: seconds between samples of the stack of a slow callback (default: a quarter of
+                            max_duration), or 0 to not capture stacks
+    """
+    global _detector
+    if logger is None:
+        logger = get_logger()
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    disable_slow_callback_log_warning()
+    if sample_interval is None:
+        sample_interval = max_duration / 4.0
+    logger.debug("enabling logging of slow asyncio callbacks on loop {}".format(id(loop)))
+    _detector = _SlowCallbackDetector(loop, max_duration, sample_interval or None, logger)
+    Handle._run = _run_handle
+
+
+def disable_slow_callback_log_warning():
+    """Disables the slow asyncio callback log warnings."""
+    global _detector
+    if _detector is not None:
+        _detector.stop()
+        _detector = None
+    Handle._run = _original_handle_run
+
+
+class _LoopLagMonitor(object):
+    def __init__(self, loop, interval, warning_threshold, report_interval, logger):
+        self.loop = loop
+        self.interval = interval
+        self.warning_threshold = warning_threshold
+        self.report_interval = report_interval
+        self.logger = logger
+        self.histogram = DurationHistogram()
+        self._next_report_time = None if report_interval is None else loop.time() + report_interval
+        self._schedule()
+
+    def _schedule(self):
+        self._scheduled_time = self.loop.time() + self.interval
+        self._handle = self.loop.call_at(self._scheduled_time, self._callback)
+
+    def _callback(self):
+        now = self.loop.time()
+        lag = max(0.0, now - self._scheduled_time)
+        self.histogram.add(lag)
+        self._schedule()
+        if self.warning_threshold is not None and lag >= self.warning_threshold:
+            self.logger.warn("asyncio loop lag: callback fired {:.4f} seconds late".format(lag))
+        if self._next_report_time is not None and now >= self._next_report_time:
+            self._next_report_time = now + self.report_interval
+            self.report()
+
+    def report(self):
+        self.logger.info("asyncio loop lag: {}".format(self.histogram))
+
+    def stop(self):
+        self._handle.cancel()
+
+
+def enable_loop_lag_monitor(interval=0.1, warning_threshold=0.1, report_interval=60.0, logger=None, loop=None):
+    """
+    Enables monitoring how late an asyncio event loop runs its callbacks: a callback is scheduled every `interval`
+    seconds and the delay of each one is kept in a histogram (see `get_loop_lag_histogram`).
+    :param interval: seconds between measurements
+    :param warning_threshold: log a warning when the lag is at least this many seconds, or None to never warn
+    :param report_interval: log the lag percentiles every `report_interval` seconds, or None to never log them
+    :param logger: logger to use, or None if using the default logger
+    :param loop: event loop to monitor, or None for the current event loop
+    """
+    global _loop_lag_monitor
+    disable_loop_lag_monitor()
+    _loop_lag_monitor = _LoopLagMonitor(asyncio.get_event_loop() if loop is None else loop, interval,
+                                        warning_threshold, report_interval, get_logger() if logger is None else logger)
+
+
+def disable_loop_lag_monitor():
+    """Disables the loop lag monitor and discards its histogram."""
+    global _loop_lag_monitor
+    if _loop_lag_monitor is not None:
+        _loop_lag_monitor.stop()
+        _loop_lag_monitor = None
+
+
+def get_loop_lag_histogram():
+    """
+    :returns: copy of the loop lag `DurationHistogram` (use `get_percentile` for the lag percentiles), or None if the
+              monitor is disabled
+    """
+    return None if _loop_lag_monitor is None else _loop_lag_monitor.histogram.copy()
+
+
+def reset_loop_lag_histogram():
+    """Clears the loop lag histogram."""
+    if _loop_lag_monitor is not None:
+        _loop_lag_monitor.histogram.reset()
+
+
+def log_loop_lag_report():
+    """Logs the loop lag percentiles now, without waiting for the report interval."""
+    if _loop_lag_monitor is not None:
+        _loop_lag_monitor.report()
@@ -1,14 +1,131 @@
 """
 Slow greenlet logging utility
 """
+import sys
 import gevent
 import greenlet
+import weakref
+import linecache
 from functools import partial
 
 from .globals import get_time, get_logger
+from .handlers.utils import get_native_thread_functions, get_native_thread_ident, acquire_native_lock
+from .histograms import DurationHistogram
 
-_slow_greenlet_max_duration = 1.0
+_HISTOGRAM_ATTRIBUTE = '_infi_logging_run_time_histogram'
+
+_slow_greenlet_max_duration = None  # None if the slow greenlet warnings are disabled
 _last_switch_time = None
+_tracer_logger = None
+
+_global_histogram = None  # None if the run time histograms are disabled
+_per_greenlet_histograms = False
+_tracked_greenlets = weakref.WeakSet()
+_switch_count = 0
+_dump_interval = None
+_next_dump_time = None
+
+_watchdog = None  # _SlowGreenletWatchdog if the watchdog mode is enabled
+_hub_loop_lag_monitor = None
+_running = (None, True)  # (switch time, is hub) of the running greenlet, updated only in the watchdog mode
+
+
+def _get_greenlet_histogram(glet):
+    """
+    :returns: histogram of `glet`, created on the first call, or None if the greenlet type doesn't support it
+    """
+    histogram = getattr(glet, _HISTOGRAM_ATTRIBUTE, None)
+    if histogram is None:
+        histogram = DurationHistogram()
+        try:
+            setattr(glet, _HISTOGRAM_ATTRIBUTE, histogram)
+            _tracked_greenlets.add(glet)
+        except (AttributeError, TypeError):
+            return None  # greenlet type without attributes or weak references
+    return histogram
+
+
+class _SlowGreenletWatchdog(object):
+    """
+    Samples the stack of the running greenlet from a native thread while it runs for longer than the threshold. Each
+    slow run (incident) is attributed to the stack sampled most often during it, and incidents are aggregated by stack
+    fingerprint until the next report.
+    """
+    max_stack_depth = 30
+
+    def __init__(self, threshold, sample_interval, report_interval):
+        start_new_thread, allocate_lock = get_native_thread_functions()
+        self.threshold = threshold
+        self.sample_interval = sample_interval
+        self.report_interval = report_interval
+        self.next_report_time = get_time() + report_interval
+        self.thread_id = get_native_thread_ident()
+        self.stats = dict()  # fingerprint -> [incidents, total blocked time, max blocked time], tracer thread only
+        self._samples = None  # (switch time, dict of fingerprint -> sample count) of the running greenlet
+        self._samples_lock = allocate_lock()
+        self._stop = allocate_lock()
+        self._stop.acquire()
+        start_new_thread(self._run, ())
+
+    def stop(self):
+        self._stop.release()
+
+    def _run(self):
+        while not acquire_native_lock(self._stop, self.sample_interval):
+            switch_time, is_hub = _running
+            if is_hub or switch_time is None or get_time() - switch_time < self.threshold:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or _running[0] != switch_time:
+                continue  # the greenlet switched out while sampling
+            fingerprint = self._get_fingerprint(frame)
+            del frame
+            with self._samples_lock:
+                if self._samples is None or self._samples[0] != switch_time:
+                    self._samples = (switch_time, dict())
+                counts = self._samples[1]
+                counts[fingerprint] = counts.get(fingerprint, 0) + 1
+
+    def _get_fingerprint(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_stack_depth:
+            stack.append((frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name))
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def add_incident(self, switch_time, duration):
+        """Called by the tracer when a greenlet that ran for longer than the threshold switches out."""
+        with self._samples_lock:
+            samples, self._samples = self._samples, None
+        fingerprint = None
+        if samples is not None and samples[0] == switch_time:
+            fingerprint = max(samples[1], key=samples[1].get)
+        stats = self.stats.get(fingerprint)
+        if stats is None:
+            stats = self.stats[fingerprint] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += duration
+        stats[2] = max(stats[2], duration)
+
+    def report(self, logger, top=5):
+        """Logs the incidents since the last report, the stacks that blocked the longest first."""
+        stats, self.stats = self.stats, dict()
+        if not stats:
+            return
+        lines = ["slow greenlets: {} incidents blocked for {:.4f} seconds since the last report".format(
+            sum(item[0] for item in stats.values()), sum(item[1] for item in stats.values()))]
+        for fingerprint, (count, total, longest) in sorted(stats.items(), key=lambda item: item[1][1],
+                                                           reverse=True)[:top]:
+            lines.append("{} incidents, {:.4f} seconds blocked (longest {:.4f} seconds), stack:".format(
+                count, total, longest))
+            if fingerprint is None:
+                lines.append("  (not sampled)")
+            for filename, lineno, name in fingerprint or ():
+                lines.append('  File "{}", line {}, in {}'.format(filename, lineno, name))
+                line = linecache.getline(filename, lineno).strip()
+                if line:
+                    lines.append("    " + line)
+        logger.warn("\n".join(lines))
 
 
 def _switch_time_tracer(logger, event, args):
@@ -17,33 +134,263 @@ def _switch_time_tracer(logger, event, args):
         # 'switch' or 'throw' and not when event is potentially something else.
         return
     (origin, target) = args
-    global _slow_greenlet_max_duration, _last_switch_time
+    global _last_switch_time, _switch_count, _next_dump_time, _running
     now = get_time()
     if _last_switch_time and origin != gevent.get_hub():  # gevent.hub can block for as long as it wants
         duration = now - _last_switch_time
-        if duration >= _slow_greenlet_max_duration:
-            msg = "greenlet id {} was running for at least {:.4f} seconds"
-            logger.warn(msg.format(id(origin), duration))
+        if _slow_greenlet_max_duration is not None and duration >= _slow_greenlet_max_duration:
+            if _watchdog is not None:
+                _watchdog.add_incident(_last_switch_time, duration)
+            else:
+                msg = "greenlet id {} was running for at least {:.4f} seconds"
+                logger.warn(msg.format(id(origin), duration))
+        histogram = _global_histogram
+        if histogram is not None:
+            histogram.add(duration)
+            if _per_greenlet_histograms:
+                histogram = getattr(origin, _HISTOGRAM_ATTRIBUTE, None) or _get_greenlet_histogram(origin)
+                if histogram is not None:
+                    histogram.add(duration)
     _last_switch_time = now
+    if _watchdog is not None:
+        _running = (now, target == gevent.get_hub())
+        if now >= _watchdog.next_report_time:
+            _watchdog.next_report_time = now + _watchdog.report_interval
+            _watchdog.report(logger)
+    if _global_histogram is not None:
+        _switch_count += 1
+        if _next_dump_time is not None and now >= _next_dump_time:
+            _next_dump_time = now + _dump_interval
+            log_greenlet_run_time_histograms(logger)
+
 
+def _update_tracer(logger):
+    global _tracer_logger, _last_switch_time
+    if _slow_greenlet_max_duration is None and _global_histogram is None:
+        _tracer_logger = None
+        greenlet.settrace(None)
+    elif logger is not _tracer_logger:
+        _tracer_logger = logger
+        _last_switch_time = get_time()
+        greenlet.settrace(partial(_switch_time_tracer, logger))
 
-def enable_slow_greenlet_log_warning(max_duration=1.0, logger=None):
+
+def enable_slow_greenlet_log_warning(max_duration=1.0, logger=None, watchdog=False, sample_interval=None,
+                                     report_interval=60.0):
     """
     Enables warnings about slow greenlet written to the log
+
+    In the watchdog mode, a native thread samples the stack of a greenlet while it runs for longer than
+    `max_duration`, and instead of a warning per slow greenlet a report of the slow greenlets aggregated by stack
+    (incident count and total blocked time) is logged every `report_interval` seconds. The report is logged on the
+    next greenlet switch after the interval passes, so a greenlet that never switches out is reported once it does.
     :param max_duration: maximum duration in seconds afterwhich a greenlet is considered slow
     :param logger: logger to use, or None if using the default logger
+    :param watchdog: enable the watchdog mode
+    :param sample_interval: seconds between stack samples in the watchdog mode (default: a quarter of max_duration)
+    :param report_interval: seconds between reports in the watchdog mode
     """
-    global _slow_greenlet_max_duration, _last_switch_time, _logger
+    global _slow_greenlet_max_duration, _last_switch_time, _watchdog, _running
     if logger is None:
         logger = get_logger()
-    now = get_time()
     _slow_greenlet_max_duration = max_duration
-    _last_switch_time = now
+    _last_switch_time = get_time()
+    if _watchdog is not None:
+        _watchdog.stop()
+        _watchdog = None
+    if watchdog:
+        _running = (_last_switch_time, False)
+        _watchdog = _SlowGreenletWatchdog(max_duration, sample_interval or max_duration / 4.0, report_interval)
     current_id = id(gevent.getcurrent())
     logger.debug("enabling logging of greenlet switching, current greenlet (main) is {}".format(current_id))
-    greenlet.settrace(partial(_switch_time_tracer, logger))
+    _update_tracer(logger)
 
 
 def disable_slow_greenlet_log_warning():
-    """Disables the slow greenlet log warnings by removing the trace function from greenlet."""
-    greenlet.settrace(None)
+    """Disables the slow greenlet log warnings (and removes the trace function from greenlet if the run time
+    histograms are disabled too)."""
+    global _slow_greenlet_max_duration, _watchdog, _running
+    _slow_greenlet_max_duration = None
+    if _watchdog is not None:
+        _watchdog.stop()
+        _watchdog = None
+        _running = (None, True)
+    _update_tracer(_tracer_logger)
+
+
+def log_slow_greenlet_report(logger=None):
+    """Logs the watchdog report of the slow greenlets since the last report now, without waiting for the interval."""
+    if _watchdog is not None:
+        _watchdog.report(get_logger() if logger is None else logger)
+
+
+def enable_greenlet_run_time_histograms(per_greenlet=True, dump_interval=None, logger=None):
+    """
+    Enables collecting histograms of greenlet run durations (see `DurationHistogram`): a global histogram of all the
+    greenlets except the gevent hub and, optionally, a histogram per greenlet.
+    :param per_greenlet: also keep a histogram per greenlet (stored on the greenlet, so it's freed with it)
+    :param dump_interval: if not None, log the histograms every `dump_interval` seconds
+    :param logger: logger to use, or None if using the default logger
+    """
+    global _global_histogram, _per_greenlet_histograms, _dump_interval, _next_dump_time
+    if logger is None:
+        logger = _tracer_logger or get_logger()
+    if _global_histogram is None:
+        _global_histogram = DurationHistogram()
+    _per_greenlet_histograms = per_greenlet
+    _dump_interval = dump_interval
+    _next_dump_time = None if dump_interval is None else get_time() + dump_interval
+    _update_tracer(logger)
+
+
+def disable_greenlet_run_time_histograms():
+    """Disables collecting the greenlet run time histograms and discards them."""
+    global _global_histogram, _per_greenlet_histograms, _next_dump_time
+    _global_histogram = None
+    _per_greenlet_histograms = False
+    _next_dump_time = None
+    for glet in list(_tracked_greenlets):
+        try:
+            delattr(glet, _HISTOGRAM_ATTRIBUTE)
+        except AttributeError:
+            pass
+    _tracked_greenlets.clear()
+    _update_tracer(_tracer_logger)
+
+
+def get_greenlet_run_time_histogram(glet=None):
+    """
+    :param glet: greenlet to get the histogram of, or None to get the global histogram
+    :returns: copy of the `DurationHistogram`, or None if the histograms are disabled or the greenlet has none
+    """
+    if _global_histogram is None:
+        return None
+    histogram = _global_histogram if glet is None else getattr(glet, _HISTOGRAM_ATTRIBUTE, None)
+    return None if histogram is None else histogram.copy()
+
+
+def get_greenlet_run_time_histograms():
+    """
+    :returns: dict of greenlet -> copy of its `DurationHistogram`, for the live greenlets that have a histogram
+    """
+    return dict((glet, getattr(glet, _HISTOGRAM_ATTRIBUTE).copy()) for glet in list(_tracked_greenlets))
+
+
+def get_greenlet_switch_count():
+    """
+    :returns: number of greenlet switches (including switches from the gevent hub) since the histograms were enabled or
+              reset
+    """
+    return _switch_count
+
+
+def reset_greenlet_run_time_histograms():
+    """Clears the global and per-greenlet histograms and the switch count."""
+    global _switch_count
+    _switch_count = 0
+    if _global_histogram is not None:
+        _global_histogram.reset()
+    for glet in list(_tracked_greenlets):
+        getattr(glet, _HISTOGRAM_ATTRIBUTE).reset()
+
+
+def log_greenlet_run_time_histograms(logger=None, top=10):
+    """
+    Writes the global histogram and the histograms of the greenlets with the longest total run time to the log.
+    :param logger: logger to use, or None if using the default logger
+    :param top: number of greenlets to log
+    """
+    if _global_histogram is None:
+        return
+    if logger is None:
+        logger = get_logger()
+    lines = ["greenlet run times: switches={} {}".format(_switch_count, _global_histogram)]
+    histograms = sorted(get_greenlet_run_time_histograms().items(), key=lambda item: item[1].total, reverse=True)
+    for glet, histogram in histograms[:top]:
+        lines.append("greenlet id {} ({}): {}".format(id(glet), getattr(glet, 'name', type(glet).__name__),
+                                                      histogram))
+    logger.info("\n".join(lines))
+
+
+class _HubLoopLagMonitor(object):
+    """
+    Measures how late a timer scheduled on the gevent hub fires. The timer is restarted from its own callback, so each
+    measurement is the lag of one interval.
+    """
+    def __init__(self, interval, warning_threshold, report_interval, logger):
+        self.interval = interval
+        self.warning_threshold = warning_threshold
+        self.report_interval = report_interval
+        self.logger = logger
+        self.histogram = DurationHistogram()
+        # the timer doesn't keep the hub alive (e.g. gevent.wait() returns when only the timer is left)
+        self._timer = gevent.get_hub().loop.timer(interval, ref=False)
+        self._scheduled_time = None
+        self._next_report_time = None if report_interval is None else get_time() + report_interval
+        self._schedule()
+
+    def _schedule(self):
+        self._scheduled_time = get_time() + self.interval
+        self._timer.start(self._callback)
+
+    def _callback(self):
+        now = get_time()
+        lag = max(0.0, now - self._scheduled_time)
+        self.histogram.add(lag)
+        self._schedule()
+        if self.warning_threshold is not None and lag >= self.warning_threshold:
+            self.logger.warn("gevent hub loop lag: timer fired {:.4f} seconds late".format(lag))
+        if self._next_report_time is not None and now >= self._next_report_time:
+            self._next_report_time = now + self.report_interval
+            self.report()
+
+    def report(self):
+        self.logger.info("gevent hub loop lag: {}".format(self.histogram))
+
+    def stop(self):
+        self._timer.stop()
+        self._timer.close()
+
+
+def enable_hub_loop_lag_monitor(interval=0.1, warning_threshold=0.1, report_interval=60.0, logger=None):
+    """
+    Enables monitoring how late the gevent hub of the current thread gets back to its loop: a timer is scheduled on
+    the hub every `interval` seconds and the delay of each callback is kept in a histogram (see
+    `get_hub_loop_lag_histogram`). Unlike the slow greenlet warnings, this includes time spent in the hub itself.
+    :param interval: seconds between measurements
+    :param warning_threshold: log a warning when the lag is at least this many seconds, or None to never warn
+    :param report_interval: log the lag percentiles every `report_interval` seconds, or None to never log them
+    :param logger: logger to use, or None if using the default logger
+    """
+    global _hub_loop_lag_monitor
+    disable_hub_loop_lag_monitor()
+    _hub_loop_lag_monitor = _HubLoopLagMonitor(interval, warning_threshold, report_interval,
+                                               get_logger() if logger is None else logger)
+
+
+def disable_hub_loop_lag_monitor():
+    """Disables the hub loop lag monitor (stops its timer) and discards its histogram."""
+    global _hub_loop_lag_monitor
+    if _hub_loop_lag_monitor is not None:
+        _hub_loop_lag_monitor.stop()
+        _hub_loop_lag_monitor = None
+
+
+def get_hub_loop_lag_histogram():
+    """
+    :returns: copy of the hub loop lag `DurationHistogram` (use `get_percentile` for the lag percentiles), or None if
+              the monitor is disabled
+    """
+    return None if _hub_loop_lag_monitor is None else _hub_loop_lag_monitor.histogram.copy()
+
+
+def reset_hub_loop_lag_histogram():
+    """Clears the hub loop lag histogram."""
+    if _hub_loop_lag_monitor is not None:
+        _hub_loop_lag_monitor.histogram.reset()
+
+
+def log_hub_loop_lag_report():
+    """Logs the hub loop lag percentiles now, without waiting for the report interval."""
+    if _hub_loop_lag_monitor is not None:
+        _hub_loop_lag_monitor.report()
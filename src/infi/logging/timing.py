@@ -1,26 +1,266 @@
+import os
+import time
+import json
+import itertools
+from collections import deque
 from infi.pyutils.decorators import wraps
 from infi.pyutils.contexts import contextmanager
-from .globals import get_time, get_logger
+from .globals import get_time, get_logger, new_threadlocal
+from .histograms import DurationHistogram
+from .handlers.utils import get_native_thread_functions
+
+_timing_statistics = None
+_span_recorder = None
+_monotonic_time = getattr(time, 'perf_counter', time.time)
+
+
+class _TimingStatistics(object):
+    def __init__(self, summary_interval, logger, log_level, clock):
+        self.summary_interval = summary_interval
+        self.logger = logger
+        self.log_level = log_level
+        self.clock = clock
+        self.histograms = dict()
+        # a native lock is safe with greenlets too: it's never held across a switch
+        self.lock = get_native_thread_functions()[1]()
+        self.next_summary_time = None if summary_interval is None else clock() + summary_interval
+
+    def add(self, title, duration, now):
+        with self.lock:
+            histogram = self.histograms.get(title)
+            if histogram is None:
+                histogram = self.histograms[title] = DurationHistogram()
+            histogram.add(duration)
+            if self.next_summary_time is None or now < self.next_summary_time:
+                return
+            self.next_summary_time = now + self.summary_interval
+        self.log_summary()
+
+    def get_snapshot(self):
+        with self.lock:
+            return dict((title, histogram.copy()) for title, histogram in self.histograms.items())
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+    def log_summary(self):
+        log = getattr(self.logger, self.log_level.lower())
+        for title, histogram in sorted(self.get_snapshot().items()):
+            log("timing statistics of {}: {}".format(title, histogram))
+
+
+def enable_timing_statistics(summary_interval=60.0, logger=None, log_level="INFO", monotonic=True):
+    """
+    Switches `log_timing` and `log_timing_context` to aggregation mode: instead of logging two messages per call,
+    durations are added to per-title statistics (count, total, min, max and a percentile histogram, see
+    `get_timing_statistics`) that are logged periodically, one line per title.
+    :param summary_interval: log the statistics every `summary_interval` seconds, or None to never log them
+    :param logger: logger to log the statistics with, or None if using the default logger
+    :param log_level: str log level to log the statistics in [TRACE|DEBUG|INFO|...]
+    :param monotonic: measure the durations with a high-resolution monotonic clock of their own instead of the time
+                      function (see `set_time_func`), which is left as is
+    """
+    global _timing_statistics
+    disable_timing_statistics()
+    _timing_statistics = _TimingStatistics(summary_interval, get_logger() if logger is None else logger, log_level,
+                                           _monotonic_time if monotonic else get_time)
+
+
+def disable_timing_statistics():
+    """Switches `log_timing` and `log_timing_context` back to logging every call and discards the statistics."""
+    global _timing_statistics
+    _timing_statistics = None
+
+
+def get_timing_statistics():
+    """
+    :returns: dict of title -> copy of its `DurationHistogram` (with count, total, min, max and `get_percentile`),
+              or None if the statistics are disabled
+    """
+    return None if _timing_statistics is None else _timing_statistics.get_snapshot()
+
+
+def reset_timing_statistics():
+    """Clears the timing statistics."""
+    if _timing_statistics is not None:
+        _timing_statistics.reset()
+
+
+def log_timing_statistics():
+    """Logs the timing statistics now, without waiting for the summary interval."""
+    if _timing_statistics is not None:
+        _timing_statistics.log_summary()
+
+
+class TimingSpan(object):
+    """
+    Timed execution of a `log_timing_context` (or a `log_timing` function) recorded while the timing spans are enabled.
+    :ivar name: title of the context
+    :ivar path: tuple of the titles of the enclosing spans and this span, outermost first
+    :ivar start: start time in seconds (see `set_time_func`)
+    :ivar duration: total time in seconds, or None while the span is open
+    :ivar self_time: time in seconds not spent in the child spans, or None while the span is open
+    :ivar tid: sequential number of the greenlet (or thread) that ran the span
+    """
+    __slots__ = ('name', 'path', 'start', 'duration', 'self_time', 'tid', '_children_time')
+
+    def __init__(self, name, path, start, tid):
+        self.name = name
+        self.path = path
+        self.start = start
+        self.duration = None
+        self.self_time = None
+        self.tid = tid
+        self._children_time = 0.0
+
+    def __repr__(self):
+        return "<TimingSpan {} start={} duration={}>".format(";".join(self.path), self.start, self.duration)
+
+
+class _SpanRecorder(object):
+    def __init__(self, max_spans):
+        self.spans = deque(maxlen=max_spans)
+        self.start_time = get_time()
+        self._local = new_threadlocal()
+        self._tids = itertools.count(1)
+
+    def _get_stack(self):
+        local = self._local
+        stack = getattr(local, 'stack', None)
+        if stack is None:
+            stack = local.stack = []
+            local.tid = next(self._tids)
+        return stack
+
+    def enter(self, name, start):
+        stack = self._get_stack()
+        parent = stack[-1] if stack else None
+        span = TimingSpan(name, (name, ) if parent is None else parent.path + (name, ), start, self._local.tid)
+        stack.append(span)
+        return span
+
+    def exit(self, span, end):
+        span.duration = end - span.start
+        span.self_time = span.duration - span._children_time
+        stack = self._get_stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        elif span in stack:  # contexts exited out of order
+            stack.remove(span)
+        if stack:
+            stack[-1]._children_time += span.duration
+        self.spans.append(span)
+
+
+def enable_timing_spans(max_spans=100000):
+    """
+    Records the nesting of `log_timing_context` and `log_timing` calls as spans (with parent/child relationships and
+    self vs. total time) in each greenlet or thread, in addition to logging them or adding them to the statistics.
+    The recorded spans can be exported with `get_collapsed_stacks` and `get_chrome_trace`.
+    :param max_spans: number of last finished spans to keep
+    """
+    global _span_recorder
+    _span_recorder = _SpanRecorder(max_spans)
+
+
+def disable_timing_spans():
+    """Stops recording timing spans and discards the recorded spans."""
+    global _span_recorder
+    _span_recorder = None
+
+
+def get_timing_spans():
+    """
+    :returns: list of the finished `TimingSpan` objects, in the order they ended, or None if the spans are disabled
+    """
+    return None if _span_recorder is None else list(_span_recorder.spans)
+
+
+def reset_timing_spans():
+    """Discards the recorded timing spans."""
+    if _span_recorder is not None:
+        _span_recorder.spans.clear()
+
+
+def _get_span_time(clock, t):
+    """:returns: span time (spans are timed with `get_time`) of the time `t` taken with the statistics clock"""
+    return t if clock is get_time else get_time()
+
+
+def _get_spans(spans):
+    if spans is None:
+        spans = get_timing_spans() or []
+    return spans
+
+
+def _format_frame(name):
+    return name.replace(";", ",").replace("\n", " ")
+
+
+def get_collapsed_stacks(spans=None):
+    """
+    :param spans: list of `TimingSpan` objects, or None for the recorded spans
+    :returns: str of the self time of each span stack in the collapsed stack format of flamegraph.pl (and speedscope):
+              a line of "outer;inner;innermost <microseconds>" per stack
+    """
+    totals = dict()
+    for span in _get_spans(spans):
+        path = ";".join(_format_frame(name) for name in span.path)
+        totals[path] = totals.get(path, 0.0) + span.self_time
+    return "".join("{} {}\n".format(path, int(round(total * 1000000))) for path, total in sorted(totals.items()))
+
+
+def get_chrome_trace(spans=None):
+    """
+    :param spans: list of `TimingSpan` objects, or None for the recorded spans
+    :returns: str of the spans in the Chrome trace event JSON format (for chrome://tracing, Perfetto or speedscope).
+              Each greenlet (or thread) is a separate track, and times are microseconds since the spans were enabled.
+    """
+    start_time = _span_recorder.start_time if _span_recorder is not None else 0.0
+    pid = os.getpid()
+    events = [dict(name=span.name, ph="X", pid=pid, tid=span.tid,
+                   ts=round((span.start - start_time) * 1000000, 3), dur=round(span.duration * 1000000, 3),
+                   args=dict(self_time=round(span.self_time * 1000000, 3)))
+              for span in sorted(_get_spans(spans), key=lambda span: span.start)]
+    return json.dumps(dict(traceEvents=events, displayTimeUnit="ms"))
 
 
 @contextmanager
 def log_timing_context(title, logger=None, log_level="DEBUG"):
     """
     Log the execution time of the context. It generates two log messages: before yielding and after.
+    If the timing statistics are enabled (see `enable_timing_statistics`), the duration is added to the statistics of
+    the title instead and nothing is logged.
     :param title: str to add to the log messages
     :param logger: logger to use, or None if using the default logger
     :param log_level: str log level to use [TRACE|DEBUG|INFO|...]
     """
-    global _logger
+    statistics, recorder = _timing_statistics, _span_recorder
+    if statistics is not None:
+        clock = statistics.clock
+        t0 = clock()
+        span = None if recorder is None else recorder.enter(title, _get_span_time(clock, t0))
+        try:
+            yield
+        finally:
+            t1 = clock()
+            statistics.add(title, t1 - t0, t1)
+            if span is not None:
+                recorder.exit(span, _get_span_time(clock, t1))
+        return
     if logger is None:
         logger = get_logger()
     log = getattr(logger, log_level.lower())
     t0 = get_time()
+    span = None if recorder is None else recorder.enter(title, t0)
     log("started timing {} at {:.4f}".format(title, t0))
     try:
         yield
     finally:
         t1 = get_time()
+        if span is not None:
+            recorder.exit(span, t1)
         log("ended timing {} at {:.4f}. time taken: {:.4f} seconds".format(title, t1, t1 - t0))
 
 
@@ -47,9 +287,24 @@ def log_timing(func=None, logger=None, log_level="DEBUG"):
     :param log_level: str log level to use [TRACE|DEBUG|INFO|...]
     """
     def decorate(f):
+        title = "function {!r}".format(f.__name__)
+
         @wraps(f)
         def wrapped(*args, **kwargs):
-            with log_timing_context("function {!r}".format(f.__name__), logger=logger, log_level=log_level):
+            statistics, recorder = _timing_statistics, _span_recorder
+            if statistics is not None:
+                # the context manager is skipped in aggregation mode, it costs more than the measurement
+                clock = statistics.clock
+                t0 = clock()
+                span = None if recorder is None else recorder.enter(title, _get_span_time(clock, t0))
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    t1 = clock()
+                    statistics.add(title, t1 - t0, t1)
+                    if span is not None:
+                        recorder.exit(span, _get_span_time(clock, t1))
+            with log_timing_context(title, logger=logger, log_level=log_level):
                 return f(*args, **kwargs)
         return wrapped
     if func is None:
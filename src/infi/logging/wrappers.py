@@ -5,11 +5,13 @@ from infi.pyutils.contexts import contextmanager
 from infi.pyutils.decorators import wraps
 
 from .compat import redirect_python_logging_to_logbook
+from .levels import level_aware_logging_context
 from .processors import create_processor
-from .handlers import RotatingFileHandler
-from .formatters import create_default_formatter
+from .handlers import RotatingFileHandler, AsyncRotatingFileHandler, DuplicateSuppressingHandler
+from .formatters import create_default_formatter, get_formatter_required_extra_keys
 from .plugins import _true
 from .plugins.procname import get_procname
+from .plugins.hostname import get_host_name
 
 try:
     from .handlers import SyslogHandler
@@ -27,77 +29,155 @@ def _syslog_pred(s):
 
 
 def create_rotating_file_handler(path, mode='a', encoding='utf-8', level=logbook.DEBUG, delay=False,
-                                 max_size=1024 * 1024, backup_count=32, formatter_plugin_predicate=_true):
-    """Convenience function to create a rotating file handler with the default formatter."""
-    handler = RotatingFileHandler(filename=path, mode=mode, encoding=encoding, level=level, delay=delay,
-                                  max_size=max_size, backup_count=backup_count, bubble=True)
-    handler.formatter = create_default_formatter(formatter_plugin_predicate)
+                                 max_size=1024 * 1024, backup_count=32, formatter_plugin_predicate=_true,
+                                 asynchronous=False, queue_size=10000, overflow_policy='block',
+                                 rotation_scheme='rename', compression=None, index_tags=False, dedup_exceptions=False,
+                                 fold_constants=False):
+    """
+    Convenience function to create a rotating file handler with the default formatter.
+    If `asynchronous` is True, records are written by a dedicated thread (see `AsyncRotatingFileHandler` for the
+    `queue_size` and `overflow_policy` parameters). See `RotatingFileHandler` for `rotation_scheme`, `compression` and
+    `index_tags`, and `create_default_formatter` for `dedup_exceptions` and `fold_constants` (don't use it if the
+    handler formats records of other processes, e.g. forwarded or queued records).
+    """
+    if asynchronous:
+        handler = AsyncRotatingFileHandler(filename=path, mode=mode, encoding=encoding, level=level, delay=delay,
+                                           max_size=max_size, backup_count=backup_count, bubble=True,
+                                           queue_size=queue_size, overflow_policy=overflow_policy,
+                                           rotation_scheme=rotation_scheme, compression=compression,
+                                           index_tags=index_tags)
+    else:
+        handler = RotatingFileHandler(filename=path, mode=mode, encoding=encoding, level=level, delay=delay,
+                                      max_size=max_size, backup_count=backup_count, bubble=True,
+                                      rotation_scheme=rotation_scheme, compression=compression,
+                                      index_tags=index_tags)
+    handler.formatter = create_default_formatter(formatter_plugin_predicate, fold_constants=fold_constants,
+                                                 dedup_exceptions=dedup_exceptions)
     return handler
 
 
-def create_stream_handler(stream, level=logbook.INFO, formatter_plugin_predicate=_not_time):
-    """Convenience function to create a stream handler with the default formatter (w/o time field)."""
+def create_stream_handler(stream, level=logbook.INFO, formatter_plugin_predicate=_not_time, fold_constants=False):
+    """
+    Convenience function to create a stream handler with the default formatter (w/o time field).
+    See `create_default_formatter` for `fold_constants`.
+    """
     handler = logbook.StreamHandler(sys.stderr, level=level, bubble=True)
-    handler.formatter = create_default_formatter(formatter_plugin_predicate)
+    handler.formatter = create_default_formatter(formatter_plugin_predicate, fold_constants=fold_constants)
     return handler
 
 
-def create_stdout_handler(level=logbook.INFO, formatter_plugin_predicate=_not_time):
+def create_stdout_handler(level=logbook.INFO, formatter_plugin_predicate=_not_time, fold_constants=False):
     """Convenience function to create an STDOUT handler with the default formatter (w/o time field)."""
-    return create_stream_handler(sys.stdout, level, formatter_plugin_predicate)
+    return create_stream_handler(sys.stdout, level, formatter_plugin_predicate, fold_constants)
 
 
-def create_stderr_handler(level=logbook.INFO, formatter_plugin_predicate=_not_time):
+def create_stderr_handler(level=logbook.INFO, formatter_plugin_predicate=_not_time, fold_constants=False):
     """Convenience function to create an STDERR handler with the default formatter (w/o time field)."""
-    return create_stream_handler(sys.stderr, level, formatter_plugin_predicate)
+    return create_stream_handler(sys.stderr, level, formatter_plugin_predicate, fold_constants)
 
 
 def create_syslog_handler(facility=logbook.SyslogHandler.LOG_LOCAL1, buffer_size=1024, message_size=32768,
-                          address=("127.0.0.1", 514), level=logbook.DEBUG, formatter_plugin_predicate=_syslog_pred):
-    """Convenience function to create an syslog handler with the default formatter."""
-    from socket import gethostname
+                          address=("127.0.0.1", 514), level=logbook.DEBUG, formatter_plugin_predicate=_syslog_pred,
+                          fold_constants=False):
+    """
+    Convenience function to create an syslog handler with the default formatter.
+    See `create_default_formatter` for `fold_constants`.
+    """
     application_name = get_procname()
     if application_name is None:
         application_name = 'python'
-    handler = SyslogHandler(facility=facility, host_name=gethostname(), application_name=application_name,
+    handler = SyslogHandler(facility=facility, host_name=get_host_name(), application_name=application_name,
                             process_id=str(os.getpid()), address=address, level=level, bubble=True,
                             syslog_buffer_size=buffer_size, syslog_message_size=message_size)
-    handler.formatter = create_default_formatter(formatter_plugin_predicate)
+    handler.formatter = create_default_formatter(formatter_plugin_predicate, fold_constants=fold_constants)
     return handler
 
 
+def _unwrap(handler):
+    """:returns: the handler a `DuplicateSuppressingHandler` wraps, or the handler itself"""
+    while isinstance(handler, DuplicateSuppressingHandler):
+        handler = handler.handler
+    return handler
+
+
+def _get_required_extra_keys(handlers):
+    """
+    :returns: set of `record.extra` keys read by the formatters of the handlers, or None if any of them is unknown
+    """
+    keys = set()
+    for handler in map(_unwrap, handlers):
+        if isinstance(handler, logbook.NullHandler):
+            continue
+        handler_keys = get_formatter_required_extra_keys(handler.formatter)
+        if handler_keys is None:
+            return None
+        keys.update(handler_keys)
+    return keys
+
+
 @contextmanager
 def script_logging_context(syslog=_has_syslog_handler, syslog_facility=logbook.SyslogHandler.LOG_LOCAL1,
                            syslog_buffer_size=1024, syslog_message_size=32768, syslog_address=("127.0.0.1", 514),
                            syslog_level=logbook.DEBUG, logfile=True, logfile_path="logfile", logfile_mode='a',
                            logfile_encoding='utf-8', logfile_level=logbook.DEBUG, logfile_delay=False,
                            logfile_max_size=1024 * 1024, logfile_backup_count=32, stderr=True,
-                           stderr_level=logbook.INFO):
+                           stderr_level=logbook.INFO, logfile_asynchronous=False, logfile_queue_size=10000,
+                           logfile_overflow_policy='block', logfile_rotation_scheme='rename', logfile_compression=None,
+                           logfile_index_tags=False, logfile_dedup_exceptions=False, suppress_duplicates=False,
+                           max_duplicates=10, duplicates_window=60.0, level_aware_loggers=None, fold_constants=False):
     """
     Context manager that creates a setup of logbook handlers based on the parameters received and sensible defaults.
+    If `suppress_duplicates` is True, every handler passes only `max_duplicates` similar records in each window of
+    `duplicates_window` seconds (see `DuplicateSuppressingHandler`).
+    The loggers in `level_aware_loggers` (e.g. the module loggers of the script) reject records below the lowest level
+    of the handlers before they are created and processed (see `LevelAwareLoggerGroup`). Handlers pushed inside the
+    context won't receive these records.
+    If `fold_constants` is True, the formatters bake the values of the constant plugins (e.g. host name and process ID)
+    into their format strings (see `create_default_formatter`), so the handlers must format only this process' records.
     """
     from logbook.concurrency import enable_gevent
     enable_gevent()
     redirect_python_logging_to_logbook()
 
-    processor = create_processor()
     flags = logbook.Flags(errors='silent')
     handlers = [logbook.NullHandler()]
 
     if syslog:
         handlers.append(create_syslog_handler(facility=syslog_facility, buffer_size=syslog_buffer_size,
                                               message_size=syslog_message_size, address=syslog_address,
-                                              level=syslog_level))
+                                              level=syslog_level, fold_constants=fold_constants))
     if logfile:
         handlers.append(create_rotating_file_handler(path=logfile_path, mode=logfile_mode,
                                                      encoding=logfile_encoding, level=logfile_level,
                                                      delay=logfile_delay, max_size=logfile_max_size,
-                                                     backup_count=logfile_backup_count))
+                                                     backup_count=logfile_backup_count,
+                                                     asynchronous=logfile_asynchronous,
+                                                     queue_size=logfile_queue_size,
+                                                     overflow_policy=logfile_overflow_policy,
+                                                     rotation_scheme=logfile_rotation_scheme,
+                                                     compression=logfile_compression,
+                                                     index_tags=logfile_index_tags,
+                                                     dedup_exceptions=logfile_dedup_exceptions,
+                                                     fold_constants=fold_constants))
     if stderr:
-        handlers.append(create_stderr_handler(level=stderr_level))
-
-    with logbook.NestedSetup([processor, flags] + handlers).applicationbound():
-        yield
+        handlers.append(create_stderr_handler(level=stderr_level, fold_constants=fold_constants))
+    if suppress_duplicates:
+        handlers[1:] = [DuplicateSuppressingHandler(handler, max_duplicates=max_duplicates, window=duplicates_window)
+                        for handler in handlers[1:]]
+
+    processor = create_processor(required_extra_keys=_get_required_extra_keys(handlers))
+    try:
+        with level_aware_logging_context(handlers, level_aware_loggers or []), \
+                logbook.NestedSetup([processor, flags] + handlers).applicationbound():
+            yield
+    finally:
+        for handler in handlers:
+            if isinstance(handler, DuplicateSuppressingHandler):
+                handler.flush_summaries()
+                handler = handler.handler
+            if isinstance(handler, RotatingFileHandler):
+                # write the queued records, stop the writer thread and wait for the backup compressions
+                handler.close()
 
 
 def script_logging_decorator(func=None, *args, **kwargs):
@@ -1,7 +1,18 @@
+import os
 import re
+import json
+from datetime import datetime
 from munch import Munch
 from unittest import TestCase, SkipTest
 from infi.logging.formatters import create_default_formatter, create_formatter_by_format_string, create_formatter
+from infi.logging.formatters import _compile_formatter, _compile_json_formatter, _encode_json_value
+from infi.logging.formatters import create_json_formatter
+from infi.logging.plugins import FormatterPlugin, get_formatter_plugins
+from infi.logging.plugins.procname import set_procname
+
+
+def _not_time(name):
+    return name != 'time'
 
 
 class RecordBuilder(object):
@@ -85,6 +96,61 @@ class CreateDefaultFormatterTestCase(TestCase):
         return re.split(r'\s+', formatted)
 
 
+class CompiledDefaultFormatterTestCase(TestCase):
+    def test_same_as_default(self):
+        record = RecordBuilder().fill().create()
+        record.time = datetime(2020, 1, 2, 3, 4, 5)
+        self._assert_same_output(record)
+
+    def test_same_as_default__none_values(self):
+        record = RecordBuilder().fill().create()
+        record.time = datetime(2020, 1, 2, 3, 4, 5)
+        record.extra.procname = None
+        record.channel = None
+        record.message = None
+        self._assert_same_output(record)
+
+    def test_same_as_default__exception(self):
+        record = RecordBuilder().fill().formatted_exception("Traceback:\n  boom").create()
+        self._assert_same_output(record, _not_time)
+
+    def test_plugin_without_expression(self):
+        from infi.logging.plugins.process_id import ProcessIDFormatterPlugin
+        plugin = ProcessIDFormatterPlugin()
+        plugin.get_value_expression = lambda record_name: None
+        formatter = _compile_formatter("pid={}", [plugin], [plugin.get_format_string()])
+        self.assertEqual(formatter(RecordBuilder().fill().create(), None), "pid=42")
+
+    def _assert_same_output(self, record, plugin_predicate=lambda p: True):
+        self.assertEqual(create_default_formatter(plugin_predicate)(record, None),
+                         create_default_formatter(plugin_predicate, compiled=True)(record, None))
+
+
+class FoldConstantsTestCase(TestCase):
+    def tearDown(self):
+        set_procname(None)
+
+    def test_procname_and_pid(self):
+        set_procname('myproc')
+        formatter = create_default_formatter(set(('process_id', 'procname')).__contains__, fold_constants=True)
+        record = RecordBuilder().fill().process(1, 'other').create()
+        self.assertEqual(formatter(record, None).strip(), 'pid={:0>5}:myproc'.format(os.getpid()))
+
+    def test_rebuild_on_set_procname(self):
+        set_procname('myproc')
+        formatter = create_default_formatter(set(('procname', 'message')).__contains__, fold_constants=True,
+                                             compiled=True)
+        record = RecordBuilder().fill().create()
+        self.assertEqual(formatter(record, None), 'pname={: <28} msg=mymessage'.format('myproc'))
+        set_procname('{newproc}')
+        self.assertEqual(formatter(record, None), 'pname={: <28} msg=mymessage'.format('{newproc}'))
+
+    def test_format_string(self):
+        formatter = create_formatter_by_format_string("{{pid}}={} {}", ['process_id', 'channel'], fold_constants=True)
+        record = RecordBuilder().fill().create()
+        self.assertEqual(formatter(record, None), "{{pid}}={} mychannel".format(os.getpid()))
+
+
 class CreateFormatterTestCase(TestCase):
     def test_pid(self):
         formatter = create_formatter(['process_id'])
@@ -102,3 +168,69 @@ class CreateFormatterByFormatStringTestCase(TestCase):
         formatter = create_formatter_by_format_string("myprocess={}", ['process_id'])
         record = RecordBuilder().fill().create()
         self.assertEqual(formatter(record, None), "myprocess=42")
+
+
+class JSONFormatterTestCase(TestCase):
+    def tearDown(self):
+        set_procname(None)
+
+    def _create_record(self):
+        record = RecordBuilder().fill().channel('my"channel').message(
+            u'line\nquote" backslash\\ unicode \u05e9').create()
+        record.time = datetime(2020, 1, 2, 3, 4, 5)
+        return record
+
+    def test_plugin_values(self):
+        record = self._create_record()
+        formatted = create_json_formatter(backend='json')(record, None)
+        plugins = [plugin() for plugin in get_formatter_plugins().values()]
+        expected = dict((plugin.get_format_key(), plugin.get_formatted_value(record) if plugin.has_formatted_value()
+                         else plugin.get_value(record)) for plugin in plugins)
+        self.assertEqual(json.loads(formatted), expected)
+        self.assertNotIn('\n', formatted)
+        self.assertEqual(list(json.loads(formatted))[-1], 'message')
+
+    def test_plugin_predicate(self):
+        formatter = create_json_formatter(set(('process_id', 'message')).__contains__, backend='json')
+        self.assertEqual(formatter(self._create_record(), None),
+                         '{"process_id": 42, "message": "line\\nquote\\" backslash\\\\ unicode \\u05e9"}')
+
+    def test_fold_constants(self):
+        set_procname('my"proc')
+        formatter = create_json_formatter(set(('process_id', 'procname')).__contains__, fold_constants=True,
+                                          backend='json')
+        self.assertEqual(json.loads(formatter(self._create_record(), None)),
+                         dict(process_id=os.getpid(), procname='my"proc'))
+        set_procname('other')
+        self.assertEqual(json.loads(formatter(self._create_record(), None))['procname'], 'other')
+
+    def test_orjson_backend(self):
+        try:
+            import orjson
+        except ImportError:
+            raise SkipTest("orjson not installed")
+        record = self._create_record()
+        self.assertEqual(json.loads(create_json_formatter(backend='orjson')(record, None)),
+                         json.loads(create_json_formatter(backend='json')(record, None)))
+
+    def test_declared_json_type_mismatch(self):
+        class Plugin(FormatterPlugin):
+            def __init__(self, key, json_type):
+                self.key, self.json_type = key, json_type
+
+            def get_value(self, record):
+                return record[self.key]
+
+            def get_format_key(self):
+                return self.key
+
+            def get_json_type(self):
+                return self.json_type
+        formatter = _compile_json_formatter([Plugin('s', str), Plugin('i', int)], _encode_json_value, False)
+        for record in (dict(s='plain', i=1), dict(s='quote" backslash\\ \u05e9\n', i=True),
+                       dict(s=None, i='1'), dict(s=1.5, i=None)):
+            self.assertEqual(json.loads(formatter(record, None)), record)
+
+    def test_invalid_backend(self):
+        with self.assertRaises(ValueError):
+            create_json_formatter(backend='xml')
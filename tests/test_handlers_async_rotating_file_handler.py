@@ -0,0 +1,82 @@
+import os
+import shutil
+import logbook
+from glob import glob
+from tempfile import mkdtemp
+from unittest import TestCase
+from infi.logging.handlers import AsyncRotatingFileHandler
+
+
+class AsyncRotatingFileHandlerTestCase(TestCase):
+    def setUp(self):
+        self.dirname = mkdtemp()
+        self.name = os.path.join(self.dirname, 'async_rotating_file_handler_test.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def _read(self, name=None):
+        with open(name or self.name) as f:
+            return f.read()
+
+    def test_write(self):
+        h = AsyncRotatingFileHandler(self.name, format_string="{record.message}")
+        with h.applicationbound():
+            for i in range(100):
+                logbook.info(str(i))
+            h.flush()
+            self.assertEqual(self._read(), "".join("{}\n".format(i) for i in range(100)))
+        h.close()
+
+    def test_rotation(self):
+        h = AsyncRotatingFileHandler(self.name, max_size=16, format_string="{record.message}", backup_count=5)
+        with h.applicationbound():
+            for i in range(4):
+                logbook.info("012345678901234")
+                h.flush()
+        h.close()
+        self.assertEqual(set([self.name] + ["{}.{:02d}".format(self.name, i) for i in range(1, 5)]),
+                         set(glob("{}*".format(self.name))))
+
+    def _emit_while_writer_is_paused(self, h, messages):
+        h._wake_writer = lambda: None
+        with h.applicationbound():
+            for message in messages:
+                logbook.info(message)
+        del h._wake_writer
+        h.close()
+
+    def test_drop_newest(self):
+        h = AsyncRotatingFileHandler(self.name, format_string="{record.message}", queue_size=2,
+                                     overflow_policy='drop_newest', flush_interval=60)
+        self._emit_while_writer_is_paused(h, ["a", "b", "c", "d"])
+        self.assertEqual(h.dropped_count, 2)
+        self.assertEqual(self._read().splitlines()[:2], ["a", "b"])
+        self.assertIn("dropped 2 log records", self._read())
+
+    def test_drop_oldest(self):
+        h = AsyncRotatingFileHandler(self.name, format_string="{record.message}", queue_size=2,
+                                     overflow_policy='drop_oldest', flush_interval=60)
+        self._emit_while_writer_is_paused(h, ["a", "b", "c", "d"])
+        self.assertEqual(h.dropped_count, 2)
+        self.assertEqual(self._read().splitlines()[:2], ["c", "d"])
+
+    def test_invalid_overflow_policy(self):
+        with self.assertRaises(ValueError):
+            AsyncRotatingFileHandler(self.name, overflow_policy='explode')
+
+    def test_closed_handler_is_released(self):
+        import gc
+        import weakref
+        h = AsyncRotatingFileHandler(self.name)
+        h.close()
+        ref = weakref.ref(h)
+        del h
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_acquire_native_lock_timeout(self):
+        from infi.logging.handlers.utils import get_native_thread_functions, acquire_native_lock
+        lock = get_native_thread_functions()[1]()
+        self.assertTrue(acquire_native_lock(lock, 0.01))
+        self.assertFalse(acquire_native_lock(lock, 0.01))
@@ -0,0 +1,107 @@
+import os
+import shutil
+import logbook
+from tempfile import mkdtemp
+from unittest import TestCase
+from infi.logging.decode import decode
+from infi.logging.formatters import create_default_formatter
+from infi.logging.handlers import BinaryFileHandler, read_binary_log
+from infi.logging.handlers.binary_file_handler import FILE_MAGIC
+from infi.logging.processors import create_processor
+from infi.logging.plugins.request_id_tag import set_tag
+
+
+class BinaryFileHandlerTestCase(TestCase):
+    def setUp(self):
+        self.dirname = mkdtemp()
+        self.name = os.path.join(self.dirname, 'log.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def _log(self, handler):
+        text_handler = logbook.TestHandler(bubble=True)
+        text_handler.formatter = create_default_formatter()
+        with logbook.NestedSetup([create_processor(), handler, text_handler]):
+            logbook.Logger('first').info("hello {}", "world")
+            set_tag('abcd')
+            try:
+                logbook.Logger('second').warning(u"unicode \u05e9")
+            finally:
+                set_tag(None)
+            try:
+                raise ValueError("error")
+            except ValueError:
+                logbook.Logger('first').exception("failed")
+            logbook.Logger('first').debug("multi\nline")
+        return text_handler.formatted_records
+
+    def test_decode(self):
+        handler = BinaryFileHandler(self.name)
+        expected = self._log(handler)
+        handler.close()
+        self.assertEqual(list(decode(self.name)), expected)
+
+    def test_append(self):
+        handler = BinaryFileHandler(self.name)
+        expected = self._log(handler)
+        handler.close()
+        handler = BinaryFileHandler(self.name)
+        expected += self._log(handler)
+        handler.close()
+        self.assertEqual(list(decode(self.name)), expected)
+
+    def test_truncated_file(self):
+        handler = BinaryFileHandler(self.name)
+        self._log(handler)
+        handler.close()
+        with open(self.name, 'rb+') as f:
+            f.truncate(os.path.getsize(self.name) - 3)
+        self.assertEqual(len(list(read_binary_log(self.name))), 3)
+
+    def test_append_after_truncated_file(self):
+        handler = BinaryFileHandler(self.name)
+        expected = self._log(handler)[:3]
+        handler.close()
+        with open(self.name, 'rb+') as f:
+            f.truncate(os.path.getsize(self.name) - 5)
+        handler = BinaryFileHandler(self.name)
+        expected += self._log(handler)
+        handler.close()
+        self.assertEqual(list(decode(self.name)), expected)
+
+    def _log_magic(self, handler):
+        magic = FILE_MAGIC.decode('ascii')
+        with handler.applicationbound():
+            logbook.Logger('magic').info("before")
+            logbook.Logger('magic').info("contains " + magic + "\x00" * 8)
+            logbook.Logger('magic').info(magic)
+            logbook.Logger('magic').info("after")
+
+    def test_message_with_file_magic(self):
+        handler = BinaryFileHandler(self.name)
+        self._log_magic(handler)
+        handler.close()
+        messages = [record.message for record in read_binary_log(self.name)]
+        magic = FILE_MAGIC.decode('ascii')
+        self.assertEqual(messages, ["before", "contains " + magic + "\x00" * 8, magic, "after"])
+
+    def test_append_after_truncated_file_magic(self):
+        handler = BinaryFileHandler(self.name)
+        self._log_magic(handler)
+        handler.close()
+        with open(self.name, 'rb') as f:
+            data = f.read()
+        with open(self.name, 'rb+') as f:
+            f.truncate(data.index(FILE_MAGIC, len(FILE_MAGIC)) + len(FILE_MAGIC) + 2)
+        handler = BinaryFileHandler(self.name)
+        with handler.applicationbound():
+            logbook.Logger('magic').info("appended")
+        handler.close()
+        self.assertEqual([record.message for record in read_binary_log(self.name)], ["before", "appended"])
+
+    def test_not_a_binary_log(self):
+        with open(self.name, 'w') as f:
+            f.write("text")
+        with self.assertRaises(ValueError):
+            list(read_binary_log(self.name))
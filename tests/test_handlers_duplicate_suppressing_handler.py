@@ -0,0 +1,62 @@
+import logbook
+from unittest import TestCase
+from infi.logging.globals import set_time_func
+from infi.logging.handlers import DuplicateSuppressingHandler
+
+
+class DuplicateSuppressingHandlerTestCase(TestCase):
+    def setUp(self):
+        self.now = 0.0
+        set_time_func(lambda: self.now)
+        self.target = logbook.TestHandler()
+
+    def tearDown(self):
+        import time
+        set_time_func(time.time)
+
+    def _messages(self):
+        return [record.message for record in self.target.records]
+
+    def test_suppress(self):
+        handler = DuplicateSuppressingHandler(self.target, max_duplicates=2, window=10)
+        with handler.applicationbound():
+            for i in range(5):
+                logbook.warning("connection to {} failed", i)
+            logbook.error("connection to {} failed", 5)
+            self.now = 10
+            logbook.warning("connection to {} failed", 6)
+        self.assertEqual(self._messages(), ['connection to 0 failed', 'connection to 1 failed',
+                                            'connection to 5 failed',
+                                            'suppressed 3 similar messages: connection to {} failed',
+                                            'connection to 6 failed'])
+        self.assertEqual(self.target.records[3].level, logbook.WARNING)
+
+    def test_sweep(self):
+        handler = DuplicateSuppressingHandler(self.target, max_duplicates=1, window=10)
+        with handler.applicationbound():
+            logbook.info('a')
+            logbook.info('a')
+            self.now = 10
+            logbook.info('b')
+        self.assertEqual(self._messages(), ['a', 'suppressed 1 similar messages: a', 'b'])
+
+    def test_lru_eviction(self):
+        handler = DuplicateSuppressingHandler(self.target, max_duplicates=1, window=10, max_fingerprints=2)
+        with handler.applicationbound():
+            for message in ('a', 'a', 'b', 'a', 'c', 'a'):
+                logbook.info(message)
+        # 'b' is evicted when 'c' arrives, 'a' was used more recently
+        self.assertEqual(self._messages(), ['a', 'b', 'c'])
+        handler.close()
+        self.assertEqual(self._messages(), ['a', 'b', 'c', 'suppressed 3 similar messages: a'])
+
+    def test_level(self):
+        self.target.level = logbook.WARNING
+        handler = DuplicateSuppressingHandler(self.target, max_duplicates=1)
+        with handler.applicationbound():
+            logbook.info('a')
+            self.target.level = logbook.INFO  # a level change of the wrapped handler applies immediately
+            logbook.info('a')
+            logbook.info('a')
+        handler.close()
+        self.assertEqual(self._messages(), ['a', 'suppressed 1 similar messages: a'])
@@ -0,0 +1,136 @@
+import os
+import shutil
+import logbook
+from tempfile import mkdtemp
+from unittest import TestCase
+from infi.logging.formatters import create_default_formatter, get_formatter_exception_dedup
+from infi.logging.handlers import RotatingFileHandler, expand_exception_references
+from infi.logging.handlers.exception_references import expand_exception_lines
+from infi.logging.plugins.message import get_exception_fingerprint
+
+
+def _not_time(name):
+    return name not in ('time', 'hostname')
+
+
+def _fail(i):
+    raise ValueError("failure {}".format(i))
+
+
+def _log_failures(count, start=0):
+    for i in range(start, start + count):
+        try:
+            _fail(i)
+        except ValueError:
+            logbook.exception("failed {}", i)
+
+
+class ExceptionDedupTestCase(TestCase):
+    def setUp(self):
+        self.handler = logbook.TestHandler()
+        self.handler.formatter = create_default_formatter(_not_time, dedup_exceptions=True)
+
+    def _format(self):
+        return [self.handler.formatter(record, self.handler) for record in self.handler.records]
+
+    def test_dedup(self):
+        with self.handler.applicationbound():
+            _log_failures(3)
+        first, second, third = self._format()
+        fingerprint = get_exception_fingerprint(self.handler.records[0])
+        self.assertIn("msg=failed 0 exc={}\nTraceback".format(fingerprint), first)
+        self.assertIn("ValueError: failure 0", first)
+        self.assertTrue(second.endswith("msg=failed 1 exc={} (seen 2 times)\nValueError: failure 1".format(
+            fingerprint)))
+        self.assertTrue(third.endswith("(seen 3 times)\nValueError: failure 2"))
+
+    def test_different_locations(self):
+        with self.handler.applicationbound():
+            _log_failures(1)
+            try:
+                raise ValueError("other")
+            except ValueError:
+                logbook.exception("other")
+        self.assertNotEqual(*[get_exception_fingerprint(record) for record in self.handler.records])
+        self.assertTrue(all("Traceback" in formatted for formatted in self._format()))
+
+    def test_compiled(self):
+        self.handler.formatter = create_default_formatter(_not_time, compiled=True, dedup_exceptions=True)
+        with self.handler.applicationbound():
+            _log_failures(2)
+        self.assertTrue(self._format()[1].endswith("(seen 2 times)\nValueError: failure 1"))
+
+    def test_reset(self):
+        with self.handler.applicationbound():
+            _log_failures(2)
+        first, second = self.handler.records
+        self.assertIn("Traceback", self.handler.formatter(first, self.handler))
+        get_formatter_exception_dedup(self.handler.formatter).reset()
+        self.assertIn("Traceback", self.handler.formatter(second, self.handler))
+
+    def test_no_exception(self):
+        with self.handler.applicationbound():
+            logbook.info("hello")
+        self.assertTrue(self._format()[0].endswith("msg=hello"))
+
+
+class ExpandExceptionReferencesTestCase(TestCase):
+    def setUp(self):
+        self.dirname = mkdtemp()
+        self.name = os.path.join(self.dirname, 'logfile')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def _create_handler(self, max_size=1024 * 1024):
+        handler = RotatingFileHandler(self.name, max_size=max_size, backup_count=10)
+        handler.formatter = create_default_formatter(dedup_exceptions=True)
+        return handler
+
+    def test_expand(self):
+        handler = self._create_handler()
+        with handler.applicationbound():
+            _log_failures(3)
+            logbook.info("done")
+        handler.close()
+        with open(self.name) as f:
+            content = f.read()
+        self.assertEqual(content.count("Traceback"), 1)
+        expanded = "".join(expand_exception_references(self.name))
+        self.assertEqual(expanded.count("Traceback"), 3)
+        self.assertEqual(expanded.count("ValueError: failure 0"), 1)
+        self.assertEqual(expanded.count("ValueError: failure 2"), 1)
+        self.assertTrue(expanded.endswith("msg=done\n"))
+
+    def test_expand_different_messages(self):
+        handler = self._create_handler()
+        with handler.applicationbound():
+            for key in ('user-42', 'user-43'):
+                try:
+                    {}[key]
+                except KeyError:
+                    logbook.exception("lookup failed")
+        handler.close()
+        expanded = list(expand_exception_references(self.name))
+        references = [i for i, line in enumerate(expanded) if "(seen 2 times)" in line]
+        self.assertEqual(len(references), 1)
+        first_traceback = expanded[1:references[0]]
+        self.assertEqual(first_traceback[-1], "KeyError: 'user-42'\n")
+        self.assertEqual(expanded[references[0] + 1:], first_traceback[:-1] + ["KeyError: 'user-43'\n"])
+
+    def test_expand_reference_without_last_line(self):
+        lines = ["2024-01-01 00:00:00.000000+00:00 msg=failed exc=0123456789ab\n", "Traceback\n", "ValueError: a\n",
+                 "2024-01-01 00:00:01.000000+00:00 msg=failed exc=0123456789ab (seen 2 times)\n"]
+        self.assertEqual(list(expand_exception_lines(lines)), lines + ["Traceback\n", "ValueError: a\n"])
+
+    def test_rollover(self):
+        handler = self._create_handler(max_size=2000)
+        with handler.applicationbound():
+            _log_failures(20)
+        handler.close()
+        files = [self.name + '.01', self.name]
+        for path in files:
+            with open(path) as f:
+                self.assertIn("Traceback", f.read())
+        expanded = "".join(expand_exception_references(self.name))
+        self.assertEqual(expanded.count("Traceback"), 20)
@@ -0,0 +1,14 @@
+from unittest import TestCase
+from infi.logging.handlers.log_files import get_record_time, is_record_start
+
+
+class LogFilesTestCase(TestCase):
+    def test_record_start(self):
+        self.assertTrue(is_record_start(b"2020-01-02 03:04:05 INFO msg=hello\n"))
+        self.assertTrue(is_record_start(b"2020-01-02T03:04:05.067Z INFO msg=hello\n"))
+        self.assertFalse(is_record_start(b"Traceback (most recent call last):\n"))
+        self.assertFalse(is_record_start(b"    at 2020-01-02 03:04:05\n"))
+
+    def test_record_time(self):
+        self.assertEqual(get_record_time(b"2020-01-02T03:04:05.067Z INFO msg=hello\n"), "2020-01-02 03:04:05.067")
+        self.assertIsNone(get_record_time(b"ValueError: error\n"))
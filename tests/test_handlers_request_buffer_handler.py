@@ -0,0 +1,124 @@
+import logbook
+from unittest import TestCase
+from infi.logging.handlers import RequestBufferHandler
+from infi.logging.handlers.request_buffer_handler import REQUEST_OVERHEAD
+from infi.logging.plugins.request_id_tag import request_id_tag_context, set_tag, inject_request_id_tag
+
+
+class RequestBufferHandlerTestCase(TestCase):
+    def setUp(self):
+        self.target = logbook.TestHandler()
+        self.processor = logbook.Processor(inject_request_id_tag)
+        self.processor.push_application()
+
+    def tearDown(self):
+        self.processor.pop_application()
+        set_tag(None)
+
+    def _log(self, handler, messages, level=logbook.DEBUG, tag=None):
+        with handler.applicationbound():
+            with request_id_tag_context(tag=tag):
+                for message in messages:
+                    logbook.log(level, message)
+
+    def _messages(self):
+        return [record.message for record in self.target.records]
+
+    def test_discard(self):
+        handler = RequestBufferHandler(self.target)
+        self._log(handler, ['a', 'b'])
+        with handler.applicationbound():
+            logbook.debug('untagged')
+        self.assertEqual(self._messages(), ['untagged'])
+        self.assertEqual(handler.get_buffered_size(), 0)
+        handler.close()
+
+    def test_flush_on_error(self):
+        handler = RequestBufferHandler(self.target)
+        with handler.applicationbound():
+            with request_id_tag_context():
+                logbook.debug('a')
+                logbook.error('b')
+                logbook.debug('c')
+        self.assertEqual(self._messages(), ['a', 'b', 'c'])
+        handler.close()
+
+    def test_flush_on_latency(self):
+        handler = RequestBufferHandler(self.target, latency_threshold=0)
+        self._log(handler, ['a', 'b'])
+        self.assertEqual(self._messages(), ['a', 'b'])
+        handler.close()
+
+    def test_sampling(self):
+        handler = RequestBufferHandler(self.target, sample_rate=1.0)
+        self._log(handler, ['a'])
+        self.assertEqual(self._messages(), ['a'])
+        handler.close()
+
+    def test_nested_request(self):
+        handler = RequestBufferHandler(self.target)
+        with handler.applicationbound():
+            with request_id_tag_context(tag='outer'):
+                logbook.debug('a')
+                with request_id_tag_context(tag='inner'):
+                    logbook.debug('b')
+                with request_id_tag_context():
+                    logbook.error('c')
+        self.assertEqual(self._messages(), ['a', 'c'])
+        handler.close()
+
+    def test_request_size_limit(self):
+        handler = RequestBufferHandler(self.target, max_request_size=3000)
+        with handler.applicationbound():
+            with request_id_tag_context():
+                for i in range(10):
+                    logbook.debug(str(i))
+                self.assertLessEqual(handler.get_buffered_size(), 3000 + REQUEST_OVERHEAD)
+                logbook.error('error')
+        self.assertEqual(self._messages(), ['5', '6', '7', '8', '9', 'error'])
+        self.assertEqual(handler.dropped_records, 5)
+        handler.close()
+
+    def test_total_size_limit(self):
+        handler = RequestBufferHandler(self.target, max_total_size=5100)  # 2 requests and 5 records fit
+        with handler.applicationbound():
+            with request_id_tag_context(tag='first'):
+                logbook.debug('a')
+                logbook.debug('b')
+                with request_id_tag_context(tag='second'):
+                    for i in range(5):
+                        logbook.debug(str(i))
+                    self.assertLessEqual(handler.get_buffered_size(), 5100)
+                    logbook.error('error')
+                logbook.error('first error')
+        self.assertEqual(self._messages(), ['0', '1', '2', '3', '4', 'error', 'first error'])
+        self.assertEqual(handler.dropped_records, 2)
+        handler.close()
+
+    def test_target_level(self):
+        self.target.level = logbook.INFO
+        handler = RequestBufferHandler(self.target)
+        self._log(handler, ['a'], level=logbook.ERROR)
+        self._log(handler, ['b'])
+        self.assertEqual(self._messages(), ['a'])
+        handler.close()
+
+    def test_max_requests(self):
+        handler = RequestBufferHandler(self.target, max_requests=1)
+        with handler.applicationbound():
+            with request_id_tag_context(tag='first'):
+                logbook.debug('a')
+                with request_id_tag_context(tag='second'):
+                    logbook.debug('b')  # passed through, there's no room to buffer the request
+            with request_id_tag_context(tag='third'):
+                logbook.debug('c')
+        self.assertEqual(self._messages(), ['b'])
+        self.assertEqual(handler.get_buffered_size(), 0)
+        handler.close()
+
+    def test_listener_is_weak(self):
+        import gc
+        import weakref
+        ref = weakref.ref(RequestBufferHandler(self.target))
+        gc.collect()
+        self.assertIsNone(ref())
@@ -0,0 +1,68 @@
+import os
+import shutil
+import logbook
+from tempfile import mkdtemp
+from unittest import TestCase
+from infi.logging.handlers import RingBufferHandler, read_ring_buffer
+
+
+class RingBufferHandlerTestCase(TestCase):
+    def setUp(self):
+        self.dirname = mkdtemp()
+        self.name = os.path.join(self.dirname, 'ring')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def _log(self, h, messages):
+        with h.applicationbound():
+            for message in messages:
+                logbook.info(message)
+
+    def test_read(self):
+        h = RingBufferHandler(self.name, size=4096, format_string="{record.message}")
+        self._log(h, ["message {}".format(i) for i in range(10)])
+        h.close()
+        self.assertEqual(list(read_ring_buffer(self.name)), ["message {}".format(i) for i in range(10)])
+
+    def test_wraparound(self):
+        h = RingBufferHandler(self.name, size=1000, format_string="{record.message}")
+        messages = ["message {:04}".format(i) for i in range(1000)]
+        self._log(h, messages)
+        records = list(read_ring_buffer(self.name))
+        h.close()
+        self.assertTrue(20 < len(records) < 40)
+        self.assertEqual(records, messages[-len(records):])
+        self.assertEqual(os.path.getsize(self.name), 1000 + 24)
+
+    def test_emit_after_close(self):
+        h = RingBufferHandler(self.name, size=1000, format_string="{record.message}")
+        self._log(h, ["a"])
+        h.close()
+        self._log(h, ["b"])
+        h.close()
+        self.assertEqual(list(read_ring_buffer(self.name)), ["a"])
+
+    def test_reopen(self):
+        h = RingBufferHandler(self.name, size=1000, format_string="{record.message}")
+        self._log(h, ["a", "b"])
+        h.close()
+        h = RingBufferHandler(self.name, size=1000, format_string="{record.message}")
+        self._log(h, ["c"])
+        h.close()
+        self.assertEqual(list(read_ring_buffer(self.name)), ["a", "b", "c"])
+
+    def test_torn_records(self):
+        h = RingBufferHandler(self.name, size=1000, format_string="{record.message}")
+        self._log(h, ["message {:04}".format(i) for i in range(100)])
+        end = h._end
+        # a record that was copied completely but the end offset wasn't updated:
+        self._log(h, ["complete"])
+        h._end = end
+        h._mmap[16:24] = end.to_bytes(8, 'little')
+        records = list(read_ring_buffer(self.name))
+        self.assertEqual(records[-2:], ["message 0099", "complete"])
+        # a record that was copied partially:
+        h._mmap[24 + end % 1000 + 25] ^= 0xff
+        self.assertEqual(list(read_ring_buffer(self.name))[-1], "message 0099")
+        h.close()
@@ -1,3 +1,4 @@
+import os
 import logbook
 from unittest import TestCase
 from infi.logging.handlers import RotatingFileHandler
@@ -22,3 +23,98 @@ class RotatingFileHandlerTestCase(TestCase):
             logbook.info("0132456789012345")
             self.assertEqual(5, len(glob_log()))
             self.assertEqual(set([name] + ["{}.{:02d}".format(name, i) for i in range(1, 5)]), set(glob_log()))
+
+    def test_sequence_rotation(self):
+        from tempfile import mkdtemp
+        from infi.logging.handlers import list_backup_files, link_backup_files
+        dirname = mkdtemp()
+        name = os.path.join(dirname, 'rotating_file_handler_test.log')
+        h = RotatingFileHandler(name, max_size=16, format_string="{record.message}\n", backup_count=3,
+                                rotation_scheme='sequence')
+        with h.applicationbound():
+            for i in range(5):
+                logbook.info("message number {}".format(i))
+        h.close()
+        self.assertEqual(["{}.{:08}".format(name, i) for i in (5, 4, 3)], list_backup_files(name))
+        with open(list_backup_files(name)[0]) as f:
+            self.assertEqual(f.read(), "message number 3\n\n")
+
+        links_dirname = mkdtemp()
+        links = link_backup_files(name, links_dirname)
+        self.assertEqual([os.path.join(links_dirname, "rotating_file_handler_test.log.{:02}".format(i))
+                          for i in (1, 2, 3)], links)
+        self.assertEqual(os.path.realpath(links[2]), os.path.realpath("{}.{:08}".format(name, 3)))
+
+        h = RotatingFileHandler(name, max_size=16, format_string="{record.message}\n", backup_count=3,
+                                rotation_scheme='sequence')
+        with h.applicationbound():
+            logbook.info("message number 5")
+        h.close()
+        self.assertEqual(["{}.{:08}".format(name, i) for i in (6, 5, 4)], list_backup_files(name))
+
+    def _write_compressed(self, rotation_scheme, compression, count):
+        from tempfile import mkdtemp
+        name = os.path.join(mkdtemp(), 'rotating_file_handler_test.log')
+        h = RotatingFileHandler(name, max_size=16, format_string="{record.message}\n", backup_count=3,
+                                rotation_scheme=rotation_scheme, compression=compression, max_compression_jobs=2)
+        with h.applicationbound():
+            for i in range(count):
+                logbook.info("message number {}".format(i))
+        h.close()
+        return name
+
+    def test_compression__rename(self):
+        import gzip
+        from infi.logging.handlers import list_backup_files
+        name = self._write_compressed('rename', 'gzip', 6)
+        self.assertEqual(["{}.{:02}.gz".format(name, i) for i in (1, 2, 3)], list_backup_files(name))
+        with gzip.open(name + '.01.gz', 'rt') as f:
+            self.assertEqual(f.read(), "message number 4\n\n")
+        with gzip.open(name + '.03.gz', 'rt') as f:
+            self.assertEqual(f.read(), "message number 2\n\n")
+
+    def test_compression__sequence(self):
+        import bz2
+        from glob import glob
+        from infi.logging.handlers import list_backup_files
+        name = self._write_compressed('sequence', 'bz2', 6)
+        self.assertEqual(["{}.{:08}.bz2".format(name, i) for i in (6, 5, 4)], list_backup_files(name))
+        self.assertEqual(4, len(glob(name + '*')))
+        with bz2.BZ2File(name + '.00000006.bz2') as f:
+            self.assertEqual(f.read(), b"message number 4\n\n")
+
+    def test_compression__stale_temporary_file(self):
+        from tempfile import mkdtemp
+        name = os.path.join(mkdtemp(), 'rotating_file_handler_test.log')
+        stale = name + '.12345.compressing'
+        with open(stale, 'w') as f:
+            f.write("left by a process that was killed while compressing")
+        h = RotatingFileHandler(name, max_size=16, format_string="{record.message}\n", compression='gzip')
+        with h.applicationbound():
+            for i in range(2):
+                logbook.info("message number {}".format(i))
+        h.close()
+        self.assertFalse(os.path.exists(stale))
+
+    def test_compression__close_waits(self):
+        from tempfile import mkdtemp
+        name = os.path.join(mkdtemp(), 'rotating_file_handler_test.log')
+        h = RotatingFileHandler(name, max_size=16, format_string="{record.message}\n", compression='gzip')
+        with h.applicationbound():
+            for i in range(2):
+                logbook.info("message number {}".format(i))
+        h.close()
+        names = sorted(os.listdir(os.path.dirname(name)))
+        self.assertEqual(names, ['rotating_file_handler_test.log'] +
+                         ['rotating_file_handler_test.log.{:02}.gz'.format(i) for i in range(1, len(names))])
+
+    def test_compression_queue__submit_after_close(self):
+        from infi.logging.handlers.compression import CompressionQueue
+        queue, done = CompressionQueue(), []
+        queue.close()
+        queue.submit(lambda: done.append(True))  # runs on the caller's thread
+        self.assertEqual(done, [True])
+
+    def test_compression__invalid(self):
+        with self.assertRaises(ValueError):
+            RotatingFileHandler(os.devnull, compression='zip')
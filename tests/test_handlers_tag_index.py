@@ -0,0 +1,108 @@
+import os
+import gzip
+import shutil
+import logbook
+from tempfile import mkdtemp
+from unittest import TestCase
+from infi.logging.formatters import create_default_formatter
+from infi.logging.handlers import RotatingFileHandler, find_tag_records, list_backup_files
+from infi.logging.handlers.tag_index import get_index_dir, open_tag_index
+from infi.logging.plugins.request_id_tag import set_tag
+from infi.logging.processors import create_processor
+
+
+class TagIndexTestCase(TestCase):
+    def setUp(self):
+        self.dirname = mkdtemp()
+        self.name = os.path.join(self.dirname, 'log')
+
+    def tearDown(self):
+        set_tag(None)
+        shutil.rmtree(self.dirname)
+
+    def _log(self, **kwargs):
+        handler = RotatingFileHandler(self.name, max_size=2000, backup_count=100, index_tags=True, **kwargs)
+        handler.formatter = create_default_formatter()
+        with logbook.NestedSetup([create_processor(), handler]):
+            for i in range(100):
+                tag = 'tag{}'.format(i % 3) if i % 4 else None
+                set_tag(tag)
+                logbook.info("message {}".format(i))
+                if i % 10 == 1:
+                    try:
+                        raise ValueError("error {}".format(i))
+                    except ValueError:
+                        logbook.exception("failed")
+        handler.close()
+        return handler
+
+    def _read_records(self):
+        records = []
+        for path in list(reversed(list_backup_files(self.name))) + [self.name]:
+            with (gzip.open(path, 'rt') if path.endswith('.gz') else open(path)) as f:
+                for line in f:
+                    if line[:1].isdigit():
+                        records.append(line)
+                    else:
+                        records[-1] += line
+        return records
+
+    def _assert_found(self):
+        records = self._read_records()
+        for tag in ('tag0', 'tag1', 'tag2'):
+            expected = [record for record in records if ' tag={:0>8} '.format(tag) in record]
+            self.assertTrue(expected)
+            self.assertEqual(list(find_tag_records(self.name, tag)), expected)
+        self.assertEqual(list(find_tag_records(self.name, 'other')), [])
+
+    def test_find__rename(self):
+        self._log()
+        self.assertGreater(len(list_backup_files(self.name)), 5)
+        self.assertEqual(len(os.listdir(get_index_dir(self.name))), len(list_backup_files(self.name)))
+        self._assert_found()
+
+    def test_find__sequence_gzip(self):
+        self._log(rotation_scheme='sequence', compression='gzip')
+        self.assertTrue(all(path.endswith('.gz') for path in list_backup_files(self.name)))
+        self.assertTrue(all(open_tag_index(self.name, path) for path in list_backup_files(self.name)))
+        self._assert_found()
+
+    def test_find__without_index(self):
+        self._log()
+        shutil.rmtree(get_index_dir(self.name))
+        self._assert_found()
+
+    def test_stale_index_ignored(self):
+        self._log()
+        backup = list_backup_files(self.name)[0]
+        with open(backup, 'a') as f:
+            f.write("appended\n")
+        self.assertIsNone(open_tag_index(self.name, backup))
+        self._assert_found()
+
+    def test_time_range(self):
+        self._log()
+        index = open_tag_index(self.name, list_backup_files(self.name)[-1])
+        first, last = index.get_time_range()
+        index.close()
+        self.assertEqual(list(find_tag_records(self.name, 'tag1', until='2000-01-01')), [])
+        self.assertEqual(list(find_tag_records(self.name, 'tag1', since=first)),
+                         list(find_tag_records(self.name, 'tag1')))
+
+    def test_tag_in_message(self):
+        handler = RotatingFileHandler(self.name, index_tags=True)
+        handler.formatter = create_default_formatter()
+        with logbook.NestedSetup([create_processor(), handler]):
+            set_tag('tag0')
+            logbook.info("first line\nsecond tag=tag1 line")
+            set_tag(None)
+            logbook.info("not tagged tag=tag1")
+            handler.perform_rollover()  # indexes the backup
+        handler.close()
+        for index_dir in (None, get_index_dir(self.name)):
+            if index_dir is not None:
+                shutil.rmtree(index_dir)  # without the index
+            self.assertEqual(list(find_tag_records(self.name, 'tag1')), [])
+            records = list(find_tag_records(self.name, 'tag0'))
+            self.assertEqual(len(records), 1)
+            self.assertTrue(records[0].endswith("msg=first line\nsecond tag=tag1 line\n"))
@@ -0,0 +1,60 @@
+import os
+import gzip
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase
+from infi.logging.handlers import read_time_range
+from infi.logging.handlers.time_range import find_time_offset
+
+
+def _format_record(i):
+    record = "2020-01-02 {:02}:{:02}:00 host pid=00001 tag=00000000 module=test level=INFO msg=message {}\n".format(
+        i // 60, i % 60, i)
+    if i % 7 == 0:
+        record += "Traceback (most recent call last):\n  File \"x.py\", line 1, in f\nValueError: {}\n".format(i)
+    return record
+
+
+class TimeRangeTestCase(TestCase):
+    def setUp(self):
+        self.dirname = mkdtemp()
+        self.name = os.path.join(self.dirname, 'log')
+        self.records = [_format_record(i) for i in range(600)]
+        # 6 files of 100 records (one minute apart), newest in the log file itself
+        for n in range(6):
+            path = self.name if n == 0 else '{}.{:02}'.format(self.name, n)
+            data = "".join(self.records[(5 - n) * 100:(6 - n) * 100])
+            if n == 3:
+                with gzip.open(path + '.gz', 'wt') as f:
+                    f.write(data)
+            else:
+                with open(path, 'w') as f:
+                    f.write(data)
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def _time(self, i):
+        return "2020-01-02 {:02}:{:02}".format(i // 60, i % 60)
+
+    def test_range(self):
+        for start, end in [(0, 599), (150, 160), (250, 350), (99, 100), (599, 599), (0, 0), (370, 420)]:
+            records = list(read_time_range(self.name, self._time(start), self._time(end)))
+            self.assertEqual(records, self.records[start:end + 1])
+
+    def test_open_range(self):
+        self.assertEqual(list(read_time_range(self.name)), self.records)
+        self.assertEqual(list(read_time_range(self.name, since=self._time(590))), self.records[590:])
+        self.assertEqual(list(read_time_range(self.name, until=self._time(9))), self.records[:10])
+
+    def test_out_of_range(self):
+        self.assertEqual(list(read_time_range(self.name, "2021-01-01")), [])
+        self.assertEqual(list(read_time_range(self.name, "2019-01-01", "2019-12-31")), [])
+
+    def test_find_time_offset(self):
+        with open(self.name, 'rb') as f:
+            data = f.read()
+            for i in (500, 507, 550, 599):
+                offset = find_time_offset(f, self._time(i) + ":00")
+                self.assertEqual(data[offset:].decode('ascii'), "".join(self.records[i:]))
+            self.assertEqual(find_time_offset(f, "2021"), len(data))
@@ -0,0 +1,84 @@
+import os
+import logging
+import logbook
+from unittest import TestCase
+from infi.logging.handlers import DuplicateSuppressingHandler
+from infi.logging.levels import LevelAwareLoggerGroup, level_aware_logging_context, get_handler_level
+
+
+class CountingLogger(logbook.Logger):
+    created = 0
+
+    def _log(self, level, args, kwargs):
+        CountingLogger.created += 1
+        return logbook.Logger._log(self, level, args, kwargs)
+
+
+class LevelAwareLoggingTestCase(TestCase):
+    def setUp(self):
+        CountingLogger.created = 0
+        self.handler = logbook.TestHandler(level=logbook.INFO)
+        self.logger = CountingLogger('test')
+
+    def test_reject_before_record_creation(self):
+        group = LevelAwareLoggerGroup([logbook.NullHandler(), self.handler], [self.logger])
+        self.assertEqual(group.level, logbook.INFO)
+        self.assertEqual(self.logger.level, logbook.INFO)
+        with self.handler.applicationbound():
+            self.logger.debug('a')
+            self.logger.info('b')
+        self.assertEqual(CountingLogger.created, 1)
+        self.assertEqual([record.message for record in self.handler.records], ['b'])
+
+    def test_explicit_levels(self):
+        group = LevelAwareLoggerGroup([self.handler], [self.logger])
+        self.logger.level = logbook.DEBUG
+        self.assertEqual(self.logger.level, logbook.DEBUG)
+        other = logbook.Logger('other')
+        group.add_logger(other)
+        group.level = logbook.TRACE
+        self.assertEqual(other.level, logbook.TRACE)
+        group.level = logbook.NOTSET
+        self.assertEqual(other.level, logbook.INFO)
+
+    def test_handler_level_change(self):
+        handler = logbook.TestHandler(level=logbook.WARNING)
+        LevelAwareLoggerGroup([self.handler, handler], [self.logger])
+        self.handler.level = logbook.DEBUG
+        self.assertEqual(self.logger.level, logbook.DEBUG)
+        self.handler.level = logbook.ERROR
+        self.assertEqual(self.logger.level, logbook.WARNING)
+
+    def test_wrapped_handler(self):
+        wrapper = DuplicateSuppressingHandler(self.handler)
+        self.assertEqual(get_handler_level(wrapper), logbook.INFO)
+        LevelAwareLoggerGroup([wrapper], [self.logger])
+        self.handler.level = logbook.WARNING
+        self.assertEqual(self.logger.level, logbook.WARNING)
+
+    def test_context_restores_levels(self):
+        previous_group = logbook.LoggerGroup(level=logbook.ERROR)
+        previous_group.add_logger(self.logger)
+        other = logbook.Logger('other')
+        with level_aware_logging_context([self.handler], [self.logger, other]) as group:
+            self.assertIs(self.logger.group, group)
+            self.assertEqual((self.logger.level, other.level), (logbook.INFO, logbook.INFO))
+        self.assertIs(self.logger.group, previous_group)
+        self.assertEqual(self.logger.level, logbook.ERROR)
+        self.assertIsNone(other.group)
+        self.assertEqual(other.level, logbook.NOTSET)
+        self.assertEqual(logbook.Logger('unrelated').level, logbook.NOTSET)
+
+    def test_script_logging_context(self):
+        from infi.logging.wrappers import script_logging_context
+        root_handlers, root_level = logging.root.handlers[:], logging.root.level
+        try:
+            with script_logging_context(logfile_path=os.devnull, logfile_level=logbook.INFO, syslog=False,
+                                        level_aware_loggers=[self.logger]):
+                self.assertEqual(self.logger.level, logbook.INFO)
+                self.logger.debug('a')
+                self.assertEqual(CountingLogger.created, 0)
+        finally:  # undo the redirection of python logging to logbook
+            logging.root.handlers[:] = root_handlers
+            logging.root.setLevel(root_level)
+        self.assertEqual(self.logger.level, logbook.NOTSET)
@@ -1,12 +1,27 @@
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+from unittest import SkipTest
 from logging_test_case import LoggingTestCase
-from infi.logging.plugins import clear_plugins, load_formatter_plugins, load_injector_plugins
+from infi.logging import plugins
+from infi.logging.plugins import clear_plugins, load_formatter_plugins, load_injector_plugins, set_plugin_cache_path
 
 
 class PluginsTestCase(LoggingTestCase):
     def setUp(self):
         super(PluginsTestCase, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        set_plugin_cache_path(os.path.join(self.cache_dir, 'entry_points.json'))
         clear_plugins()
 
+    def tearDown(self):
+        super(PluginsTestCase, self).tearDown()
+        set_plugin_cache_path(None)
+        clear_plugins()
+        shutil.rmtree(self.cache_dir)
+
     def test_load_formatter_plugins__default_plugins_no_predicate(self):
         plugins = set(load_formatter_plugins().keys())
         self.assertTrue(set(('message', 'log_level', 'channel', 'process_id', 'thread_id')) & plugins)
@@ -22,3 +37,57 @@ class PluginsTestCase(LoggingTestCase):
     def test_load_injector_plugins__predicate(self):
         plugins = list(load_injector_plugins(lambda p: p != 'thread_id').keys())
         self.assertNotIn('thread_id', plugins)
+
+    def test_load_formatter_plugins__different_predicates(self):
+        self.assertEqual(['message'], list(load_formatter_plugins(lambda p: p == 'message').keys()))
+        self.assertIn('log_level', load_formatter_plugins())
+
+    def test_load_formatter_plugins__lazy(self):
+        load_formatter_plugins(lambda p: p == 'message')
+        self.assertEqual(['message'], list(plugins._plugins[plugins.FORMATTER_PLUGIN_ENTRYPOINT].keys()))
+
+    def test_entry_points_cache(self):
+        expected = load_formatter_plugins()
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, 'entry_points.json')))
+        clear_plugins()
+        scan_entry_points = plugins._scan_entry_points
+        plugins._scan_entry_points = None   # make sure the installed distributions are not scanned again
+        try:
+            self.assertEqual(expected, load_formatter_plugins())
+        finally:
+            plugins._scan_entry_points = scan_entry_points
+
+    def test_entry_points_cache_rewritten_entry_points(self):
+        dist_info = os.path.join(self.cache_dir, 'site', 'infi_logging_test_plugins-1.0.dist-info')
+        os.makedirs(dist_info)
+        with open(os.path.join(dist_info, 'METADATA'), 'w') as f:
+            f.write("Metadata-Version: 2.1\nName: infi_logging_test_plugins\nVersion: 1.0\n")
+        entry_points_path = os.path.join(dist_info, 'entry_points.txt')
+        with open(entry_points_path, 'w') as f:
+            f.write("[infi_logging_formatter_plugins]\n")
+        sys.path.append(os.path.dirname(dist_info))
+        try:
+            self.assertNotIn('test_message', load_formatter_plugins())
+            with open(entry_points_path, 'w') as f:
+                f.write("[infi_logging_formatter_plugins]\n"
+                        "test_message = infi.logging.plugins.message:MessageFormatterPlugin\n")
+            mtime = os.stat(entry_points_path).st_mtime + 10   # don't depend on the file system's mtime resolution
+            os.utime(entry_points_path, (mtime, mtime))
+            clear_plugins()
+            self.assertIn('test_message', load_formatter_plugins())
+        finally:
+            sys.path.remove(os.path.dirname(dist_info))
+
+    def test_startup_time(self):
+        if sys.version_info < (3, 7):
+            raise SkipTest("-X importtime requires Python 3.7")
+        code = "import infi.logging.formatters as f; f.create_default_formatter()"
+        output = subprocess.check_output([sys.executable, "-X", "importtime", "-c", code], stderr=subprocess.STDOUT,
+                                         cwd=self.cache_dir, env=dict(os.environ, XDG_CACHE_HOME=self.cache_dir))
+        output = output.decode('utf-8')
+        imports = dict((line.split('|')[2].strip(), int(line.split('|')[1].split(':')[-1]))
+                       for line in output.splitlines() if line.startswith('import time:') and line.count('|') == 2
+                       and not line.split('|')[1].strip().startswith('cumulative'))
+        self.assertIn('infi.logging.formatters', imports)
+        self.assertNotIn('pkg_resources', imports)
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, 'infi.logging', 'entry_points.json')))
@@ -0,0 +1,41 @@
+from unittest import TestCase
+from mock import patch
+from infi.logging.globals import set_time_func
+from infi.logging.plugins.hostname import get_host_name, refresh_host_name, clear_host_name, set_host_name_ttl
+
+
+class HostNameTestCase(TestCase):
+    def setUp(self):
+        clear_host_name()
+
+    def tearDown(self):
+        import time
+        set_time_func(time.time)
+        set_host_name_ttl(None)
+
+    def test_cached(self):
+        with patch("infi.logging.plugins.hostname.gethostname", return_value="host1") as gethostname:
+            self.assertEqual(get_host_name(), "host1")
+            self.assertEqual(get_host_name(), "host1")
+            self.assertEqual(gethostname.call_count, 1)
+
+    def test_refresh(self):
+        with patch("infi.logging.plugins.hostname.gethostname", return_value="host1"):
+            self.assertEqual(get_host_name(), "host1")
+        with patch("infi.logging.plugins.hostname.gethostname", return_value="host2"):
+            self.assertEqual(get_host_name(), "host1")
+            refresh_host_name()
+            self.assertEqual(get_host_name(), "host2")
+
+    def test_ttl(self):
+        now = [100]
+        set_time_func(lambda: now[0])
+        set_host_name_ttl(10)
+        with patch("infi.logging.plugins.hostname.gethostname", return_value="host1") as gethostname:
+            get_host_name()
+            now[0] = 109
+            get_host_name()
+            self.assertEqual(gethostname.call_count, 1)
+            now[0] = 110
+            get_host_name()
+            self.assertEqual(gethostname.call_count, 2)
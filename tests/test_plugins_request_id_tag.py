@@ -6,6 +6,7 @@ except:
 
 from logging_test_case import LoggingTestCase
 from infi.logging.plugins.request_id_tag import get_tag, set_tag, request_id_tag, get_request_id_tag_from_record
+from infi.logging.plugins.request_id_tag import request_id_tag_context
 
 
 @request_id_tag
@@ -87,3 +88,87 @@ class RequestIDTagTestCase(LoggingTestCase):
             return get_tag()
 
         self.assertEqual(foo(), 'boo')
+
+
+class ContextVarsRequestIDTagTestCase(LoggingTestCase):
+    def setUp(self):
+        super(ContextVarsRequestIDTagTestCase, self).setUp()
+        import logbook
+        from infi.logging.plugins.request_id_tag import RequestIDTagInjectorPlugin, set_tag_backend
+        set_tag_backend('contextvars')
+        self.processor = logbook.Processor(RequestIDTagInjectorPlugin().inject)
+        self.processor.push_application()
+
+    def tearDown(self):
+        from infi.logging.plugins.request_id_tag import set_tag_backend
+        set_tag(None)
+        self.processor.pop_application()
+        set_tag_backend('threadlocal')
+        super(ContextVarsRequestIDTagTestCase, self).tearDown()
+
+    def test_backend(self):
+        from infi.logging.plugins.request_id_tag import get_tag_backend, set_tag_backend
+        self.assertEqual(get_tag_backend(), 'contextvars')
+        with self.assertRaises(ValueError):
+            set_tag_backend('foo')
+
+    def test_greenlet_local(self):
+        set_tag('hello')
+
+        def new_greenlet():
+            self.assertEqual(None, get_tag())
+            set_tag('other')
+        gevent.spawn(new_greenlet).join()
+        self.assertEqual('hello', get_tag())
+
+    def test_thread_local(self):
+        import threading
+        set_tag('hello')
+        tags = []
+        thread = threading.Thread(target=lambda: tags.append(get_tag()))
+        thread.start()
+        thread.join()
+        self.assertEqual(tags, [None])
+
+    def test_asyncio_tasks(self):
+        import asyncio
+
+        @request_id_tag
+        def tagged(other_tag):
+            tag = get_tag()
+            if other_tag is not None:
+                set_tag(other_tag)
+            return tag
+
+        async def task(other_tag):
+            tag = tagged(other_tag)
+            await asyncio.sleep(0)
+            return tag, get_tag()
+
+        async def main():
+            return await asyncio.gather(task(None), task('boo'))
+
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(main())
+        finally:
+            loop.close()
+        self.assertNotEqual(results[0][0], results[1][0])
+        self.assertEqual([result[1] for result in results], [None, None])
+        self.assertIsNone(get_tag())
+
+    def test_context_resets_tag_var(self):
+        import contextvars
+        from infi.logging.plugins import request_id_tag as request_id_tag_module
+
+        def run():
+            with request_id_tag_context(tag='hello'):
+                self.assertEqual(get_tag(), 'hello')
+            return request_id_tag_module._tag_var in contextvars.copy_context()
+        self.assertFalse(contextvars.Context().run(run))  # reset, not set to None
+
+    def test_request_id_tag(self):
+        tag = return_tag_func_2()
+        self.assertIsNone(get_tag())
+        self.assert_log_records_len(1)
+        self.assert_any_log_record(lambda r: get_request_id_tag_from_record(r) == tag and 'return_tag_func_2' in r.msg)
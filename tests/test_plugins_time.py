@@ -0,0 +1,56 @@
+from datetime import datetime
+from unittest import TestCase
+from infi.logging.plugins.time import TimestampFormatter
+
+
+class TimestampFormatterTestCase(TestCase):
+    def test_same_as_strftime(self):
+        t = datetime(2020, 1, 2, 3, 4, 5, 678901)
+        self.assertEqual(TimestampFormatter().format(t), "{:%Y-%m-%d %H:%M:%S}".format(t))
+
+    def test_cache_same_second(self):
+        formatter = TimestampFormatter(precision=6)
+        self.assertEqual(formatter.format(datetime(2020, 1, 2, 3, 4, 5, 1)), "2020-01-02 03:04:05.000001")
+        self.assertEqual(formatter.format(datetime(2020, 1, 2, 3, 4, 5, 999999)), "2020-01-02 03:04:05.999999")
+
+    def test_clock_jumps(self):
+        formatter = TimestampFormatter()
+        self.assertEqual(formatter.format(datetime(2020, 1, 2, 3, 4, 5)), "2020-01-02 03:04:05")
+        self.assertEqual(formatter.format(datetime(2020, 1, 2, 3, 4, 6)), "2020-01-02 03:04:06")
+        self.assertEqual(formatter.format(datetime(2020, 1, 2, 3, 4, 5, 500000)), "2020-01-02 03:04:05")
+        self.assertEqual(formatter.format(datetime(2019, 1, 2, 3, 4, 5)), "2019-01-02 03:04:05")
+
+    def test_milliseconds(self):
+        formatter = TimestampFormatter(precision=3)
+        self.assertEqual(formatter.format(datetime(2020, 1, 2, 3, 4, 5, 67890)), "2020-01-02 03:04:05.067")
+
+    def test_iso8601(self):
+        formatter = TimestampFormatter(precision=3, iso8601=True)
+        self.assertEqual(formatter.format(datetime(2020, 1, 2, 3, 4, 5, 67890)), "2020-01-02T03:04:05.067Z")
+
+    def test_invalid_precision(self):
+        with self.assertRaises(ValueError):
+            TimestampFormatter(precision=2)
+
+    def test_iso8601_local_time(self):
+        formatter = TimestampFormatter(iso8601=True, utc=False)
+        self.assertEqual(formatter.format(datetime(2020, 1, 2, 3, 4, 5)), "2020-01-02T03:04:05")
+
+    def test_iso8601_timezone(self):
+        from datetime import timezone, timedelta
+        formatter = TimestampFormatter(iso8601=True)
+        t = datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=-5, minutes=-30)))
+        self.assertEqual(formatter.format(t), "2020-01-02T03:04:05-05:30")
+        self.assertEqual(formatter.format(t.astimezone(timezone.utc)), "2020-01-02T08:34:05Z")
+
+
+class TimeFormatterPluginTestCase(TestCase):
+    def test_value(self):
+        import logbook
+        from infi.logging.plugins.time import TimeFormatterPlugin
+        record = logbook.LogRecord('channel', logbook.INFO, 'message')
+        record.time = datetime(2020, 1, 2, 3, 4, 5, 678901)
+        plugin = TimeFormatterPlugin()
+        self.assertEqual(plugin.get_value(record), record.time)
+        self.assertEqual(plugin.get_format_string().format(plugin.get_value(record)), "2020-01-02 03:04:05")
+        self.assertEqual(plugin.get_formatted_value(record), "2020-01-02 03:04:05")
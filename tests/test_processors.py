@@ -0,0 +1,41 @@
+import logbook
+from unittest import TestCase
+from infi.logging.plugins import clear_plugins
+from infi.logging.processors import create_inject_extra_data
+from infi.logging.formatters import create_default_formatter, get_formatter_required_extra_keys
+
+
+def _not_thread_id(name):
+    return name != 'thread_id'
+
+
+class CreateInjectExtraDataTestCase(TestCase):
+    def setUp(self):
+        clear_plugins()
+
+    def _inject(self, **kwargs):
+        record = logbook.LogRecord('test', logbook.INFO, 'message')
+        create_inject_extra_data(**kwargs)(record)
+        return dict(record.extra)
+
+    def test_all_injectors(self):
+        self.assertIn('thread_id', self._inject())
+        self.assertIn('host_name', self._inject())
+
+    def test_predicate(self):
+        self.assertNotIn('thread_id', self._inject(plugin_predicate=_not_thread_id))
+
+    def test_required_extra_keys(self):
+        self.assertEqual(['thread_id'], list(self._inject(required_extra_keys=set(['thread_id']))))
+
+    def test_no_required_extra_keys(self):
+        self.assertEqual({}, self._inject(required_extra_keys=set()))
+
+
+class FormatterRequiredExtraKeysTestCase(TestCase):
+    def test_default_formatter(self):
+        formatter = create_default_formatter(set(('hostname', 'thread_id', 'channel')).__contains__)
+        self.assertEqual(set(('host_name', 'thread_id')), get_formatter_required_extra_keys(formatter))
+
+    def test_unknown_formatter(self):
+        self.assertIsNone(get_formatter_required_extra_keys(lambda record, handler: ''))
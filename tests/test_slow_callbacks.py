@@ -0,0 +1,86 @@
+import time
+import asyncio
+from logging_test_case import LoggingTestCase
+from infi.logging.slow_callbacks import enable_slow_callback_log_warning, disable_slow_callback_log_warning
+from infi.logging.slow_callbacks import enable_loop_lag_monitor, disable_loop_lag_monitor, log_loop_lag_report
+from infi.logging.slow_callbacks import get_loop_lag_histogram, reset_loop_lag_histogram
+
+
+def _block(seconds):
+    time.sleep(seconds)
+
+
+async def _slow_coroutine(seconds):
+    await asyncio.sleep(0)
+    _block(seconds)
+
+
+class SlowCallbackTestCase(LoggingTestCase):
+    def setUp(self):
+        super(SlowCallbackTestCase, self).setUp()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        disable_slow_callback_log_warning()
+        self.loop.close()
+        super(SlowCallbackTestCase, self).tearDown()
+
+    def test_slow_callback(self):
+        enable_slow_callback_log_warning(0.05, loop=self.loop, sample_interval=0)
+        self.loop.call_soon(_block, 0.01)
+        self.loop.call_soon(_block, 0.1)
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+        self.assert_log_records_len(2)
+        self.assert_any_log_record(lambda r: r.msg.startswith('callback _block was running for at least 0.1'))
+
+    def test_slow_task(self):
+        enable_slow_callback_log_warning(0.05, loop=self.loop, sample_interval=0.01)
+        task = self.loop.create_task(_slow_coroutine(0.2))
+        task.set_name('slow-task')
+        self.loop.run_until_complete(task)
+        self.assert_any_log_record(lambda r: r.msg.startswith('task slow-task (_slow_coroutine) was running for'))
+        self.assert_any_log_record(lambda r: 'in _block\n    time.sleep(seconds)' in r.msg)
+
+    def test_other_loop(self):
+        enable_slow_callback_log_warning(0.05, loop=asyncio.new_event_loop(), sample_interval=0)
+        self.loop.call_soon(_block, 0.1)
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+        self.assert_no_log_record(lambda r: 'was running for at least' in r.msg)
+
+    def test_disable(self):
+        enable_slow_callback_log_warning(0.05, loop=self.loop)
+        disable_slow_callback_log_warning()
+        self.loop.call_soon(_block, 0.1)
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+        self.assert_no_log_record(lambda r: 'was running for at least' in r.msg)
+
+
+class LoopLagMonitorTestCase(LoggingTestCase):
+    def setUp(self):
+        super(LoopLagMonitorTestCase, self).setUp()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        disable_loop_lag_monitor()
+        self.loop.close()
+        super(LoopLagMonitorTestCase, self).tearDown()
+
+    def test_lag(self):
+        enable_loop_lag_monitor(interval=0.01, warning_threshold=0.05, report_interval=None, loop=self.loop)
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertGreater(get_loop_lag_histogram().count, 0)
+        self.assertLess(get_loop_lag_histogram().get_percentile(50), 0.05)
+        self.assert_no_log_record(lambda r: 'asyncio loop lag' in r.msg)
+        self.loop.call_soon(_block, 0.1)
+        self.loop.run_until_complete(asyncio.sleep(0.02))
+        self.assert_any_log_record(lambda r: r.msg.startswith('asyncio loop lag: callback fired 0.0'))
+        self.assertGreaterEqual(get_loop_lag_histogram().max, 0.05)
+        log_loop_lag_report()
+        self.assert_any_log_record(lambda r: r.msg.startswith('asyncio loop lag: count='))
+        reset_loop_lag_histogram()
+        self.assertEqual(get_loop_lag_histogram().count, 0)
+        disable_loop_lag_monitor()
+        self.assertIsNone(get_loop_lag_histogram())
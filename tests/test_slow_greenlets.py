@@ -0,0 +1,161 @@
+import time
+import gevent
+import greenlet
+from unittest import TestCase
+from logging_test_case import LoggingTestCase
+from infi.logging.histograms import DurationHistogram, BUCKET_COUNT
+from infi.logging.slow_greenlets import enable_greenlet_run_time_histograms, disable_greenlet_run_time_histograms
+from infi.logging.slow_greenlets import get_greenlet_run_time_histogram, get_greenlet_run_time_histograms
+from infi.logging.slow_greenlets import get_greenlet_switch_count, reset_greenlet_run_time_histograms
+from infi.logging.slow_greenlets import enable_slow_greenlet_log_warning, disable_slow_greenlet_log_warning
+from infi.logging.slow_greenlets import log_slow_greenlet_report
+from infi.logging.slow_greenlets import enable_hub_loop_lag_monitor, disable_hub_loop_lag_monitor
+from infi.logging.slow_greenlets import get_hub_loop_lag_histogram, reset_hub_loop_lag_histogram
+
+
+class DurationHistogramTestCase(TestCase):
+    def test_buckets(self):
+        histogram = DurationHistogram()
+        for duration in (0.0000005, 0.000001, 0.000003, 0.001, 10000.0):
+            histogram.add(duration)
+        self.assertEqual(histogram.counts[0], 1)
+        self.assertEqual(histogram.counts[1], 1)
+        self.assertEqual(histogram.counts[2], 1)
+        self.assertEqual(histogram.counts[10], 1)  # 1000 microseconds are in [512, 1024)
+        self.assertEqual(histogram.counts[BUCKET_COUNT - 1], 1)
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.max, 10000.0)
+        self.assertEqual(DurationHistogram.get_bucket_bounds(10), (0.000512, 0.001024))
+
+    def test_percentile(self):
+        histogram = DurationHistogram()
+        self.assertIsNone(histogram.get_percentile(50))
+        for i in range(99):
+            histogram.add(0.0001)
+        histogram.add(0.5)
+        self.assertEqual(histogram.get_percentile(50), 0.000128)
+        self.assertEqual(histogram.get_percentile(99), 0.000128)
+        self.assertEqual(histogram.get_percentile(100), 0.5)
+
+    def test_reset_and_copy(self):
+        histogram = DurationHistogram()
+        histogram.add(0.1)
+        counts = histogram.counts
+        copy = histogram.copy()
+        histogram.reset()
+        self.assertIs(histogram.counts, counts)
+        self.assertEqual(sum(counts), 0)
+        self.assertEqual(copy.count, 1)
+
+
+class GreenletDurationHistogramsTestCase(LoggingTestCase):
+    def tearDown(self):
+        disable_greenlet_run_time_histograms()
+        disable_slow_greenlet_log_warning()
+        super(GreenletDurationHistogramsTestCase, self).tearDown()
+
+    def _run_slow_greenlet(self):
+        def slow_greenlet():
+            for i in range(3):
+                time.sleep(0.01)
+                gevent.sleep(0)
+        g = gevent.spawn(slow_greenlet)
+        g.join()
+        return g
+
+    def test_histograms(self):
+        enable_greenlet_run_time_histograms()
+        g = self._run_slow_greenlet()
+        histogram = get_greenlet_run_time_histogram(g)
+        self.assertEqual(histogram.count, 4)
+        self.assertGreaterEqual(histogram.max, 0.01)
+        self.assertIn(g, get_greenlet_run_time_histograms())
+        self.assertGreaterEqual(get_greenlet_run_time_histogram().count, 4)
+        self.assertGreater(get_greenlet_switch_count(), 4)
+        reset_greenlet_run_time_histograms()
+        self.assertEqual(get_greenlet_run_time_histogram(g).count, 0)
+
+    def test_global_only(self):
+        enable_greenlet_run_time_histograms(per_greenlet=False)
+        g = self._run_slow_greenlet()
+        self.assertIsNone(get_greenlet_run_time_histogram(g))
+        self.assertGreaterEqual(get_greenlet_run_time_histogram().max, 0.01)
+
+    def test_dump(self):
+        enable_greenlet_run_time_histograms(dump_interval=0)
+        self._run_slow_greenlet()
+        self.assert_any_log_record(lambda r: r.msg.startswith('greenlet run times: '))
+
+    def test_disable(self):
+        enable_slow_greenlet_log_warning(0.1)
+        enable_greenlet_run_time_histograms()
+        disable_greenlet_run_time_histograms()
+        self.assertIsNone(get_greenlet_run_time_histogram())
+        self.assertIsNotNone(greenlet.gettrace())
+        disable_slow_greenlet_log_warning()
+        self.assertIsNone(greenlet.gettrace())
+
+
+def _block(seconds):
+    time.sleep(seconds)
+
+
+class SlowGreenletWatchdogTestCase(LoggingTestCase):
+    def tearDown(self):
+        disable_slow_greenlet_log_warning()
+        super(SlowGreenletWatchdogTestCase, self).tearDown()
+
+    def test_report(self):
+        enable_slow_greenlet_log_warning(0.05, watchdog=True, sample_interval=0.01, report_interval=3600)
+
+        def slow_greenlet():
+            for i in range(2):
+                _block(0.2)
+                gevent.sleep(0)
+        gevent.spawn(slow_greenlet).join()
+        self.assert_no_log_record(lambda r: 'was running for at least' in r.msg)
+        log_slow_greenlet_report()
+        self.assert_any_log_record(lambda r: r.msg.startswith('slow greenlets: 2 incidents'))
+        self.assert_any_log_record(lambda r: 'in _block\n    time.sleep(seconds)' in r.msg)
+
+    def test_report_interval(self):
+        enable_slow_greenlet_log_warning(0.05, watchdog=True, sample_interval=0.01, report_interval=0)
+        gevent.spawn(_block, 0.1).join()
+        gevent.sleep(0)
+        self.assert_any_log_record(lambda r: r.msg.startswith('slow greenlets: 1 incidents'))
+
+
+class HubLoopLagMonitorTestCase(LoggingTestCase):
+    def tearDown(self):
+        disable_hub_loop_lag_monitor()
+        super(HubLoopLagMonitorTestCase, self).tearDown()
+
+    def test_lag(self):
+        enable_hub_loop_lag_monitor(interval=0.01, warning_threshold=0.05, report_interval=None)
+        gevent.sleep(0.05)
+        self.assertGreater(get_hub_loop_lag_histogram().count, 0)
+        self.assertLess(get_hub_loop_lag_histogram().get_percentile(50), 0.05)
+        self.assert_no_log_record(lambda r: 'gevent hub loop lag' in r.msg)
+        time.sleep(0.1)  # blocks the hub
+        gevent.sleep(0.02)
+        self.assertGreaterEqual(get_hub_loop_lag_histogram().max, 0.05)
+        self.assert_any_log_record(lambda r: r.msg.startswith('gevent hub loop lag: timer fired'))
+        reset_hub_loop_lag_histogram()
+        self.assertEqual(get_hub_loop_lag_histogram().max, 0)
+
+    def test_report(self):
+        enable_hub_loop_lag_monitor(interval=0.01, warning_threshold=None, report_interval=0.02)
+        gevent.sleep(0.1)
+        self.assert_any_log_record(lambda r: r.msg.startswith('gevent hub loop lag: count='))
+
+    def test_disable(self):
+        enable_hub_loop_lag_monitor(interval=0.01)
+        disable_hub_loop_lag_monitor()
+        self.assertIsNone(get_hub_loop_lag_histogram())
+        gevent.sleep(0.03)
+
+    def test_wait(self):
+        enable_hub_loop_lag_monitor(interval=0.01, warning_threshold=None, report_interval=None)
+        gevent.spawn(gevent.sleep, 0.02)
+        self.assertTrue(gevent.wait(timeout=2))
+        self.assertGreater(get_hub_loop_lag_histogram().count, 0)
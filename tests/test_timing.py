@@ -1,7 +1,11 @@
 import gevent
 from logging_test_case import LoggingTestCase
-from infi.logging.globals import set_time_func
+from infi.logging.globals import set_time_func, get_time_func
 from infi.logging.timing import log_timing_context, log_timing
+from infi.logging.timing import enable_timing_statistics, disable_timing_statistics, get_timing_statistics
+from infi.logging.timing import reset_timing_statistics, log_timing_statistics
+from infi.logging.timing import enable_timing_spans, disable_timing_spans, get_timing_spans, reset_timing_spans
+from infi.logging.timing import get_collapsed_stacks, get_chrome_trace
 from infi.logging.slow_greenlets import enable_slow_greenlet_log_warning, disable_slow_greenlet_log_warning
 
 
@@ -50,3 +54,134 @@ class TimingTestCase(LoggingTestCase):
         enable_slow_greenlet_log_warning(0.1)
         gevent.sleep(0.5)
         self.assert_no_log_record(lambda r: 'was running for at least' in r.msg)
+
+
+class TimingStatisticsTestCase(LoggingTestCase):
+    def tearDown(self):
+        import time
+        set_time_func(time.time)
+        disable_timing_statistics()
+        super(TimingStatisticsTestCase, self).tearDown()
+
+    def test_log_timing(self):
+        enable_timing_statistics(summary_interval=None)
+
+        @log_timing
+        def foo():
+            pass
+        for i in range(10):
+            foo()
+        with log_timing_context('my context'):
+            pass
+        self.assert_no_log_record(lambda r: 'timing' in r.msg)
+        statistics = get_timing_statistics()
+        self.assertEqual(statistics["function 'foo'"].count, 10)
+        self.assertEqual(statistics['my context'].count, 1)
+        self.assertLessEqual(statistics['my context'].min, statistics['my context'].max)
+        log_timing_statistics()
+        self.assert_any_log_record(lambda r: r.msg.startswith("timing statistics of function 'foo': count=10 "))
+        reset_timing_statistics()
+        self.assertEqual(get_timing_statistics(), {})
+
+    def test_summary_interval(self):
+        enable_timing_statistics(summary_interval=0, log_level='DEBUG')
+        with log_timing_context('my context'):
+            pass
+        self.assert_any_log_record(lambda r: r.msg.startswith('timing statistics of my context: count=1 '))
+
+    def test_monotonic_time(self):
+        import time
+        enable_timing_statistics(summary_interval=None)
+        set_time_func(lambda: 0.0)
+        with log_timing_context('my context'):
+            time.sleep(0.01)
+        self.assertGreater(get_timing_statistics()['my context'].total, 0)  # not measured with the time function
+        set_time_func(time.time)
+        disable_timing_statistics()
+        self.assertIs(get_time_func(), time.time)
+        self.assertIsNone(get_timing_statistics())
+
+    def test_time_function_unchanged(self):
+        import time
+        enable_timing_statistics()
+        self.assertIs(get_time_func(), time.time)
+
+    def test_greenlets(self):
+        enable_timing_statistics(summary_interval=None)
+
+        def timed():
+            for i in range(100):
+                with log_timing_context('greenlet'):
+                    gevent.sleep(0)
+        gevent.joinall([gevent.spawn(timed) for i in range(10)])
+        self.assertEqual(get_timing_statistics()['greenlet'].count, 1000)
+
+
+class TimingSpansTestCase(LoggingTestCase):
+    def tearDown(self):
+        import time
+        set_time_func(time.time)
+        disable_timing_spans()
+        disable_timing_statistics()
+        super(TimingSpansTestCase, self).tearDown()
+
+    def _run_nested(self):
+        t = [0.0, 1.0, 1.5, 2.0, 3.5, 4.0]
+
+        @log_timing
+        def inner():
+            pass
+        set_time_func(lambda: t.pop(0))
+        with log_timing_context('outer'):
+            inner()
+            with log_timing_context('other'):
+                pass
+
+    def test_nesting(self):
+        enable_timing_spans()
+        self._run_nested()
+        inner, other, outer = get_timing_spans()
+        self.assertEqual(inner.path, ('outer', "function 'inner'"))
+        self.assertEqual(other.path, ('outer', 'other'))
+        self.assertEqual((outer.path, outer.duration, outer.self_time), (('outer', ), 4.0, 2.0))
+        self.assertEqual((inner.start, inner.duration, inner.self_time), (1.0, 0.5, 0.5))
+        self.assertEqual(len(set(span.tid for span in (inner, other, outer))), 1)
+        self.assert_any_log_record(lambda r: 'time taken: 4.0000 seconds' in r.msg)
+
+    def test_collapsed_stacks(self):
+        enable_timing_spans()
+        self._run_nested()
+        self.assertEqual(get_collapsed_stacks(),
+                         "outer 2000000\nouter;function 'inner' 500000\nouter;other 1500000\n")
+
+    def test_chrome_trace(self):
+        import json
+        enable_timing_spans()
+        self._run_nested()
+        events = json.loads(get_chrome_trace())['traceEvents']
+        self.assertEqual([event['name'] for event in events], ['outer', "function 'inner'", 'other'])
+        self.assertEqual(events[2]['ph'], 'X')
+        self.assertEqual(events[2]['dur'], 1500000)
+
+    def test_statistics(self):
+        enable_timing_statistics(summary_interval=None, monotonic=False)
+        enable_timing_spans()
+        self._run_nested()
+        self.assertEqual(len(get_timing_spans()), 3)
+        self.assertEqual(get_timing_statistics()['outer'].total, 4.0)
+
+    def test_greenlets(self):
+        enable_timing_spans(max_spans=10)
+
+        def timed():
+            with log_timing_context('greenlet'):
+                gevent.sleep(0)
+                with log_timing_context('child'):
+                    gevent.sleep(0)
+        gevent.joinall([gevent.spawn(timed) for i in range(5)])
+        spans = get_timing_spans()
+        self.assertEqual(len(spans), 10)
+        self.assertEqual(len(set(span.tid for span in spans)), 5)
+        self.assertTrue(all(span.path == ('greenlet', 'child') for span in spans if span.name == 'child'))
+        reset_timing_spans()
+        self.assertEqual(get_timing_spans(), [])
@@ -1,5 +1,7 @@
 import os
+import shutil
 from unittest import TestCase
+import logbook
 from logbook import Logger
 
 
@@ -9,3 +11,68 @@ class WrappersTestCase(TestCase):
         with script_logging_context(logfile_path=os.devnull):
             boo = Logger("boo")
             boo.info("baah!")
+
+    def test_positional_parameters(self):
+        from inspect import signature
+        from infi.logging.wrappers import script_logging_context
+        # new parameters go after the existing ones, so positional calls keep working
+        self.assertEqual(list(signature(script_logging_context).parameters)[:16],
+                         ['syslog', 'syslog_facility', 'syslog_buffer_size', 'syslog_message_size', 'syslog_address',
+                          'syslog_level', 'logfile', 'logfile_path', 'logfile_mode', 'logfile_encoding',
+                          'logfile_level', 'logfile_delay', 'logfile_max_size', 'logfile_backup_count', 'stderr',
+                          'stderr_level'])
+
+    def test_required_extra_keys(self):
+        from infi.logging.wrappers import _get_required_extra_keys, _syslog_pred, create_stderr_handler
+        handlers = [create_stderr_handler(formatter_plugin_predicate=_syslog_pred)]
+        self.assertNotIn('host_name', _get_required_extra_keys(handlers))
+        self.assertIn('thread_id', _get_required_extra_keys(handlers))
+        self.assertIsNone(_get_required_extra_keys(handlers + [logbook.StderrHandler()]))
+
+    def test_records_of_other_processes(self):
+        from infi.logging.wrappers import create_stderr_handler
+        record = logbook.LogRecord('channel', logbook.INFO, 'forwarded')
+        record.process = 12345
+        self.assertIn('pid=12345', create_stderr_handler().formatter(record, None))
+        self.assertNotIn('pid=12345', create_stderr_handler(fold_constants=True).formatter(record, None))
+
+    def test_asynchronous_logfile(self):
+        from tempfile import mkdtemp
+        from infi.logging.wrappers import script_logging_context
+        dirname = mkdtemp()
+        self.addCleanup(shutil.rmtree, dirname)
+        path = os.path.join(dirname, 'logfile')
+        with script_logging_context(logfile_path=path, logfile_asynchronous=True, syslog=False, stderr=False):
+            Logger("boo").info("baah!")
+        with open(path) as f:
+            self.assertIn("baah!", f.read())
+
+    def test_suppress_duplicates(self):
+        from tempfile import mkdtemp
+        from infi.logging.wrappers import script_logging_context
+        dirname = mkdtemp()
+        self.addCleanup(shutil.rmtree, dirname)
+        path = os.path.join(dirname, 'logfile')
+        with script_logging_context(logfile_path=path, syslog=False, stderr=False, suppress_duplicates=True,
+                                    max_duplicates=2):
+            for i in range(5):
+                Logger("boo").info("baah {}!", i)
+        with open(path) as f:
+            content = f.read()
+        self.assertIn("baah 1!", content)
+        self.assertNotIn("baah 2!", content)
+        self.assertIn("suppressed 3 similar messages: baah {}!", content)
+
+    def test_compressed_logfile(self):
+        from tempfile import mkdtemp
+        from infi.logging.wrappers import script_logging_context
+        dirname = mkdtemp()
+        self.addCleanup(shutil.rmtree, dirname)
+        path = os.path.join(dirname, 'logfile')
+        with script_logging_context(logfile_path=path, logfile_max_size=64, logfile_compression='gzip', syslog=False,
+                                    stderr=False):
+            for i in range(5):
+                Logger("boo").info("baah {}!", i)
+        # the backups are compressed when the context exits, without leftover temporary files
+        self.assertTrue([name for name in os.listdir(dirname) if name.endswith('.gz')])
+        self.assertEqual([name for name in os.listdir(dirname) if name != 'logfile' and not name.endswith('.gz')], [])